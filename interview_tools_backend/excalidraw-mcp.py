@@ -11,6 +11,9 @@ from datetime import datetime
 from pathlib import Path
 import uvicorn
 
+# Shared with phone_screen_agent; run with PYTHONPATH=../phone_screen_agent (see README)
+from app.canvas_client import CanvasClient
+
 load_dotenv()
 
 EXCALIDRAW_BASE_URL = os.getenv("EXCALIDRAW_BASE_URL", "http://localhost:3010")
@@ -21,6 +24,9 @@ RETELL_API_KEY = os.getenv("RETELL_API_KEY")
 
 client = OpenAI(base_url=OPENAI_BASE_URL, api_key=OPENAI_API_KEY)
 
+# One pooled session for all canvas requests, so concurrent writes reuse connections
+canvas = CanvasClient(EXCALIDRAW_BASE_URL)
+
 app = FastAPI()
 
 # Add CORS middleware
@@ -46,16 +52,6 @@ class RetellWebhookPayload(BaseModel):
     event: str
     call: Dict[str, Any]
 
-def get_scene_elements():
-    """Fetch all elements from the Excalidraw canvas."""
-    resp = requests.get(f"{EXCALIDRAW_BASE_URL}/api/elements")
-    data = resp.json()
-    print(f"Fetched {len(data.get('elements', []))} elements from Excalidraw")
-    # print(data)
-    resp.raise_for_status()
-    return data.get("elements", [])
-
-
 def call_llm_for_db_highlight(elements):
     """
     Ask LLM to find the DB SPOF and return patches like:
@@ -134,57 +130,6 @@ Here is the current elements array (pretty-printed JSON):
     return data
 
 
-def build_element_lookup(elements):
-    return {el["id"]: el for el in elements if "id" in el}
-
-
-def apply_updates(elements, updates):
-    """
-    For each element patch {id, ...props}, merge into original and PUT back.
-    """
-    by_id = build_element_lookup(elements)
-
-    for patch in updates:
-        el_id = patch.get("id")
-        if not el_id or el_id not in by_id:
-            print(f"Skipping unknown element id: {el_id}")
-            continue
-
-        original = by_id[el_id]
-        updated = {**original, **patch}  # shallow merge, good enough for style updates
-
-        url = f"{EXCALIDRAW_BASE_URL}/api/elements/{el_id}"
-        resp = requests.put(url, json=updated)
-        try:
-            resp.raise_for_status()
-            print(f"Updated element {el_id}")
-        except Exception as e:
-            print(f"Failed to update {el_id}: {e}, response={resp.text}")
-
-
-def create_elements(new_elements):
-    """
-    POST new elements to the canvas.
-    """
-    if not new_elements:
-        return
-
-    url = f"{EXCALIDRAW_BASE_URL}/api/elements"
-    
-    success_count = 0
-    for el in new_elements:
-        try:
-            # The API might expect a single element object
-            resp = requests.post(url, json=el)
-            resp.raise_for_status()
-            success_count += 1
-        except Exception as e:
-            print(f"Failed to create element {el.get('type')}: {e}, response={resp.text}")
-            
-    if success_count > 0:
-        print(f"Created {success_count} new elements")
-
-
 def fetch_retell_call_details(call_id: str) -> Optional[Dict[str, Any]]:
     """Fetch full call details from Retell API."""
     if not RETELL_API_KEY:
@@ -224,7 +169,7 @@ async def check_diagram(request: CheckDiagramRequest):
         print(f"Checking diagram for conversation: {request.conversation_id}")
         
         # 1) get what you drew
-        elements = get_scene_elements()
+        elements = await canvas.get_elements()
         print(f"Fetched {len(elements)} elements from Excalidraw")
 
         # 2) send to LLM and get patches
@@ -236,11 +181,11 @@ async def check_diagram(request: CheckDiagramRequest):
         print("LLM suggested updates:", updates)
         print("LLM suggested creates:", creates)
 
-        # 3) apply patches back to canvas
-        apply_updates(elements, updates)
-
-        # 4) create new elements
-        create_elements(creates)
+        # 3) apply patches and create new elements in one concurrent round
+        result = await canvas.apply_patches(elements, updates, creates)
+        print(f"Updated {len(result['updated'])} and created {result['created']} elements")
+        for failure in result["failed"]:
+            print(f"Canvas write failed: {failure}")
 
         print("Done. Check your Excalidraw room; DB should be highlighted and labeled.")
         
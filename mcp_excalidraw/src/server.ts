@@ -361,10 +361,24 @@ app.post('/api/elements/batch', (req: Request, res: Response) => {
       });
     }
 
+    // Validate the whole batch before storing anything, so a rejected batch leaves no partial
+    // writes behind and the client can safely retry the elements one by one
+    const validated: z.infer<typeof CreateElementSchema>[] = [];
+    for (let i = 0; i < elementsToCreate.length; i++) {
+      const result = CreateElementSchema.safeParse(elementsToCreate[i]);
+      if (!result.success) {
+        return res.status(400).json({
+          success: false,
+          error: `Element ${i}: ${result.error.message}`,
+          index: i
+        });
+      }
+      validated.push(result.data);
+    }
+
     const createdElements: ServerElement[] = [];
 
-    elementsToCreate.forEach(elementData => {
-      const params = CreateElementSchema.parse(elementData);
+    validated.forEach(params => {
       const id = generateId();
       const element: ServerElement = {
         id,
@@ -0,0 +1,299 @@
+"""
+Admission Control for Upstream LLM Traffic
+
+Live voice turns, diagram checks and grading share one upstream. Every call the server makes
+waits here for a slot before it is sent:
+
+- Priority classes: live voice first, then diagram checks, then batch work (grading).
+  A waiting higher-priority request is always admitted before a lower-priority one.
+- Per-class concurrency caps.
+- A shared token-rate budget (token bucket, refilled per minute) across all classes.
+- When live-turn TTFT degrades past its target, batch work is held back and diagram checks
+  are halved until it recovers. In-flight requests are left to finish.
+
+Works from both threads (grading's worker pool) and the event loop (voice streams).
+
+The state is per process. The sourcing scripts (sourcing_backend/) run in their own process and
+are not gated against the server's live traffic; their --concurrency and --rpm limits bound them.
+"""
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from typing import Dict, Optional
+
+PRIORITY_LIVE = "live"
+PRIORITY_DIAGRAM = "diagram"
+PRIORITY_BATCH = "batch"
+
+# Lower rank is admitted first
+PRIORITY_RANK = {PRIORITY_LIVE: 0, PRIORITY_DIAGRAM: 1, PRIORITY_BATCH: 2}
+
+PURPOSE_PRIORITY = {
+    "voice_turn": PRIORITY_LIVE,
+    "diagram_check": PRIORITY_DIAGRAM,
+    "grading": PRIORITY_BATCH,
+}
+
+# Longest a waiter sleeps before re-checking (picks up bucket refills and TTFT recovery)
+POLL_INTERVAL_S = 0.25
+
+
+class AdmissionTimeout(Exception):
+    """Raised when a request could not be admitted within its class timeout."""
+
+
+class _Waiter:
+    def __init__(self, priority: str, tokens: int, seq: int, wake):
+        self.priority = priority
+        self.rank = PRIORITY_RANK[priority]
+        self.tokens = tokens
+        self.seq = seq
+        self.wake = wake
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        caps: Dict[str, int],
+        tokens_per_minute: int = 0,
+        live_ttft_target_s: float = 1.5,
+        degraded_hold_s: float = 10.0,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        self.caps = caps
+        self.tokens_per_minute = tokens_per_minute
+        self.live_ttft_target_s = live_ttft_target_s
+        self.degraded_hold_s = degraded_hold_s
+        self.timeouts = timeouts or {}
+
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._active = {p: 0 for p in PRIORITY_RANK}
+        self._admitted = {p: 0 for p in PRIORITY_RANK}
+        self._rejected = {p: 0 for p in PRIORITY_RANK}
+        self._waiting = []
+        self._bucket = float(tokens_per_minute)
+        self._bucket_updated = time.monotonic()
+        self._live_ttft_ewma = None
+        self._live_ttft_at = 0.0
+
+    # --- state (call with self._lock held) ---
+
+    def _refill(self):
+        if not self.tokens_per_minute:
+            return
+        now = time.monotonic()
+        self._bucket = min(
+            float(self.tokens_per_minute),
+            self._bucket + (now - self._bucket_updated) * self.tokens_per_minute / 60,
+        )
+        self._bucket_updated = now
+
+    def _degraded(self) -> bool:
+        if self._live_ttft_ewma is None:
+            return False
+        if time.monotonic() - self._live_ttft_at > self.degraded_hold_s:
+            return False
+        return self._live_ttft_ewma > self.live_ttft_target_s
+
+    def _effective_cap(self, priority: str) -> int:
+        cap = self.caps[priority]
+        if self._degraded():
+            if priority == PRIORITY_BATCH:
+                return 0
+            if priority == PRIORITY_DIAGRAM:
+                return max(1, cap // 2)
+        return cap
+
+    def _budget_allows(self, tokens: int) -> bool:
+        if not self.tokens_per_minute:
+            return True
+        # A request bigger than the whole bucket goes through once the bucket is full
+        return self._bucket >= min(tokens, self.tokens_per_minute)
+
+    def _can_admit(self, waiter: _Waiter) -> bool:
+        if self._active[waiter.priority] >= self._effective_cap(waiter.priority):
+            return False
+        for other in self._waiting:
+            if other is waiter:
+                continue
+            # FIFO within a class
+            if other.priority == waiter.priority and other.seq < waiter.seq:
+                return False
+            # Higher-priority waiters that are only held by the shared budget go first
+            if other.rank < waiter.rank and self._active[other.priority] < self._effective_cap(other.priority):
+                return False
+        return self._budget_allows(waiter.tokens)
+
+    def _try_admit(self, waiter: _Waiter) -> bool:
+        self._refill()
+        if not self._can_admit(waiter):
+            return False
+        self._waiting.remove(waiter)
+        self._active[waiter.priority] += 1
+        self._admitted[waiter.priority] += 1
+        if self.tokens_per_minute:
+            self._bucket -= waiter.tokens
+        return True
+
+    def _wake_all(self):
+        for waiter in self._waiting:
+            waiter.wake()
+
+    def _wait_hint(self, waiter: _Waiter) -> float:
+        if not self.tokens_per_minute or self._budget_allows(waiter.tokens):
+            return POLL_INTERVAL_S
+        missing = min(waiter.tokens, self.tokens_per_minute) - self._bucket
+        return max(0.01, min(POLL_INTERVAL_S, missing * 60 / self.tokens_per_minute))
+
+    def _abandon(self, waiter: _Waiter):
+        with self._lock:
+            if waiter in self._waiting:
+                self._waiting.remove(waiter)
+            self._rejected[waiter.priority] += 1
+            self._wake_all()
+
+    # --- public API ---
+
+    def acquire(self, priority: str, tokens: int = 0, timeout: Optional[float] = None):
+        """Block the calling thread until a slot is granted."""
+        event = threading.Event()
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeouts.get(priority, 300))
+        with self._lock:
+            waiter = _Waiter(priority, tokens, next(self._seq), event.set)
+            self._waiting.append(waiter)
+
+        while True:
+            with self._lock:
+                if self._try_admit(waiter):
+                    return
+                hint = self._wait_hint(waiter)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._abandon(waiter)
+                raise AdmissionTimeout(f"{priority} request not admitted within timeout")
+            event.clear()
+            event.wait(min(hint, remaining))
+
+    async def acquire_async(self, priority: str, tokens: int = 0, timeout: Optional[float] = None):
+        """Wait on the event loop until a slot is granted."""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeouts.get(priority, 300))
+        with self._lock:
+            waiter = _Waiter(priority, tokens, next(self._seq), lambda: loop.call_soon_threadsafe(event.set))
+            self._waiting.append(waiter)
+
+        try:
+            while True:
+                with self._lock:
+                    if self._try_admit(waiter):
+                        return
+                    hint = self._wait_hint(waiter)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AdmissionTimeout(f"{priority} request not admitted within timeout")
+                event.clear()
+                try:
+                    await asyncio.wait_for(event.wait(), min(hint, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            # Timed out or cancelled while still queued
+            self._abandon(waiter)
+            raise
+
+    def release(self, priority: str, reserved_tokens: int = 0, used_tokens: Optional[int] = None):
+        """Free a slot and settle the token budget against the real usage."""
+        with self._lock:
+            self._active[priority] -= 1
+            if self.tokens_per_minute and used_tokens is not None:
+                self._bucket -= used_tokens - reserved_tokens
+            self._wake_all()
+
+    def record_live_ttft(self, ttft_s: float, alpha: float = 0.3):
+        """Feed a live-turn TTFT sample into the degradation detector."""
+        with self._lock:
+            if self._live_ttft_ewma is None:
+                self._live_ttft_ewma = ttft_s
+            else:
+                self._live_ttft_ewma = alpha * ttft_s + (1 - alpha) * self._live_ttft_ewma
+            self._live_ttft_at = time.monotonic()
+            self._wake_all()
+
+    def status(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {
+                "degraded": self._degraded(),
+                "live_ttft_ewma_s": round(self._live_ttft_ewma, 4) if self._live_ttft_ewma is not None else None,
+                "live_ttft_target_s": self.live_ttft_target_s,
+                "token_bucket": round(self._bucket) if self.tokens_per_minute else None,
+                "tokens_per_minute": self.tokens_per_minute or None,
+                "classes": {
+                    p: {
+                        "active": self._active[p],
+                        "waiting": sum(1 for w in self._waiting if w.priority == p),
+                        "cap": self.caps[p],
+                        "effective_cap": self._effective_cap(p),
+                        "admitted": self._admitted[p],
+                        "timed_out": self._rejected[p],
+                    }
+                    for p in PRIORITY_RANK
+                },
+            }
+
+
+@lru_cache(maxsize=None)
+def get_admission_controller() -> AdmissionController:
+    """Process-wide controller, configured from the environment on first use."""
+    return AdmissionController(
+        caps={
+            PRIORITY_LIVE: int(os.getenv("LLM_MAX_CONCURRENCY_LIVE", "32")),
+            PRIORITY_DIAGRAM: int(os.getenv("LLM_MAX_CONCURRENCY_DIAGRAM", "8")),
+            PRIORITY_BATCH: int(os.getenv("LLM_MAX_CONCURRENCY_BATCH", "4")),
+        },
+        tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),
+        live_ttft_target_s=float(os.getenv("LLM_LIVE_TTFT_TARGET_S", "1.5")),
+        timeouts={
+            PRIORITY_LIVE: float(os.getenv("LLM_ADMISSION_TIMEOUT_LIVE_S", "5")),
+            PRIORITY_DIAGRAM: float(os.getenv("LLM_ADMISSION_TIMEOUT_DIAGRAM_S", "30")),
+            PRIORITY_BATCH: float(os.getenv("LLM_ADMISSION_TIMEOUT_BATCH_S", "600")),
+        },
+    )
+
+
+def priority_for(purpose: str) -> str:
+    return PURPOSE_PRIORITY.get(purpose, PRIORITY_BATCH)
+
+
+@contextmanager
+def admitted(purpose: str, tokens: int = 0):
+    """Hold a slot for `purpose` around a blocking upstream call. Yields a dict; set
+    "used_tokens" on it to settle the token budget with the real usage."""
+    controller = get_admission_controller()
+    priority = priority_for(purpose)
+    controller.acquire(priority, tokens)
+    ticket = {"used_tokens": None}
+    try:
+        yield ticket
+    finally:
+        controller.release(priority, tokens, ticket["used_tokens"])
+
+
+@asynccontextmanager
+async def admitted_async(purpose: str, tokens: int = 0):
+    """Async counterpart of admitted() for calls made on the event loop."""
+    controller = get_admission_controller()
+    priority = priority_for(purpose)
+    await controller.acquire_async(priority, tokens)
+    ticket = {"used_tokens": None}
+    try:
+        yield ticket
+    finally:
+        controller.release(priority, tokens, ticket["used_tokens"])
@@ -0,0 +1,314 @@
+"""
+Call Analytics
+
+Fleet-wide numbers over the finished phone screens in call_data/:
+- per-turn latency percentiles (e2e, LLM, TTS, ASR, websocket RTT)
+- call duration and cost, and cost per graded interview
+- the score distribution, and how each call's latency correlates with its score
+
+Records are loaded incrementally. refresh() parses only files it hasn't seen and appends one row
+per call to growable NumPy columns. It then folds just the new rows into running aggregates:
+- per-turn latency samples go into 1 ms histograms; percentiles come from their cumulative sums
+- sums and counts for cost and duration, and per-score counts
+- running sums (n, Σx, Σy, Σx², Σy², Σxy) for the latency/score Pearson correlations
+
+An update therefore costs O(new records), and the summary is rebuilt only when something
+changed. A grade file (written at call_ended) and its merged call record (written at
+call_analyzed) are joined on call_id, whichever arrives first. A call's first grade is the one
+counted; failed gradings (score -1) and other scores outside 0..MAX_SCORE are skipped.
+
+Served at GET /call-analytics, or from the command line:
+    python -m app.call_analytics [call_data_dir]
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .stats import percentile_rank
+
+LATENCY_METRICS = ("e2e", "llm", "tts", "asr", "llm_websocket_network_rtt")
+PERCENTILES = (50, 90, 95, 99)
+# 1 ms bins; anything slower lands in the last one
+HISTOGRAM_MAX_MS = 30_000
+
+GRADE_SUFFIX = "_phone_screen_grade.json"
+MAX_SCORE = 3
+
+# Per-call columns. Retell's own per-call latency percentiles are kept for correlation with the score
+CALL_LATENCY_COLUMNS = tuple(f"{metric}_p{p}" for metric in ("e2e", "llm", "tts") for p in (50, 90, 99))
+COLUMNS = ("started_at", "duration_s", "cost_usd", "score") + CALL_LATENCY_COLUMNS
+CORRELATED_COLUMNS = ("e2e_p50", "e2e_p90", "llm_p50", "llm_p90", "tts_p50", "duration_s")
+
+
+class _Columns:
+    """Float columns, one row per call, grown by doubling; NaN marks a missing value."""
+
+    def __init__(self, names, capacity: int = 256):
+        self.names = names
+        self.size = 0
+        self._data = {name: np.full(capacity, np.nan) for name in names}
+
+    def append(self, rows: Dict[str, np.ndarray]) -> np.ndarray:
+        """Append equal-length arrays, one per column; returns the new row indices."""
+        count = len(rows[self.names[0]])
+        needed = self.size + count
+        capacity = len(self._data[self.names[0]])
+        if needed > capacity:
+            capacity = max(needed, capacity * 2)
+            for name in self.names:
+                grown = np.full(capacity, np.nan)
+                grown[:self.size] = self._data[name][:self.size]
+                self._data[name] = grown
+        for name in self.names:
+            self._data[name][self.size:needed] = rows[name]
+        indices = np.arange(self.size, needed)
+        self.size = needed
+        return indices
+
+    def set(self, name: str, row: int, value: float):
+        self._data[name][row] = value
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._data[name][:self.size]
+
+
+class _RunningPearson:
+    def __init__(self):
+        self.n = 0
+        self.sx = self.sy = self.sxx = self.syy = self.sxy = 0.0
+
+    def add(self, x: np.ndarray, y: np.ndarray):
+        present = ~(np.isnan(x) | np.isnan(y))
+        x, y = x[present], y[present]
+        self.n += len(x)
+        self.sx += x.sum()
+        self.sy += y.sum()
+        self.sxx += (x * x).sum()
+        self.syy += (y * y).sum()
+        self.sxy += (x * y).sum()
+
+    def value(self) -> Optional[float]:
+        if self.n < 3:
+            return None
+        var_x = self.sxx - self.sx * self.sx / self.n
+        var_y = self.syy - self.sy * self.sy / self.n
+        if var_x <= 0 or var_y <= 0:
+            return None
+        return float((self.sxy - self.sx * self.sy / self.n) / np.sqrt(var_x * var_y))
+
+
+def _call_object(record: Dict[str, Any]) -> Dict[str, Any]:
+    """One call dict from a merged record: API data over call_analyzed over call_ended."""
+    call: Dict[str, Any] = {}
+    for key in ("call_ended_webhook", "call_analyzed_webhook", "retell_api_data"):
+        call.update({k: v for k, v in (record.get(key) or {}).items() if v is not None})
+    return call
+
+
+def _number(value) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+
+
+def _rounded(value, digits: int = 3):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+class CallAnalytics:
+    def __init__(self, call_dir: Path):
+        self.call_dir = Path(call_dir)
+        self._lock = threading.Lock()
+        self._seen = set()
+        self.columns = _Columns(COLUMNS)
+        self.call_ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._pending_scores: Dict[str, float] = {}
+
+        self._histograms = {m: np.zeros(HISTOGRAM_MAX_MS + 1, dtype=np.int64) for m in LATENCY_METRICS}
+        self._latency_max = dict.fromkeys(LATENCY_METRICS, 0.0)
+        self._disconnection_reasons: Dict[str, int] = {}
+        self._totals = {"duration_s": 0.0, "cost_usd": 0.0, "calls_with_cost": 0}
+        self._graded = {"calls": 0, "cost_usd": 0.0, "calls_with_cost": 0, "score_sum": 0.0}
+        self._score_counts = np.zeros(MAX_SCORE + 1, dtype=np.int64)
+        self._correlations = {column: _RunningPearson() for column in CORRELATED_COLUMNS}
+        self._summary: Optional[Dict[str, Any]] = None
+        self.refreshed_at: Optional[str] = None
+
+    # --- loading (call with self._lock held) ---
+
+    def _add_samples(self, metric: str, values: np.ndarray):
+        values = values[np.isfinite(values) & (values >= 0)]
+        if not len(values):
+            return
+        np.add.at(self._histograms[metric], np.minimum(np.rint(values).astype(np.int64), HISTOGRAM_MAX_MS), 1)
+        self._latency_max[metric] = max(self._latency_max[metric], float(values.max()))
+
+    def _fold_graded(self, rows: np.ndarray):
+        """Add calls that now have both a record and a score to the score aggregates."""
+        scores = self.columns["score"][rows]
+        rows, scores = rows[~np.isnan(scores)], scores[~np.isnan(scores)]
+        if not len(rows):
+            return
+        costs = self.columns["cost_usd"][rows]
+        self._graded["calls"] += len(rows)
+        self._graded["cost_usd"] += float(np.nansum(costs))
+        self._graded["calls_with_cost"] += int(np.count_nonzero(~np.isnan(costs)))
+        self._graded["score_sum"] += float(scores.sum())
+        self._score_counts += np.bincount(np.clip(scores.astype(np.int64), 0, MAX_SCORE), minlength=MAX_SCORE + 1)
+        for column, correlation in self._correlations.items():
+            correlation.add(self.columns[column][rows], scores)
+
+    def _add_calls(self, records: List[Dict[str, Any]]):
+        rows = {name: np.full(len(records), np.nan) for name in COLUMNS}
+        samples: Dict[str, list] = {m: [] for m in LATENCY_METRICS}
+        call_ids = []
+        for i, record in enumerate(records):
+            call = _call_object(record)
+            call_id = record.get("call_id") or call.get("call_id")
+            call_ids.append(call_id)
+            rows["started_at"][i] = _number(call.get("start_timestamp")) / 1000
+            rows["duration_s"][i] = _number(call.get("duration_ms")) / 1000
+            # Retell reports call cost in cents
+            rows["cost_usd"][i] = _number((call.get("call_cost") or {}).get("combined_cost")) / 100
+            rows["score"][i] = self._pending_scores.pop(call_id, np.nan)
+            latency = call.get("latency") or {}
+            for column in CALL_LATENCY_COLUMNS:
+                metric, p = column.rsplit("_", 1)
+                rows[column][i] = _number((latency.get(metric) or {}).get(p))
+            for metric in LATENCY_METRICS:
+                values = (latency.get(metric) or {}).get("values")
+                if values:
+                    samples[metric].append(np.asarray(values, dtype=np.float64))
+            reason = call.get("disconnection_reason") or "unknown"
+            self._disconnection_reasons[reason] = self._disconnection_reasons.get(reason, 0) + 1
+
+        new_rows = self.columns.append(rows)
+        for call_id, row in zip(call_ids, new_rows):
+            self._row_of[call_id] = int(row)
+        self.call_ids.extend(call_ids)
+
+        for metric, chunks in samples.items():
+            if chunks:
+                self._add_samples(metric, np.concatenate(chunks))
+        self._totals["duration_s"] += float(np.nansum(rows["duration_s"]))
+        self._totals["cost_usd"] += float(np.nansum(rows["cost_usd"]))
+        self._totals["calls_with_cost"] += int(np.count_nonzero(~np.isnan(rows["cost_usd"])))
+        self._fold_graded(new_rows)
+
+    def _add_grade(self, call_id: str, grade: Dict[str, Any]):
+        score = _number(grade.get("score"))
+        if np.isnan(score) or not 0 <= score <= MAX_SCORE:
+            return
+        row = self._row_of.get(call_id)
+        if row is None:
+            self._pending_scores.setdefault(call_id, score)
+            return
+        if not np.isnan(self.columns["score"][row]):
+            return
+        self.columns.set("score", row, score)
+        self._fold_graded(np.array([row]))
+
+    # --- public API ---
+
+    def refresh(self) -> int:
+        """Load call records and grades not seen yet; returns how many files were new."""
+        with self._lock:
+            try:
+                entries = sorted(os.scandir(self.call_dir), key=lambda e: e.name)
+            except FileNotFoundError:
+                entries = []
+            calls, grades = [], []
+            for entry in entries:
+                if entry.name in self._seen or not entry.name.startswith("call_") or not entry.name.endswith(".json"):
+                    continue
+                try:
+                    with open(entry.path) as f:
+                        data = json.load(f)
+                except (OSError, ValueError) as e:
+                    # Possibly still being written; retried on the next refresh
+                    print(f"Skipping unreadable call file {entry.name}: {e}")
+                    continue
+                self._seen.add(entry.name)
+                if entry.name.endswith(GRADE_SUFFIX):
+                    grades.append((entry.name[: -len(GRADE_SUFFIX)], data))
+                elif isinstance(data, dict) and "call_id" in data:
+                    calls.append(data)
+
+            if calls:
+                self._add_calls(calls)
+            for call_id, grade in grades:
+                self._add_grade(call_id, grade)
+            if calls or grades:
+                self._summary = None
+            self.refreshed_at = datetime.utcnow().isoformat()
+            return len(calls) + len(grades)
+
+    def _latency_summary(self, metric: str) -> Dict[str, Any]:
+        histogram = self._histograms[metric]
+        cumulative = np.cumsum(histogram)
+        total = int(cumulative[-1])
+        summary: Dict[str, Any] = {"samples": total}
+        for p in PERCENTILES:
+            # 1 ms bins: the bin holding the sample of the percentile's rank
+            summary[f"p{p}_ms"] = int(np.searchsorted(cumulative, percentile_rank(total, p))) if total else None
+        summary["max_ms"] = round(self._latency_max[metric], 3) if total else None
+        return summary
+
+    def _compute(self) -> Dict[str, Any]:
+        calls = self.columns.size
+        graded = self._graded["calls"]
+        return {
+            "calls": calls,
+            "graded_calls": graded,
+            "grades_without_call_record": len(self._pending_scores),
+            "latency": {metric: self._latency_summary(metric) for metric in LATENCY_METRICS},
+            "duration_s": {
+                "total": _rounded(self._totals["duration_s"], 1),
+                "mean": _rounded(self._totals["duration_s"] / calls if calls else np.nan, 1),
+            },
+            "cost_usd": {
+                "total": _rounded(self._totals["cost_usd"], 4),
+                "per_call": _rounded(
+                    self._totals["cost_usd"] / self._totals["calls_with_cost"] if self._totals["calls_with_cost"] else np.nan, 4
+                ),
+                "per_graded_interview": _rounded(
+                    self._graded["cost_usd"] / self._graded["calls_with_cost"] if self._graded["calls_with_cost"] else np.nan, 4
+                ),
+            },
+            "scores": {
+                "distribution": {str(score): int(count) for score, count in enumerate(self._score_counts)},
+                "mean": _rounded(self._graded["score_sum"] / graded if graded else np.nan),
+            },
+            "latency_score_correlation": {
+                column: {"pearson_r": _rounded(c.value() if c.value() is not None else np.nan), "calls": c.n}
+                for column, c in self._correlations.items()
+            },
+            "disconnection_reasons": dict(sorted(self._disconnection_reasons.items(), key=lambda kv: -kv[1])),
+            "refreshed_at": self.refreshed_at,
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Aggregates over everything in call_dir, reusing the last result if nothing is new."""
+        self.refresh()
+        with self._lock:
+            if self._summary is None:
+                self._summary = self._compute()
+            return self._summary
+
+
+@lru_cache(maxsize=None)
+def get_call_analytics() -> CallAnalytics:
+    return CallAnalytics(Path(os.getenv("CALL_DATA_DIR", "call_data")))
+
+
+if __name__ == "__main__":
+    import sys
+
+    analytics = CallAnalytics(Path(sys.argv[1] if len(sys.argv) > 1 else os.getenv("CALL_DATA_DIR", "call_data")))
+    print(json.dumps(analytics.summary(), indent=2))
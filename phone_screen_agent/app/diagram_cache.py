@@ -0,0 +1,177 @@
+"""
+Per-Conversation Diagram Analysis Cache
+
+Candidates often ask for a diagram check again with few or no changes. Each conversation keeps
+its last analysis, keyed by a canonical fingerprint of the compiled scene graph: components,
+their labels and the connections between them. Colors, exact coordinates and the labels we
+injected ourselves are left out, so re-checking an unchanged diagram is a cache hit. A changed
+diagram is described to the model as a delta against the previous verdict.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set
+
+from .scene_graph import CompiledScene
+
+# Above this share of changed nodes+edges the full graph is cheaper to reason about than a delta
+MAX_DELTA_RATIO = 0.5
+
+
+def _node_key(node: dict) -> tuple:
+    return (node["kind"], node["label"].lower())
+
+
+def scene_signature(scene: CompiledScene) -> Dict[str, Counter]:
+    """Order- and id-independent view of the graph: multisets of nodes and labelled edges."""
+    labels = {node["ref"]: _node_key(node) for node in scene.nodes}
+    return {
+        "nodes": Counter(_node_key(node) for node in scene.nodes),
+        "edges": Counter(
+            (labels.get(edge["from"]), labels.get(edge["to"]), edge["label"].lower()) for edge in scene.edges
+        ),
+    }
+
+
+def scene_fingerprint(scene: CompiledScene) -> str:
+    signature = scene_signature(scene)
+    canonical = {
+        "nodes": sorted(signature["nodes"].elements()),
+        "edges": sorted(signature["edges"].elements(), key=repr),
+    }
+    return hashlib.sha256(json.dumps(canonical, default=list).encode()).hexdigest()
+
+
+def _describe_node(node: dict) -> str:
+    return f'{node["kind"]} "{node["label"]}"' if node["label"] else node["kind"]
+
+
+def _describe_node_key(key: Optional[tuple]) -> str:
+    if key is None:
+        return "?"
+    kind, label = key
+    return f'{kind} "{label}"' if label else kind
+
+
+def describe_delta(previous: Dict[str, Counter], scene: CompiledScene) -> Optional[str]:
+    """
+    Describe what changed since `previous` in the compact prompt format, or None when the
+    change is large enough that the full graph should be sent instead.
+    """
+    current = scene_signature(scene)
+    added_nodes = current["nodes"] - previous["nodes"]
+    removed_nodes = previous["nodes"] - current["nodes"]
+    added_edges = current["edges"] - previous["edges"]
+    removed_edges = previous["edges"] - current["edges"]
+
+    changed = sum(added_nodes.values()) + sum(removed_nodes.values()) + sum(added_edges.values()) + sum(removed_edges.values())
+    total = max(sum(current["nodes"].values()) + sum(current["edges"].values()), 1)
+    if changed / total > MAX_DELTA_RATIO:
+        return None
+
+    labels = {node["ref"]: _node_key(node) for node in scene.nodes}
+    nodes_by_ref = {node["ref"]: node for node in scene.nodes}
+    lines = []
+    if added_nodes:
+        lines.append("ADDED NODES")
+        remaining = Counter(added_nodes)
+        for node in scene.nodes:
+            key = _node_key(node)
+            if remaining[key] > 0:
+                remaining[key] -= 1
+                lines.append(f"{node['ref']}: {_describe_node(node)} @{node['pos'][0]},{node['pos'][1]}")
+    if removed_nodes:
+        lines.append("REMOVED NODES")
+        lines.extend(f"- {_describe_node_key(key)}" for key in removed_nodes.elements())
+    if added_edges:
+        lines.append("ADDED EDGES")
+        remaining = Counter(added_edges)
+        for edge in scene.edges:
+            key = (labels.get(edge["from"]), labels.get(edge["to"]), edge["label"].lower())
+            if remaining[key] > 0:
+                remaining[key] -= 1
+                label = f' "{edge["label"]}"' if edge["label"] else ""
+                source, target = nodes_by_ref.get(edge["from"]), nodes_by_ref.get(edge["to"])
+                lines.append(
+                    f"{edge['ref']}: {edge['from'] or '?'} {_describe_node(source) if source else '?'} -> "
+                    f"{edge['to'] or '?'} {_describe_node(target) if target else '?'}{label}"
+                )
+    if removed_edges:
+        lines.append("REMOVED EDGES")
+        lines.extend(
+            f"- {_describe_node_key(source)} -> {_describe_node_key(target)}" + (f' "{label}"' if label else "")
+            for source, target, label in removed_edges.elements()
+        )
+    if lines:
+        # Refs for every current node, so the model can still point at unchanged components
+        lines.append("ALL CURRENT NODES")
+        lines.extend(f"{node['ref']}: {_describe_node(node)}" for node in scene.nodes)
+    return "\n".join(lines)
+
+
+class DiagramAnalysis:
+    def __init__(self, fingerprint: str, signature: Dict[str, Counter], feedback: str, injected_ids: Set[str]):
+        self.fingerprint = fingerprint
+        self.signature = signature
+        self.feedback = feedback
+        self.injected_ids = injected_ids
+        self.analyzed_at = time.time()
+
+
+class DiagramAnalysisCache:
+    """Last analysis per conversation_id, LRU-bounded."""
+
+    def __init__(self, max_conversations: int = 256):
+        self.max_conversations = max_conversations
+        self._entries: "OrderedDict[str, DiagramAnalysis]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conversation_id: str) -> Optional[DiagramAnalysis]:
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None:
+                self._entries.move_to_end(conversation_id)
+            return entry
+
+    def injected_ids(self, conversation_id: str) -> Set[str]:
+        entry = self.get(conversation_id)
+        return set(entry.injected_ids) if entry else set()
+
+    def put(self, conversation_id: str, scene: CompiledScene, feedback: str, injected_ids: List[str]):
+        previous = self.get(conversation_id)
+        entry = DiagramAnalysis(
+            scene_fingerprint(scene),
+            scene_signature(scene),
+            feedback,
+            (previous.injected_ids if previous else set()) | set(injected_ids),
+        )
+        with self._lock:
+            self._entries[conversation_id] = entry
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_conversations:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "conversations": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+diagram_cache = DiagramAnalysisCache()
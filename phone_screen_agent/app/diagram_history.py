@@ -0,0 +1,215 @@
+"""
+Diagram History
+
+Keeps every captured version of a candidate's diagram, per conversation_id, so the final
+canvas (and how it evolved) survives the interview. Captures happen at each diagram check and
+when the conversation ends.
+
+Storage per conversation, in DIAGRAM_HISTORY_DIR:
+- {conversation_id}.frames: append-only zlib-compressed frames. Every KEYFRAME_INTERVAL-th
+  version is a full scene; the rest are element-level deltas against the previous version
+  (new elements in full, changed elements as changed fields only, deleted ids, z-order).
+- {conversation_id}.index.json: one entry per version with the frame's offset and length.
+
+Reconstructing any version reads one keyframe plus at most KEYFRAME_INTERVAL - 1 deltas,
+seeking straight to them via the index.
+
+Indexes and latest scenes are cached in memory for the DIAGRAM_HISTORY_CACHE_SIZE most recently
+used conversations; anything evicted is read back from disk when needed.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+KEYFRAME_INTERVAL = 20
+
+_MISSING = object()
+
+
+def _scene_dict(elements: List[dict]) -> Dict[str, dict]:
+    return {el["id"]: el for el in elements if el.get("id")}
+
+
+def diff_scenes(old: Dict[str, dict], new: Dict[str, dict]) -> Dict[str, Any]:
+    """Element-level delta that turns `old` into `new` (both id -> element, in z-order)."""
+    delta: Dict[str, Any] = {}
+    deleted = [el_id for el_id in old if el_id not in new]
+    added = {el_id: el for el_id, el in new.items() if el_id not in old}
+    changed = {}
+    for el_id, el in new.items():
+        before = old.get(el_id)
+        if before is None or before == el:
+            continue
+        fields = {k: v for k, v in el.items() if before.get(k, _MISSING) != v}
+        removed = [k for k in before if k not in el]
+        changed[el_id] = {"set": fields, **({"unset": removed} if removed else {})}
+    if deleted:
+        delta["delete"] = deleted
+    if changed:
+        delta["change"] = changed
+    if added:
+        delta["add"] = added
+    # Applying the above keeps survivors in old order and appends additions; record the real
+    # z-order only when it differs from that
+    expected = [el_id for el_id in old if el_id in new] + list(added)
+    if expected != list(new):
+        delta["order"] = list(new)
+    return delta
+
+
+def apply_delta(scene: Dict[str, dict], delta: Dict[str, Any]) -> Dict[str, dict]:
+    result = {el_id: el for el_id, el in scene.items() if el_id not in set(delta.get("delete", []))}
+    for el_id, change in delta.get("change", {}).items():
+        el = {**result[el_id], **change.get("set", {})}
+        for key in change.get("unset", []):
+            el.pop(key, None)
+        result[el_id] = el
+    result.update(delta.get("add", {}))
+    if "order" in delta:
+        result = {el_id: result[el_id] for el_id in delta["order"]}
+    return result
+
+
+def _encode(frame: Dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(frame, separators=(",", ":")).encode(), 9)
+
+
+def _decode(data: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(data))
+
+
+class DiagramHistory:
+    def __init__(self, root: Path, keyframe_interval: int = KEYFRAME_INTERVAL, cache_size: int = 64):
+        self.root = Path(root)
+        self.keyframe_interval = keyframe_interval
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        # Both least recently used first
+        self._indexes: "OrderedDict[str, List[dict]]" = OrderedDict()
+        # Last version's scene per conversation, so a capture doesn't re-read the file to diff
+        self._latest: "OrderedDict[str, Dict[str, dict]]" = OrderedDict()
+
+    def _remember(self, cache: OrderedDict, conversation_id: str, value):
+        cache[conversation_id] = value
+        cache.move_to_end(conversation_id)
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def _paths(self, conversation_id: str):
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", conversation_id)
+        return self.root / f"{safe}.frames", self.root / f"{safe}.index.json"
+
+    def _index(self, conversation_id: str) -> List[dict]:
+        """The conversation's index; an empty one (not cached) if it has no versions yet."""
+        index = self._indexes.get(conversation_id)
+        if index is not None:
+            self._indexes.move_to_end(conversation_id)
+            return index
+        _, index_path = self._paths(conversation_id)
+        if not index_path.exists():
+            return []
+        index = json.loads(index_path.read_text())
+        self._remember(self._indexes, conversation_id, index)
+        return index
+
+    def capture(self, conversation_id: str, elements: List[dict], reason: str = "check") -> int:
+        """Store the scene as a new version (unless unchanged) and return its version number."""
+        with self._lock:
+            index = self._index(conversation_id)
+            scene = _scene_dict([el for el in elements if not el.get("isDeleted")])
+            latest = None
+            if index:
+                latest = self._latest.get(conversation_id)
+                if latest is None:
+                    latest = self._reconstruct(conversation_id, index[-1]["version"])
+                self._remember(self._latest, conversation_id, latest)
+                # Compare as item lists: dict equality ignores z-order
+                if list(latest.items()) == list(scene.items()):
+                    return index[-1]["version"]
+
+            version = len(index) + 1
+            keyframe = (version - 1) % self.keyframe_interval == 0
+            frame = {"elements": list(scene.values())} if keyframe else diff_scenes(latest, scene)
+            data = _encode(frame)
+
+            frames_path, index_path = self._paths(conversation_id)
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(frames_path, "ab") as f:
+                offset = f.tell()
+                f.write(data)
+            index.append({
+                "version": version,
+                "kind": "keyframe" if keyframe else "delta",
+                "offset": offset,
+                "length": len(data),
+                "elements": len(scene),
+                # Uncompressed size of the full scene, to report what the history saves
+                "scene_bytes": len(json.dumps(list(scene.values()), separators=(",", ":"))),
+                "captured_at": time.time(),
+                "reason": reason,
+            })
+            tmp_path = index_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(index))
+            os.replace(tmp_path, index_path)
+            self._remember(self._indexes, conversation_id, index)
+            self._remember(self._latest, conversation_id, scene)
+            return version
+
+    def _reconstruct(self, conversation_id: str, version: int) -> Dict[str, dict]:
+        index = self._index(conversation_id)
+        if not 1 <= version <= len(index):
+            raise KeyError(f"{conversation_id} has no diagram version {version}")
+        start = version - 1
+        while index[start]["kind"] != "keyframe":
+            start -= 1
+        frames_path, _ = self._paths(conversation_id)
+        scene: Dict[str, dict] = {}
+        with open(frames_path, "rb") as f:
+            for entry in index[start:version]:
+                f.seek(entry["offset"])
+                frame = _decode(f.read(entry["length"]))
+                scene = _scene_dict(frame["elements"]) if entry["kind"] == "keyframe" else apply_delta(scene, frame)
+        return scene
+
+    def get_version(self, conversation_id: str, version: Optional[int] = None) -> List[dict]:
+        """Elements of `version` (default: the latest)."""
+        with self._lock:
+            index = self._index(conversation_id)
+            if version is None:
+                version = len(index)
+            return list(self._reconstruct(conversation_id, version).values())
+
+    def versions(self, conversation_id: str) -> List[dict]:
+        with self._lock:
+            return [
+                {k: entry[k] for k in ("version", "kind", "elements", "captured_at", "reason")}
+                for entry in self._index(conversation_id)
+            ]
+
+    def stats(self, conversation_id: str) -> Dict[str, Any]:
+        with self._lock:
+            index = self._index(conversation_id)
+            stored = sum(entry["length"] for entry in index)
+            full = sum(entry["scene_bytes"] for entry in index)
+            return {
+                "count": len(index),
+                "stored_bytes": stored,
+                "full_scene_bytes": full,
+                "ratio": round(full / stored, 1) if stored else None,
+            }
+
+
+@lru_cache(maxsize=None)
+def get_diagram_history() -> DiagramHistory:
+    return DiagramHistory(
+        Path(os.getenv("DIAGRAM_HISTORY_DIR", "diagram_history")),
+        cache_size=int(os.getenv("DIAGRAM_HISTORY_CACHE_SIZE", "64")),
+    )
@@ -0,0 +1,163 @@
+"""
+Speculative Diagram Pre-Analysis
+
+While the candidate draws, the scene mirror reports every change. DiagramPrefetcher waits
+until the diagram has been quiet for a debounce interval, then analyzes it in the background
+and keeps the answer for the interview the canvas last belonged to, keyed by the scene's graph
+fingerprint. When that interviewer then calls /check_diagram on the same diagram, the analysis
+is already done and only the canvas writes remain. Answers are kept per conversation, so
+interviews running side by side don't discard each other's, and an answer is only served to
+the conversation it was computed for. Nothing is written to the canvas until the explicit check.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .diagram_cache import diagram_cache, scene_fingerprint
+from .scene_graph import CompiledScene, compile_scene
+from .scene_mirror import SceneMirror, get_scene_mirror, scene_mirror_enabled
+
+
+def refs_to_ids(response: Dict[str, Any], scene: CompiledScene) -> Dict[str, Any]:
+    """
+    Rewrite node refs in an analysis answer to element ids. Refs depend on layout, ids don't,
+    so the answer stays valid if the candidate only moves things before the check.
+    """
+    def to_id(ref):
+        return scene.ref_to_id.get(str(ref), ref)
+
+    rebased = dict(response)
+    rebased["issues"] = [{**issue, "id": to_id(issue.get("id"))} for issue in response.get("issues", [])]
+    rebased["elements_to_update"] = [
+        {**patch, "id": to_id(patch.get("id"))} for patch in response.get("elements_to_update", [])
+    ]
+    rebased["elements_to_create"] = [
+        {**item, "near": to_id(item["near"])} if "near" in item else item
+        for item in response.get("elements_to_create", [])
+    ]
+    return rebased
+
+
+class DiagramPrefetcher:
+    def __init__(
+        self,
+        mirror: SceneMirror,
+        debounce_s: float = 2.0,
+        analyze: Optional[Callable[[CompiledScene, Any], Awaitable[Dict[str, Any]]]] = None,
+        max_conversations: int = 64,
+        results_per_conversation: int = 4,
+    ):
+        self.mirror = mirror
+        # async (scene, previous DiagramAnalysis) -> answer; app.server plugs in its analyze_scene
+        self.analyze = analyze
+        self.debounce_s = debounce_s
+        # The interview the canvas currently belongs to (set by check_diagram / Tavus webhooks)
+        self.conversation_id: Optional[str] = None
+        self.max_conversations = max_conversations
+        self.results_per_conversation = results_per_conversation
+        # conversation_id -> {fingerprint: result}, both least recently stored first
+        self._results: "OrderedDict[str, OrderedDict[str, Dict[str, Any]]]" = OrderedDict()
+        self._timer: Optional[asyncio.Task] = None
+        self._analysis: Optional[asyncio.Task] = None
+        self.analyses = 0
+        self.hits = 0
+        self.misses = 0
+
+    def on_scene_change(self, version: int):
+        """Mirror listener: restart the quiet-period timer on every change."""
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+        self._timer = asyncio.create_task(self._after_quiet_period())
+
+    async def _after_quiet_period(self):
+        await asyncio.sleep(self.debounce_s)
+        # One analysis at a time; a change during it schedules the next round via the timer
+        if self._analysis and not self._analysis.done():
+            await asyncio.shield(self._analysis)
+        self._analysis = asyncio.create_task(self._analyze_current())
+
+    def _store(self, conversation_id: str, fingerprint: str, result: Dict[str, Any]):
+        results = self._results.setdefault(conversation_id, OrderedDict())
+        self._results.move_to_end(conversation_id)
+        results[fingerprint] = result
+        results.move_to_end(fingerprint)
+        while len(results) > self.results_per_conversation:
+            results.popitem(last=False)
+        while len(self._results) > self.max_conversations:
+            self._results.popitem(last=False)
+
+    async def _analyze_current(self):
+        # Without a known interview there is nobody to serve the answer to
+        conversation_id = self.conversation_id
+        if self.analyze is None or not self.mirror.fresh or conversation_id is None:
+            return
+        version, elements = self.mirror.snapshot()
+        scene = compile_scene(elements, exclude_ids=diagram_cache.injected_ids(conversation_id))
+        if not scene.nodes:
+            return
+        fingerprint = scene_fingerprint(scene)
+        previous = diagram_cache.get(conversation_id)
+        if previous and previous.fingerprint == fingerprint:
+            return  # the explicit check will hit the analysis cache anyway
+        if fingerprint in self._results.get(conversation_id, {}):
+            return  # only our own labels/colors or layout changed
+
+        started = time.perf_counter()
+        try:
+            response = await self.analyze(scene, previous)
+        except Exception as e:
+            print(f"Background diagram analysis failed: {e}")
+            return
+        self.analyses += 1
+        result = {
+            "version": version,
+            "response": refs_to_ids(response, scene),
+            "analyzed_at": time.time(),
+            "duration_s": round(time.perf_counter() - started, 3),
+        }
+        self._store(conversation_id, fingerprint, result)
+        print(f"Pre-analyzed diagram for {conversation_id} at scene v{version} in {result['duration_s']}s")
+
+    def take(self, conversation_id: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """This conversation's background answer for this exact diagram, if there is one."""
+        result = self._results.get(conversation_id, {}).get(fingerprint)
+        if result is not None:
+            self.hits += 1
+            return result["response"]
+        self.misses += 1
+        return None
+
+    def status(self) -> Dict[str, Any]:
+        latest = next(reversed(self._results[self.conversation_id].values()), None) if self.conversation_id in self._results else None
+        return {
+            "debounce_s": self.debounce_s,
+            "conversation_id": self.conversation_id,
+            "analyzing": bool(self._analysis and not self._analysis.done()),
+            "conversations": len(self._results),
+            "result_version": latest["version"] if latest else None,
+            "result_age_s": round(time.time() - latest["analyzed_at"], 3) if latest else None,
+            "analyses": self.analyses,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def stop(self):
+        for task in (self._timer, self._analysis):
+            if task and not task.done():
+                task.cancel()
+
+
+def diagram_prefetch_enabled() -> bool:
+    # Needs the live mirror to see changes as they happen
+    return scene_mirror_enabled() and os.getenv("DIAGRAM_PREFETCH", "false").lower() == "true"
+
+
+@lru_cache(maxsize=None)
+def get_diagram_prefetcher() -> DiagramPrefetcher:
+    prefetcher = DiagramPrefetcher(get_scene_mirror(), float(os.getenv("DIAGRAM_PREFETCH_DEBOUNCE_S", "2.0")))
+    prefetcher.mirror.add_listener(prefetcher.on_scene_change)
+    return prefetcher
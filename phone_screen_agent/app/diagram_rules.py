@@ -0,0 +1,179 @@
+"""
+Rule-Based Architecture Analyzer
+
+Most of what /check_diagram looks for is structural: a lone database with no replica, app
+servers with no load balancer in front, no cache between app and database, no auth, no CDN.
+This module finds those directly on the compiled scene graph in a few milliseconds and builds
+the same severity-colored patches the LLM used to produce. Components are recognised from
+their labels by keyword; a scene with no recognisable app or data tier is left to the LLM.
+"""
+
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from .scene_graph import CRITICAL, MINOR, MODERATE, CompiledScene, resolve_llm_patches
+
+SEVERITY_ORDER = {CRITICAL: 0, MODERATE: 1, MINOR: 2}
+
+# First matching role wins, so e.g. "Auth Service" is auth rather than app and
+# "Read Replica" is a replica rather than a database.
+ROLE_KEYWORDS: List[Tuple[str, Set[str]]] = [
+    ("cdn", {"cdn", "cloudfront", "akamai", "fastly", "edge"}),
+    ("lb", {"lb", "alb", "elb", "nlb", "balancer", "haproxy", "nginx", "ingress", "envoy"}),
+    ("cache", {"cache", "redis", "memcache", "memcached", "varnish"}),
+    ("replica", {"replica", "replicas", "standby", "secondary", "follower", "backup"}),
+    ("auth", {"auth", "oauth", "jwt", "identity", "login", "cognito", "sso", "okta", "authn", "authz"}),
+    ("search", {"search", "elastic", "elasticsearch", "opensearch", "solr", "algolia"}),
+    ("queue", {"queue", "kafka", "sqs", "rabbitmq", "rabbit", "pubsub", "kinesis", "nats", "bus"}),
+    ("storage", {"s3", "blob", "bucket", "gcs", "attachments", "files"}),
+    ("db", {"db", "database", "postgres", "postgresql", "mysql", "sql", "mongo", "mongodb", "dynamo",
+            "dynamodb", "cassandra", "spanner", "primary", "shard", "rds", "aurora", "datastore"}),
+    ("client", {"client", "browser", "mobile", "users", "frontend", "ios", "android"}),
+    ("app", {"app", "server", "servers", "service", "api", "backend", "web", "application"}),
+]
+
+
+def _words(label: str) -> Set[str]:
+    return set(re.findall(r"[a-z0-9]+", label.lower()))
+
+
+def classify_node(node: dict) -> Optional[str]:
+    words = _words(node["label"])
+    for role, keywords in ROLE_KEYWORDS:
+        if words & keywords:
+            return role
+    return None
+
+
+class SceneRoles:
+    """Node refs grouped by role, plus undirected adjacency for neighbour checks."""
+
+    def __init__(self, scene: CompiledScene):
+        self.role_of: Dict[str, Optional[str]] = {node["ref"]: classify_node(node) for node in scene.nodes}
+        self.by_role: Dict[str, List[str]] = {}
+        for node in scene.nodes:
+            role = self.role_of[node["ref"]]
+            if role:
+                self.by_role.setdefault(role, []).append(node["ref"])
+        self.neighbours: Dict[str, Set[str]] = {node["ref"]: set() for node in scene.nodes}
+        self.upstream: Dict[str, Set[str]] = {node["ref"]: set() for node in scene.nodes}
+        for edge in scene.edges:
+            source, target = edge["from"], edge["to"]
+            if source and target:
+                self.neighbours[source].add(target)
+                self.neighbours[target].add(source)
+                self.upstream[target].add(source)
+
+    def refs(self, role: str) -> List[str]:
+        return self.by_role.get(role, [])
+
+    def touches(self, ref: str, role: str) -> bool:
+        return any(self.role_of[other] == role for other in self.neighbours[ref])
+
+
+def _finding(rule: str, severity: str, ref: Optional[str], label: str, message: str) -> dict:
+    return {"rule": rule, "severity": severity, "ref": ref, "label": label, "message": message}
+
+
+def find_issues(scene: CompiledScene) -> Optional[List[dict]]:
+    """
+    Run every structural rule and return findings, most severe first.
+
+    Returns None when the diagram has no recognisable app or data tier (nothing drawn yet, or
+    components named in ways the keyword table doesn't know); those need the LLM.
+    """
+    roles = SceneRoles(scene)
+    apps, dbs = roles.refs("app"), roles.refs("db")
+    if not apps and not dbs:
+        return None
+
+    # Where to hang labels for "missing X" findings: the entry point, else any app/db
+    entry = (roles.refs("lb") or roles.refs("client") or apps or dbs)[0]
+    findings = []
+
+    unreplicated = [ref for ref in dbs if not roles.touches(ref, "replica")]
+    if len(dbs) == 1 and unreplicated:
+        findings.append(_finding(
+            "db_spof", CRITICAL, dbs[0], "SPOF",
+            "The database is a single point of failure: if it goes down, users lose access to all their notes. Add replication or a standby.",
+        ))
+    elif unreplicated:
+        for ref in unreplicated:
+            findings.append(_finding(
+                "db_no_replica", MINOR, ref, "Add Replicas",
+                "Some databases have no replica; read replicas would add redundancy and read capacity.",
+            ))
+
+    if len(apps) == 1:
+        findings.append(_finding(
+            "single_app_server", CRITICAL, apps[0], "Single Server",
+            "There is only one application server, so any crash or deploy takes the whole app down. Run several behind a load balancer.",
+        ))
+    if apps and not roles.refs("auth"):
+        findings.append(_finding(
+            "no_auth", CRITICAL, entry, "No Auth",
+            "There is no authentication or authorization layer, so nothing keeps users out of each other's notes.",
+        ))
+
+    lbs = set(roles.refs("lb"))
+    if len(apps) > 1 and not lbs:
+        findings.append(_finding(
+            "no_load_balancer", MODERATE, apps[0], "Add LB",
+            "Nothing distributes traffic across the app servers; put a load balancer in front of them.",
+        ))
+    elif lbs:
+        exposed = [ref for ref in apps if roles.upstream[ref] and not roles.upstream[ref] & lbs]
+        if exposed:
+            findings.append(_finding(
+                "app_bypasses_lb", MODERATE, exposed[0], "Behind LB?",
+                "Some app servers take traffic directly instead of through the load balancer.",
+            ))
+
+    caches = roles.refs("cache")
+    if apps and dbs and not any(roles.touches(ref, "app") for ref in caches):
+        findings.append(_finding(
+            "no_cache", MODERATE, apps[0], "Missing Cache",
+            "Every read goes straight to the database; a cache like Redis in front of it would take load off for frequently opened notes.",
+        ))
+    if not roles.refs("cdn"):
+        findings.append(_finding(
+            "no_cdn", MODERATE, entry, "No CDN",
+            "Static assets are served by the app itself; a CDN would cut page load time for users far from the servers.",
+        ))
+    if dbs and not roles.refs("search"):
+        findings.append(_finding(
+            "no_search", MODERATE, dbs[0], "No Search",
+            "There is no search infrastructure, so full-text note search would run as slow database scans.",
+        ))
+    if apps and not roles.refs("queue"):
+        findings.append(_finding(
+            "no_queue", MODERATE, apps[0], "Add Queue",
+            "Sync and notification work runs inline; a message queue would move it off the request path.",
+        ))
+
+    findings.sort(key=lambda f: SEVERITY_ORDER[f["severity"]])
+    return findings
+
+
+def findings_to_issues(findings: List[dict], max_findings: int = 3) -> List[dict]:
+    """The top findings in the same "issues" shape the LLM returns."""
+    return [
+        {"id": f["ref"], "label": f["label"], "severity": f["severity"]}
+        for f in findings[:max_findings]
+        if f["ref"]
+    ]
+
+
+def build_patches(findings: List[dict], scene: CompiledScene, max_findings: int = 3) -> Tuple[List[dict], List[dict]]:
+    """Turn the top findings into canvas updates/creates."""
+    return resolve_llm_patches({"issues": findings_to_issues(findings, max_findings)}, scene)
+
+
+def template_feedback(findings: List[dict], max_findings: int = 3) -> str:
+    """Feedback without an LLM: the top findings' messages, in severity order."""
+    if not findings:
+        return (
+            "This looks solid for a note-taking app: the data tier is replicated, traffic is load balanced, "
+            "and there's caching, auth, a CDN and search. Consider rate limiting and monitoring next."
+        )
+    return " ".join(f["message"] for f in findings[:max_findings])
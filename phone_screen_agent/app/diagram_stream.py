@@ -0,0 +1,140 @@
+"""
+Incremental Parsing for Streamed Diagram Analysis
+
+The diagram-check model answers with one JSON object whose "feedback" string comes first,
+followed by the "issues" array (older prompts: "elements_to_update"/"elements_to_create"). DiagramResponseParser reads
+that object as it streams: feedback text is surfaced character by character, and each patch
+object is returned as soon as its closing brace arrives. SentenceSplitter turns the feedback
+into whole sentences the interviewer can start speaking.
+"""
+
+import json
+import re
+from typing import Dict, List, Tuple
+
+PATCH_KEYS = ("issues", "elements_to_update", "elements_to_create")
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "", "f": "", "n": " ", "r": "", "t": " "}
+
+# End of sentence: terminal punctuation (optionally closed by a quote/bracket) followed by space
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*\s+")
+
+
+class SentenceSplitter:
+    """Accumulates streamed text and hands back complete sentences."""
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        sentences = []
+        while True:
+            match = _SENTENCE_END.search(self._buffer)
+            if not match:
+                break
+            sentence = self._buffer[: match.end()].strip()
+            self._buffer = self._buffer[match.end():]
+            if sentence:
+                sentences.append(sentence)
+        return sentences
+
+    def flush(self) -> List[str]:
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+class DiagramResponseParser:
+    """
+    Single-pass scanner over the streamed JSON response.
+
+    feed() returns (feedback_text_delta, {patch key: [completed objects]}) for the new chunk.
+    Text before the first "{" (e.g. a ```json fence) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._unicode = None
+        self._string_is_key = False
+        self._string_chars: List[str] = []
+        self._expect_key = False
+        self._key = None
+        self._patch_start = None
+
+    def feed(self, chunk: str) -> Tuple[str, Dict[str, List[dict]]]:
+        self.buffer += chunk
+        feedback = []
+        patches = {key: [] for key in PATCH_KEYS}
+        while self._pos < len(self.buffer):
+            i, ch = self._pos, self.buffer[self._pos]
+            self._pos += 1
+            streaming_feedback = (
+                self._in_string and not self._string_is_key and len(self._stack) == 1 and self._key == "feedback"
+            )
+            if self._in_string:
+                if self._unicode is not None:
+                    self._unicode += ch
+                    if len(self._unicode) == 4:
+                        try:
+                            decoded = chr(int(self._unicode, 16))
+                        except ValueError:
+                            decoded = ""
+                        self._unicode = None
+                        self._string_chars.append(decoded)
+                        if streaming_feedback:
+                            feedback.append(decoded)
+                elif self._escape:
+                    self._escape = False
+                    if ch == "u":
+                        self._unicode = ""
+                    else:
+                        decoded = _ESCAPES.get(ch, ch)
+                        self._string_chars.append(decoded)
+                        if streaming_feedback:
+                            feedback.append(decoded)
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        self._key = "".join(self._string_chars)
+                        self._expect_key = False
+                else:
+                    self._string_chars.append(ch)
+                    if streaming_feedback:
+                        feedback.append(ch)
+                continue
+
+            if ch == '"':
+                if not self._stack:
+                    continue
+                self._in_string = True
+                self._string_chars = []
+                # Only keys of the top-level object matter; nested keys stay inside patch objects
+                self._string_is_key = len(self._stack) == 1 and self._expect_key
+            elif ch == "{":
+                self._stack.append("{")
+                self._expect_key = True
+                if len(self._stack) == 3 and self._stack[1] == "[" and self._key in PATCH_KEYS:
+                    self._patch_start = i
+            elif ch == "[":
+                if self._stack:
+                    self._stack.append("[")
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if ch == "}" and len(self._stack) == 2 and self._patch_start is not None:
+                    try:
+                        patches[self._key].append(json.loads(self.buffer[self._patch_start: i + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self._patch_start = None
+                self._expect_key = False
+            elif ch == ",":
+                self._expect_key = bool(self._stack) and self._stack[-1] == "{"
+        return "".join(feedback), patches
@@ -5,16 +5,28 @@ This module contains rubrics and grading logic for phone screen and system desig
 Each interview is graded independently when its webhook is received.
 """
 
+import hashlib
 import json
+import math
 import os
-from openai import OpenAI
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-
-# Initialize OpenAI client
-openai_client = OpenAI(
-    base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+from functools import lru_cache
+from typing import Optional
+from .llm_gateway import PURPOSE_GRADING, chat_completion
+from .prompt_layout import PromptLayout
+from .tracing import in_current_context, span
+
+# Grading mode: "single" (one call), "chunked" (map-reduce over transcript windows),
+# "per_criterion" (one concurrent call per rubric criterion, weighted locally) or "auto"
+GRADING_MODE = os.getenv("GRADING_MODE", "single")
+GRADING_CHUNK_TOKENS = int(os.getenv("GRADING_CHUNK_TOKENS", "3000"))
+# Unset: 4 workers in chunked mode, one per call (criteria + summary) in per_criterion mode
+GRADING_MAX_WORKERS = int(os.getenv("GRADING_MAX_WORKERS", "0")) or None
+GRADING_CHUNK_WORKERS = 4
+GRADING_CRITERION_RETRIES = int(os.getenv("GRADING_CRITERION_RETRIES", "2"))
 
 PHONE_SCREEN_RUBRIC = """
 # Phone Screen Interview Rubric
@@ -116,31 +128,19 @@ Based on the system design interviewer prompt:
 """
 
 
-def grade_interview(transcript: str, interview_type: str) -> dict:
-    """
-    Grade an interview transcript using the appropriate rubric.
-    
-    Args:
-        transcript: The full interview transcript
-        interview_type: Either "phone_screen" or "system_design"
-    
-    Returns:
-        dict with score (0-3), reasoning, and summary
-    """
-    rubric = PHONE_SCREEN_RUBRIC if interview_type == "phone_screen" else SYSTEM_DESIGN_RUBRIC
-    
-    prompt = f"""
-You are an expert technical interviewer at x.ai. You are grading a {interview_type.replace('_', ' ')} interview.
+GRADER_SYSTEM = "You are an expert technical interviewer. You evaluate candidates fairly and provide detailed, specific feedback. You return only valid JSON."
+EVIDENCE_SYSTEM = "You are an expert technical interviewer. You extract specific, factual evidence from interview transcripts. You return only valid JSON."
+
+# Static instructions per grading call. Rubric and output format come before the transcript so
+# they form a cached prefix; only the transcript (or evidence) varies between calls.
+SINGLE_SHOT_INSTRUCTIONS = """
+You are an expert technical interviewer at x.ai. You are grading a {interview} interview.
 
 Here is the rubric to use:
 
 {rubric}
 
-Here is the interview transcript:
-
-{transcript}
-
-Based on the rubric, provide your evaluation in the following JSON format:
+The next message is the interview transcript. Based on the rubric, provide your evaluation in the following JSON format:
 
 {{
   "score": <0-3>,
@@ -152,31 +152,445 @@ Be specific and reference actual examples from the transcript in your reasoning.
 Return ONLY valid JSON, no other text.
 """
 
-    try:
-        completion = openai_client.chat.completions.create(
-            model=os.getenv("LLM_MODEL", "gpt-4o"),
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert technical interviewer. You evaluate candidates fairly and provide detailed, specific feedback. You return only valid JSON."
+CHUNK_EVIDENCE_INSTRUCTIONS = """
+You are an expert technical interviewer at x.ai reviewing one part of a {interview} interview transcript.
+
+Here is the rubric:
+
+{rubric}
+
+The next message says which part this is and contains that part of the transcript.
+
+Do NOT score the candidate. For each evaluation criterion in the rubric, extract concrete evidence
+(positive or negative) from this part only, quoting or closely paraphrasing the candidate.
+
+Return JSON in this format:
+
+{{
+  "evidence": {{
+    "<criterion name>": ["<short evidence point>", "..."]
+  }},
+  "topics": "<one sentence on what was discussed in this part>"
+}}
+
+Omit criteria with no evidence in this part. Return ONLY valid JSON, no other text.
+"""
+
+CHUNKED_GRADE_INSTRUCTIONS = """
+You are an expert technical interviewer at x.ai. You are grading a {interview} interview.
+
+Here is the rubric to use:
+
+{rubric}
+
+The transcript was too long to review at once, so it was split into consecutive parts. The next
+message has the evidence extracted from each part, in order.
+
+Based on the rubric and this evidence, provide your evaluation in the following JSON format:
+
+{{
+  "score": <0-3>,
+  "reasoning": "<2-3 paragraphs explaining your score, referencing specific examples from the evidence>",
+  "summary": "<1 paragraph summary of the interview covering what was discussed and the candidate's performance>"
+}}
+
+Return ONLY valid JSON, no other text.
+"""
+
+PER_CRITERION_INSTRUCTIONS = """
+You are an expert technical interviewer at x.ai. You are grading a {interview} interview.
+
+Here is the rubric to use:
+
+{rubric}
+
+The next message is the interview transcript, followed by your task.
+"""
+
+_GRADING_PROMPTS = {
+    "single": (GRADER_SYSTEM, SINGLE_SHOT_INSTRUCTIONS),
+    "chunk_evidence": (EVIDENCE_SYSTEM, CHUNK_EVIDENCE_INSTRUCTIONS),
+    "chunked": (GRADER_SYSTEM, CHUNKED_GRADE_INSTRUCTIONS),
+    "per_criterion": (GRADER_SYSTEM, PER_CRITERION_INSTRUCTIONS),
+}
+
+
+def _rubric_for(interview_type: str) -> str:
+    return PHONE_SCREEN_RUBRIC if interview_type == "phone_screen" else SYSTEM_DESIGN_RUBRIC
+
+
+@lru_cache(maxsize=None)
+def grading_layout(kind: str, interview_type: str) -> PromptLayout:
+    """Prompt layout for one kind of grading call; the rubric is filled in once, here."""
+    system, instructions = _GRADING_PROMPTS[kind]
+    return PromptLayout(
+        f"grading.{kind}.{interview_type}",
+        system,
+        instructions.format(interview=interview_type.replace("_", " "), rubric=_rubric_for(interview_type)),
+    )
+
+
+def _strip_json_fences(content: str) -> str:
+    """Remove markdown code blocks the model sometimes wraps around JSON."""
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.strip("`")
+        if content.lower().startswith("json"):
+            content = content[4:].lstrip()
+    return content
+
+
+def _usage_tokens(completion) -> dict:
+    """Pull prompt/completion token counts off a chat completion."""
+    usage = getattr(completion, "usage", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+    }
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for chunk budgeting."""
+    return max(1, len(text) // 4)
+
+
+def split_transcript_into_chunks(transcript: str, max_tokens: int = GRADING_CHUNK_TOKENS) -> list:
+    """
+    Split a transcript into windows of at most ~max_tokens, breaking only on turn boundaries.
+
+    Both Retell ("Agent: ...") and Tavus ("user: ...") transcripts put one turn per line,
+    so lines are the unit. A single turn longer than the budget becomes its own window.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for line in transcript.splitlines():
+        if not line.strip():
+            continue
+        line_tokens = estimate_tokens(line)
+        if current and current_tokens + line_tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current = []
+            current_tokens = 0
+        current.append(line)
+        current_tokens += line_tokens
+
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _grade_single_shot(transcript: str, interview_type: str) -> dict:
+    """Grade the whole transcript in one LLM call."""
+    layout = grading_layout("single", interview_type)
+    completion = chat_completion(
+        PURPOSE_GRADING,
+        prompt_name=layout.name,
+        model=os.getenv("LLM_MODEL", "gpt-4o"),
+        messages=layout.messages(f"Here is the interview transcript:\n\n{transcript}"),
+        temperature=0.3,
+    )
+
+    result = json.loads(_strip_json_fences(completion.choices[0].message.content))
+    result["grading_stats"] = {"mode": "single", "llm_calls": 1, **_usage_tokens(completion)}
+    return result
+
+
+def _extract_chunk_evidence(chunk: str, index: int, total: int, interview_type: str) -> tuple:
+    """Map step: pull per-criterion evidence out of one transcript window."""
+    layout = grading_layout("chunk_evidence", interview_type)
+    completion = chat_completion(
+        PURPOSE_GRADING,
+        prompt_name=layout.name,
+        model=os.getenv("LLM_MODEL", "gpt-4o"),
+        messages=layout.messages(f"Here is part {index + 1} of {total} of the transcript:\n\n{chunk}"),
+        temperature=0.2,
+    )
+
+    evidence = json.loads(_strip_json_fences(completion.choices[0].message.content))
+    return evidence, _usage_tokens(completion)
+
+
+def _grade_chunked(transcript: str, interview_type: str, chunk_tokens: int, max_workers: Optional[int]) -> dict:
+    """Map-reduce grading: extract evidence per window in parallel, then score once."""
+    chunks = split_transcript_into_chunks(transcript, chunk_tokens)
+    max_workers = max_workers or GRADING_CHUNK_WORKERS
+    print(f"Grading {interview_type} in {len(chunks)} chunks (~{chunk_tokens} tokens each, {max_workers} workers)")
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        mapped = list(executor.map(
+            in_current_context(lambda args: _extract_chunk_evidence(args[1], args[0], len(chunks), interview_type)),
+            enumerate(chunks),
+        ))
+
+    prompt_tokens = sum(usage["prompt_tokens"] for _, usage in mapped)
+    completion_tokens = sum(usage["completion_tokens"] for _, usage in mapped)
+    evidence_by_part = [
+        {"part": i + 1, **evidence} for i, (evidence, _) in enumerate(mapped)
+    ]
+
+    layout = grading_layout("chunked", interview_type)
+    completion = chat_completion(
+        PURPOSE_GRADING,
+        prompt_name=layout.name,
+        model=os.getenv("LLM_MODEL", "gpt-4o"),
+        messages=layout.messages(
+            f"Evidence from the {len(chunks)} parts of the transcript:\n\n{json.dumps(evidence_by_part, indent=1)}"
+        ),
+        temperature=0.3,
+    )
+
+    result = json.loads(_strip_json_fences(completion.choices[0].message.content))
+    reduce_usage = _usage_tokens(completion)
+    result["grading_stats"] = {
+        "mode": "chunked",
+        "chunks": len(chunks),
+        "chunk_tokens": chunk_tokens,
+        "max_workers": max_workers,
+        "llm_calls": len(chunks) + 1,
+        "prompt_tokens": prompt_tokens + reduce_usage["prompt_tokens"],
+        "completion_tokens": completion_tokens + reduce_usage["completion_tokens"],
+    }
+    return result
+
+
+CRITERION_HEADER = re.compile(r"^\d+\.\s+\*\*(?P<name>.+?)\s+\((?P<weight>\d+)%\)\*\*\s*$", re.MULTILINE)
+
+CRITERION_SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer", "enum": [0, 1, 2, 3]},
+        "reasoning": {"type": "string"},
+        "evidence": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["score", "reasoning", "evidence"],
+    "additionalProperties": False,
+}
+
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {"summary": {"type": "string"}},
+    "required": ["summary"],
+    "additionalProperties": False,
+}
+
+
+def parse_rubric_criteria(rubric: str) -> list:
+    """
+    Parse the weighted evaluation criteria out of a rubric.
+
+    Returns a list of {"name", "weight", "description"} dicts, weight as a fraction,
+    so the rubric text stays the single source of truth for the weights.
+    """
+    matches = list(CRITERION_HEADER.finditer(rubric))
+    criteria = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else rubric.find("## Scoring Guide")
+        criteria.append({
+            "name": match.group("name"),
+            "weight": int(match.group("weight")) / 100,
+            "description": rubric[match.start():end].strip(),
+        })
+    return criteria
+
+
+def _criterion_cache_options(transcript: str, interview_type: str) -> dict:
+    """Route every call for one transcript to the same provider cache as its shared prefix."""
+    name = grading_layout("per_criterion", interview_type).name
+    return {"prompt_name": name, "cache_key": f"{name}:{hashlib.sha256(transcript.encode()).hexdigest()[:16]}"}
+
+
+def _criterion_messages(transcript: str, interview_type: str, task: str) -> list:
+    """
+    Build messages for one per-criterion call.
+
+    Everything except the final task message is identical across the concurrent calls for
+    one transcript, so the provider can serve it from its prompt-prefix cache.
+    """
+    return grading_layout("per_criterion", interview_type).messages(
+        f"Here is the interview transcript:\n\n{transcript}",
+        task,
+    )
+
+
+def _structured_completion(messages: list, schema_name: str, schema: dict, prompt_name: Optional[str] = None,
+                          cache_key: Optional[str] = None) -> tuple:
+    """
+    Run a chat completion constrained to a JSON schema, retrying malformed output.
+
+    Returns (data, usage); usage counts tokens and LLM calls over every attempt. A failure after the
+    last retry raises with the same counts on the exception's `usage` attribute.
+    """
+    last_error = None
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "llm_calls": 0}
+    for attempt in range(GRADING_CRITERION_RETRIES + 1):
+        usage["llm_calls"] += 1
+        try:
+            completion = chat_completion(
+                PURPOSE_GRADING,
+                prompt_name=prompt_name,
+                cache_key=cache_key,
+                model=os.getenv("LLM_MODEL", "gpt-4o"),
+                messages=messages,
+                temperature=0.3,
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {"name": schema_name, "schema": schema, "strict": True},
                 },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.3,
-        )
-        
-        content = completion.choices[0].message.content.strip()
-        
-        # Remove markdown code blocks if present
-        if content.startswith("```"):
-            content = content.strip("`")
-            if content.lower().startswith("json"):
-                content = content[4:].lstrip()
-        
-        result = json.loads(content)
+            )
+            for key, tokens in _usage_tokens(completion).items():
+                usage[key] += tokens
+            data = json.loads(_strip_json_fences(completion.choices[0].message.content))
+            missing = [key for key in schema["required"] if key not in data]
+            if missing:
+                raise ValueError(f"missing keys {missing}")
+            return data, usage
+        except Exception as e:
+            last_error = e
+            print(f"Retrying {schema_name} (attempt {attempt + 1}): {e}")
+    last_error.usage = usage
+    raise last_error
+
+
+def _score_criterion(transcript: str, interview_type: str, criterion: dict) -> tuple:
+    """Score a single rubric criterion on the 0-3 scale."""
+    task = f"""
+Score the candidate ONLY on this criterion, ignoring the others:
+
+{criterion["description"]}
+
+Use the rubric's 0-3 scoring guide. Return JSON with "score" (0-3), "reasoning" (1 paragraph
+referencing specific examples from the transcript) and "evidence" (short quotes or paraphrases).
+"""
+    return _structured_completion(
+        _criterion_messages(transcript, interview_type, task), "criterion_score", CRITERION_SCORE_SCHEMA,
+        **_criterion_cache_options(transcript, interview_type),
+    )
+
+
+def _summarize_interview(transcript: str, interview_type: str) -> tuple:
+    """Write the interview summary, run alongside the criterion calls."""
+    task = """
+Do not score the candidate. Return JSON with "summary": a 1 paragraph summary of the interview
+covering what was discussed and the candidate's performance.
+"""
+    return _structured_completion(
+        _criterion_messages(transcript, interview_type, task), "interview_summary", SUMMARY_SCHEMA,
+        **_criterion_cache_options(transcript, interview_type),
+    )
+
+
+def _grade_per_criterion(transcript: str, interview_type: str, max_workers: Optional[int]) -> dict:
+    """Score every rubric criterion concurrently and combine the weights locally."""
+    criteria = parse_rubric_criteria(_rubric_for(interview_type))
+    # One worker per call by default, so wall time is about one criterion call
+    max_workers = max_workers or len(criteria) + 1
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        summary_future = executor.submit(in_current_context(_summarize_interview), transcript, interview_type)
+        criterion_futures = [
+            (criterion, executor.submit(in_current_context(_score_criterion), transcript, interview_type, criterion))
+            for criterion in criteria
+        ]
+
+        breakdown = []
+        failed = []
+        totals = {"prompt_tokens": 0, "completion_tokens": 0, "llm_calls": 0}
+
+        def add_usage(usage: dict):
+            for key in totals:
+                totals[key] += usage.get(key, 0)
+
+        for criterion, future in criterion_futures:
+            try:
+                data, usage = future.result()
+            except Exception as e:
+                print(f"Criterion '{criterion['name']}' failed after retries: {e}")
+                add_usage(getattr(e, "usage", {}))
+                failed.append(criterion["name"])
+                continue
+            add_usage(usage)
+            breakdown.append({
+                "name": criterion["name"],
+                "weight": criterion["weight"],
+                "score": int(data["score"]),
+                "reasoning": data["reasoning"],
+                "evidence": data["evidence"],
+            })
+
+        try:
+            summary_data, usage = summary_future.result()
+            summary = summary_data["summary"]
+            add_usage(usage)
+        except Exception as e:
+            print(f"Summary failed after retries: {e}")
+            add_usage(getattr(e, "usage", {}))
+            summary = ""
+
+    if not breakdown:
+        raise RuntimeError("All criteria failed to grade")
+
+    # Renormalize over the criteria that graded so a single failure doesn't sink the grade
+    total_weight = sum(c["weight"] for c in breakdown)
+    weighted_score = sum(c["weight"] * c["score"] for c in breakdown) / total_weight
+
+    return {
+        # Half up (round() takes a weighted 2.5 down to 2), after dropping float noise like 2.4999999999999996
+        "score": math.floor(round(weighted_score, 6) + 0.5),
+        "weighted_score": round(weighted_score, 3),
+        "reasoning": "\n\n".join(
+            f"{c['name']} ({int(c['weight'] * 100)}%): {c['score']}/3. {c['reasoning']}" for c in breakdown
+        ),
+        "summary": summary,
+        "criteria": breakdown,
+        "failed_criteria": failed,
+        "grading_stats": {
+            "mode": "per_criterion",
+            "max_workers": max_workers,
+            **totals,
+        },
+    }
+
+
+def grade_interview(
+    transcript: str,
+    interview_type: str,
+    mode: Optional[str] = None,
+    chunk_tokens: int = GRADING_CHUNK_TOKENS,
+    max_workers: Optional[int] = GRADING_MAX_WORKERS,
+) -> dict:
+    """
+    Grade an interview transcript using the appropriate rubric.
+    
+    Args:
+        transcript: The full interview transcript
+        interview_type: Either "phone_screen" or "system_design"
+        mode: "single", "chunked", "per_criterion" or "auto" (chunked only when the
+            transcript exceeds one chunk). Defaults to the GRADING_MODE env var.
+        chunk_tokens: Token budget per transcript window in chunked mode
+        max_workers: Number of concurrent calls in chunked and per_criterion modes (None: 4 chunks
+            at a time, or every per_criterion call at once)
+    
+    Returns:
+        dict with score (0-3), reasoning, summary and grading_stats (mode, wall time, tokens)
+    """
+    mode = mode or GRADING_MODE
+    if mode == "auto":
+        mode = "chunked" if estimate_tokens(transcript) > chunk_tokens else "single"
+
+    started = time.perf_counter()
+    try:
+        with span("grading", interview_type=interview_type, mode=mode, transcript_chars=len(transcript)) as grading:
+            if mode == "chunked":
+                result = _grade_chunked(transcript, interview_type, chunk_tokens, max_workers)
+            elif mode == "per_criterion":
+                result = _grade_per_criterion(transcript, interview_type, max_workers)
+            else:
+                result = _grade_single_shot(transcript, interview_type)
+            grading.set(score=result["score"])
+
+        result["grading_stats"]["wall_time_s"] = round(time.perf_counter() - started, 3)
         result["interview_type"] = interview_type
         result["graded_at"] = datetime.utcnow().isoformat()
         
@@ -193,6 +607,20 @@ Return ONLY valid JSON, no other text.
         }
 
 
+def compare_grading_modes(
+    transcript: str,
+    interview_type: str,
+    modes: tuple = ("single", "chunked", "per_criterion"),
+    **kwargs,
+) -> dict:
+    """Grade the same transcript in each mode and report score, time and tokens side by side."""
+    report = {"transcript_tokens_estimate": estimate_tokens(transcript)}
+    for mode in modes:
+        result = grade_interview(transcript, interview_type, mode=mode, **kwargs)
+        report[mode] = {"score": result["score"], **result.get("grading_stats", {})}
+    return report
+
+
 def extract_transcript_from_retell(call_data: dict) -> str:
     """Extract transcript from Retell call data."""
     if not call_data:
@@ -237,3 +665,38 @@ def extract_transcript_from_tavus(webhook_data: dict) -> str:
     except Exception as e:
         print(f"Error extracting Tavus transcript: {e}")
         return ""
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Compare grading modes on a saved interview")
+    parser.add_argument("path", help="call_data/*.json or tavus_webhooks/*.json file with a transcript")
+    parser.add_argument("--interview-type", choices=["phone_screen", "system_design"])
+    parser.add_argument("--chunk-tokens", type=int, default=GRADING_CHUNK_TOKENS)
+    parser.add_argument("--max-workers", type=int, default=GRADING_MAX_WORKERS)
+    parser.add_argument("--modes", nargs="+", default=["single", "chunked", "per_criterion"])
+    args = parser.parse_args()
+
+    with open(args.path) as f:
+        data = json.load(f)
+
+    if "payload" in data:
+        transcript = extract_transcript_from_tavus(data)
+        interview_type = args.interview_type or "system_design"
+    else:
+        transcript = extract_transcript_from_retell(data)
+        interview_type = args.interview_type or "phone_screen"
+
+    if not transcript:
+        sys.exit(f"No transcript found in {args.path}")
+
+    report = compare_grading_modes(
+        transcript,
+        interview_type,
+        modes=tuple(args.modes),
+        chunk_tokens=args.chunk_tokens,
+        max_workers=args.max_workers,
+    )
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,149 @@
+"""
+Collision-Free Annotation Placement
+
+Annotation labels ("SPOF", "No Auth", ...) are positioned locally instead of by the model.
+Every occupied box on the canvas (shapes, text, arrow segments, previously placed labels) is
+bucketed into a uniform grid; placing a label tries candidate spots around its target, nearest
+first, and takes the first one whose box hits nothing in the grid. A lookup only touches the
+few cells under the candidate box, so placement stays cheap on large scenes.
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+Box = Tuple[float, float, float, float]
+
+CELL_SIZE = 100
+LABEL_GAP = 10
+# Approximate Excalidraw text metrics (Virgil/Excalifont at lineHeight 1.25)
+CHAR_WIDTH_RATIO = 0.6
+LINE_HEIGHT_RATIO = 1.25
+# How many rings of candidate positions to try around a target before giving up
+MAX_RINGS = 10
+# An identical label this close to the target counts as already placed
+DUPLICATE_DISTANCE = 60
+
+
+def text_box_size(text: str, font_size: float) -> Tuple[float, float]:
+    lines = text.split("\n")
+    return max(len(line) for line in lines) * font_size * CHAR_WIDTH_RATIO, len(lines) * font_size * LINE_HEIGHT_RATIO
+
+
+def element_box(el: dict) -> Box:
+    x, y = el.get("x", 0), el.get("y", 0)
+    return x, y, x + (el.get("width") or 0), y + (el.get("height") or 0)
+
+
+def _overlaps(a: Box, b: Box) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _box_distance(a: Box, b: Box) -> float:
+    dx = max(b[0] - a[2], 0, a[0] - b[2])
+    dy = max(b[1] - a[3], 0, a[1] - b[3])
+    return (dx * dx + dy * dy) ** 0.5
+
+
+def _segment_boxes(el: dict) -> List[Box]:
+    """Arrows/lines occupy their segments, not their (often huge, mostly empty) bounding box."""
+    x, y = el.get("x", 0), el.get("y", 0)
+    points = el.get("points") or [[0, 0], [el.get("width") or 0, el.get("height") or 0]]
+    boxes = []
+    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+        boxes.append((x + min(x1, x2) - 2, y + min(y1, y2) - 2, x + max(x1, x2) + 2, y + max(y1, y2) + 2))
+    return boxes
+
+
+class SpatialGrid:
+    """Uniform-grid index of axis-aligned boxes."""
+
+    def __init__(self, cell_size: float = CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        self.boxes: List[Box] = []
+
+    def _cells(self, box: Box) -> Iterable[Tuple[int, int]]:
+        size = self.cell_size
+        for cx in range(int(box[0] // size), int(box[2] // size) + 1):
+            for cy in range(int(box[1] // size), int(box[3] // size) + 1):
+                yield cx, cy
+
+    def insert(self, box: Box) -> int:
+        index = len(self.boxes)
+        self.boxes.append(box)
+        for cell in self._cells(box):
+            self.cells.setdefault(cell, []).append(index)
+        return index
+
+    def query(self, box: Box) -> List[int]:
+        """Indexes of stored boxes overlapping `box`."""
+        seen = set()
+        hits = []
+        for cell in self._cells(box):
+            for index in self.cells.get(cell, ()):
+                if index not in seen:
+                    seen.add(index)
+                    if _overlaps(self.boxes[index], box):
+                        hits.append(index)
+        return hits
+
+    def is_free(self, box: Box) -> bool:
+        return not self.query(box)
+
+
+class LabelPlacer:
+    """Places labels next to their targets without overlapping anything on the canvas."""
+
+    def __init__(self, elements: List[dict], cell_size: float = CELL_SIZE):
+        self.grid = SpatialGrid(cell_size)
+        # (text, box) of every text element, to avoid re-adding a label that's already there
+        self.texts: List[Tuple[str, Box]] = []
+        for el in elements:
+            if el.get("isDeleted"):
+                continue
+            if el.get("type") in ("arrow", "line"):
+                for box in _segment_boxes(el):
+                    self.grid.insert(box)
+                continue
+            box = element_box(el)
+            self.grid.insert(box)
+            if el.get("type") == "text" and el.get("text"):
+                self.texts.append((el["text"].strip().lower(), box))
+
+    def _candidates(self, target: Box, width: float, height: float) -> Iterable[Tuple[float, float]]:
+        x1, y1, x2, y2 = target
+        mid_y = (y1 + y2) / 2 - height / 2
+        mid_x = (x1 + x2) / 2 - width / 2
+        for ring in range(MAX_RINGS):
+            gap = LABEL_GAP + ring * (height + LABEL_GAP)
+            # Right (top, middle, bottom), above, below, left - reading order, nearest ring first
+            yield x2 + gap, y1
+            yield x2 + gap, mid_y
+            yield x2 + gap, y2 - height
+            yield x1, y1 - gap - height
+            yield mid_x, y1 - gap - height
+            yield x1, y2 + gap
+            yield mid_x, y2 + gap
+            yield x1 - gap - width, y1
+            yield x1 - gap - width, mid_y
+
+    def already_labelled(self, target: dict, text: str) -> bool:
+        wanted = text.strip().lower()
+        box = element_box(target)
+        return any(t == wanted and _box_distance(box, b) <= DUPLICATE_DISTANCE for t, b in self.texts)
+
+    def place(self, target: dict, text: str, font_size: float = 20) -> Tuple[float, float]:
+        """Top-left corner for `text` next to `target`; the spot is then marked occupied."""
+        width, height = text_box_size(text, font_size)
+        target_box = element_box(target)
+        chosen = None
+        for x, y in self._candidates(target_box, width, height):
+            if self.grid.is_free((x, y, x + width, y + height)):
+                chosen = (x, y)
+                break
+        if chosen is None:
+            # Crowded on every side: fall back to the right of the target, past the last ring
+            chosen = (target_box[2] + LABEL_GAP + MAX_RINGS * (height + LABEL_GAP), target_box[1])
+        box = (chosen[0], chosen[1], chosen[0] + width, chosen[1] + height)
+        self.grid.insert(box)
+        self.texts.append((text.strip().lower(), box))
+        return chosen
@@ -1,6 +1,7 @@
-from openai import AsyncOpenAI
 import os
-from typing import List
+from typing import List, Optional
+from .llm_gateway import PURPOSE_VOICE_TURN, stream_chat_completion
+from .prompt_layout import PromptLayout
 from .custom_types import (
     ResponseRequiredRequest,
     ResponseResponse,
@@ -27,13 +28,16 @@ Personality: Friendly, direct, technical. Stay positive but not overly enthusias
 Demonstrate engineering depth and curiosity. Keep pace brisk to fit the 15-minute format."""
 
 
+voice_prompt = PromptLayout(
+    "voice_turn.plain",
+    '##Objective\nYou are a voice AI agent engaging in a human-like voice conversation with the user. You will respond based on your given instruction and the provided transcript and be as human-like as possible\n\n## Style Guardrails\n- [Be concise] Keep your response succinct, short, and get to the point quickly. Address one question or action item at a time. Don\'t pack everything you want to say into one utterance.\n- [Do not repeat] Don\'t repeat what\'s in the transcript. Rephrase if you have to reiterate a point. Use varied sentence structures and vocabulary to ensure each response is unique and personalized.\n- [Be conversational] Speak like a human as though you\'re speaking to a close friend -- use everyday language and keep it human-like. Occasionally add filler words, while keeping the prose short. Avoid using big words or sounding too formal.\n- [Reply with emotions]: You have human-like emotions, attitudes, and dispositions. When appropriate: use tone and style to create more engaging and personalized responses; incorporate humor or wit; get emotional or empathetic; apply elements of surprise or suspense to keep the user engaged. Don\'t be a pushover.\n- [Be proactive] Lead the conversation and do not be passive. Most times, engage users by ending with a question or suggested next step.\n\n## Response Guideline\n- [Overcome ASR errors] This is a real-time transcript, expect there to be errors. If you can guess what the user is trying to say,  then guess and respond. When you must ask for clarification, pretend that you heard the voice and be colloquial (use phrases like "didn\'t catch that", "some noise", "pardon", "you\'re coming through choppy", "static in your speech", "voice is cutting in and out"). Do not ever mention "transcription error", and don\'t repeat yourself.\n- [Always stick to your role] Think about what your role can and cannot do. If your role cannot do something, try to steer the conversation back to the goal of the conversation and to your role. Don\'t repeat yourself in doing this. You should still be creative, human-like, and lively.\n- [Create smooth conversation] Your response should both fit your role and fit into the live calling session to create a human-like conversation. You respond directly to what the user just said.\n\n## Role\n'
+    + agent_prompt,
+)
+
+
 class LlmClient:
-    def __init__(self):
-        self.client = AsyncOpenAI(
-            organization=os.environ["OPENAI_ORGANIZATION_ID"],
-            api_key=os.environ["OPENAI_API_KEY"],
-            base_url=os.getenv("OPENAI_BASE_URL"),
-        )
+    def __init__(self, call_id: Optional[str] = None):
+        self.call_id = call_id
 
     def draft_begin_message(self):
         response = ResponseResponse(
@@ -54,34 +58,24 @@ class LlmClient:
         return messages
 
     def prepare_prompt(self, request: ResponseRequiredRequest):
-        prompt = [
-            {
-                "role": "system",
-                "content": '##Objective\nYou are a voice AI agent engaging in a human-like voice conversation with the user. You will respond based on your given instruction and the provided transcript and be as human-like as possible\n\n## Style Guardrails\n- [Be concise] Keep your response succinct, short, and get to the point quickly. Address one question or action item at a time. Don\'t pack everything you want to say into one utterance.\n- [Do not repeat] Don\'t repeat what\'s in the transcript. Rephrase if you have to reiterate a point. Use varied sentence structures and vocabulary to ensure each response is unique and personalized.\n- [Be conversational] Speak like a human as though you\'re speaking to a close friend -- use everyday language and keep it human-like. Occasionally add filler words, while keeping the prose short. Avoid using big words or sounding too formal.\n- [Reply with emotions]: You have human-like emotions, attitudes, and dispositions. When appropriate: use tone and style to create more engaging and personalized responses; incorporate humor or wit; get emotional or empathetic; apply elements of surprise or suspense to keep the user engaged. Don\'t be a pushover.\n- [Be proactive] Lead the conversation and do not be passive. Most times, engage users by ending with a question or suggested next step.\n\n## Response Guideline\n- [Overcome ASR errors] This is a real-time transcript, expect there to be errors. If you can guess what the user is trying to say,  then guess and respond. When you must ask for clarification, pretend that you heard the voice and be colloquial (use phrases like "didn\'t catch that", "some noise", "pardon", "you\'re coming through choppy", "static in your speech", "voice is cutting in and out"). Do not ever mention "transcription error", and don\'t repeat yourself.\n- [Always stick to your role] Think about what your role can and cannot do. If your role cannot do something, try to steer the conversation back to the goal of the conversation and to your role. Don\'t repeat yourself in doing this. You should still be creative, human-like, and lively.\n- [Create smooth conversation] Your response should both fit your role and fit into the live calling session to create a human-like conversation. You respond directly to what the user just said.\n\n## Role\n'
-                + agent_prompt,
-            }
-        ]
-        transcript_messages = self.convert_transcript_to_openai_messages(
-            request.transcript
+        # Static system prompt first, then the call's transcript: each turn extends the
+        # previous turn's prompt, so everything up to the newest utterances is a cached prefix
+        reminder = (
+            [{"role": "user", "content": "(Now the user has not responded in a while, you would say:)"}]
+            if request.interaction_type == "reminder_required"
+            else []
         )
-        for message in transcript_messages:
-            prompt.append(message)
-
-        if request.interaction_type == "reminder_required":
-            prompt.append(
-                {
-                    "role": "user",
-                    "content": "(Now the user has not responded in a while, you would say:)",
-                }
-            )
-        return prompt
+        return voice_prompt.messages(self.convert_transcript_to_openai_messages(request.transcript), reminder)
 
     async def draft_response(self, request: ResponseRequiredRequest):
         prompt = self.prepare_prompt(request)
-        stream = await self.client.chat.completions.create(
+        stream = stream_chat_completion(
+            PURPOSE_VOICE_TURN,
             model=os.getenv("LLM_MODEL", "gpt-4-turbo-preview"),  # Or use a 3.5 model for speed
             messages=prompt,
-            stream=True,
+            prompt_name=voice_prompt.name,
+            # Keep one call's turns on the same provider cache
+            cache_key=f"{voice_prompt.name}:{self.call_id}" if self.call_id else None,
         )
         async for chunk in stream:
             if chunk.choices[0].delta.content is not None:
@@ -0,0 +1,335 @@
+"""
+LLM Endpoint Failover
+
+Voice turns, grading and diagram checks used to share the single OPENAI_BASE_URL, so one slow or
+failing provider took every live call down with it. The gateway now sends each request through
+a pool of OpenAI-compatible endpoints:
+
+- Health score per endpoint, in [0, 1]: the success rate over its last LLM_ENDPOINT_WINDOW calls
+  of the past LLM_ENDPOINT_WINDOW_S, scaled down when its streaming TTFT (EWMA) is above
+  LLM_LIVE_TTFT_TARGET_S. Blocking calls only feed the success rate; their latency is mostly
+  output length. Old outcomes age out, so an endpoint that lost traffic after a bad spell gets
+  it back.
+- Circuit breaker: LLM_ENDPOINT_FAILURE_THRESHOLD failures in a row, or an error rate of at least
+  LLM_ENDPOINT_MAX_ERROR_RATE over LLM_ENDPOINT_MIN_SAMPLES calls, opens it. After
+  LLM_ENDPOINT_COOLDOWN_S one probe request is let through; its outcome closes or reopens it.
+- New requests go to the first endpoint, in configured order, whose breaker lets it through and
+  whose score is within LLM_ENDPOINT_SCORE_MARGIN of the best one. Traffic stays on the primary
+  (and its warm prompt cache) until it is clearly worse. With every breaker open, the endpoint
+  that tripped longest ago is tried rather than failing outright.
+- Connection errors, timeouts, 401/403/408/409/429 and 5xx move the request to the next endpoint.
+  Other errors (a malformed request) are raised as they are and count as the endpoint answering.
+- Streams fail over only until their first token reaches the caller. A live voice stream with no
+  token after LLM_LIVE_FIRST_TOKEN_TIMEOUT_S is abandoned for the next endpoint.
+
+Endpoints, in order of preference (LLM_ENDPOINTS_JSON):
+    [{"name": "xai", "base_url": "https://api.x.ai/v1", "api_key_env": "OPENAI_API_KEY"},
+     {"name": "openai", "base_url": "https://api.openai.com/v1", "api_key_env": "OPENAI_FALLBACK_API_KEY",
+      "model_map": {"grok-4-1-fast-non-reasoning": "gpt-4o-mini"}}]
+Optional per endpoint: "api_key", "organization", "max_retries", "timeout_s". Without
+LLM_ENDPOINTS_JSON the pool is the one endpoint from OPENAI_BASE_URL, as before.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Status codes that say "this endpoint can't serve you right now", not "your request is wrong"
+FAILOVER_STATUS_CODES = {401, 403, 408, 409, 429}
+
+
+class FirstTokenTimeout(Exception):
+    """A stream produced no token within the first-token timeout."""
+
+
+def is_failover_error(error: BaseException) -> bool:
+    if isinstance(error, (FirstTokenTimeout, TimeoutError)):
+        return True
+    import openai
+
+    if isinstance(error, openai.APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in FAILOVER_STATUS_CODES or error.status_code >= 500
+    return False
+
+
+class LLMEndpoint:
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        api_key: Optional[str] = None,
+        organization: Optional[str] = None,
+        model_map: Optional[Dict[str, str]] = None,
+        max_retries: int = 2,
+        timeout_s: Optional[float] = None,
+        window: int = 50,
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.organization = organization
+        self.model_map = model_map or {}
+        self.max_retries = max_retries
+        self.timeout_s = timeout_s
+        self._sync_client = None
+        self._async_client = None
+
+        # Health and breaker state, updated under the pool's lock
+        self.outcomes: deque = deque(maxlen=window)  # (time, succeeded)
+        self.ttft_ewma: Optional[float] = None
+        self.ttft_at = 0.0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.trips = 0
+        self.last_error: Optional[str] = None
+
+    def _client_options(self) -> Dict[str, Any]:
+        options = {
+            "organization": self.organization,
+            "api_key": self.api_key,
+            "base_url": self.base_url,
+            "max_retries": self.max_retries,
+        }
+        if self.timeout_s is not None:
+            options["timeout"] = self.timeout_s
+        return options
+
+    def client(self):
+        if self._sync_client is None:
+            from openai import OpenAI
+
+            self._sync_client = OpenAI(**self._client_options())
+        return self._sync_client
+
+    def async_client(self):
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+
+            self._async_client = AsyncOpenAI(**self._client_options())
+        return self._async_client
+
+    def request(self, kwargs: dict) -> dict:
+        """Request kwargs for this endpoint: the model swapped for its local name, if mapped."""
+        request = dict(kwargs)
+        if request.get("model") in self.model_map:
+            request["model"] = self.model_map[request["model"]]
+        return request
+
+
+class EndpointPool:
+    def __init__(
+        self,
+        endpoints: List[LLMEndpoint],
+        failure_threshold: int = 3,
+        max_error_rate: float = 0.5,
+        min_samples: int = 10,
+        cooldown_s: float = 30.0,
+        ttft_target_s: float = 1.5,
+        score_margin: float = 0.2,
+        window_s: float = 120.0,
+        first_token_timeout_s: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not endpoints:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.failure_threshold = failure_threshold
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.cooldown_s = cooldown_s
+        self.ttft_target_s = ttft_target_s
+        self.score_margin = score_margin
+        self.window_s = window_s
+        self.first_token_timeout_s = first_token_timeout_s
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    # --- state (call with self._lock held) ---
+
+    def _recent(self, endpoint: LLMEndpoint, now: float) -> list:
+        return [ok for at, ok in endpoint.outcomes if now - at <= self.window_s]
+
+    def _error_rate(self, endpoint: LLMEndpoint, now: float) -> float:
+        recent = self._recent(endpoint, now)
+        if not recent:
+            return 0.0
+        return recent.count(False) / len(recent)
+
+    def _score(self, endpoint: LLMEndpoint, now: float) -> float:
+        speed = 1.0
+        if endpoint.ttft_ewma and now - endpoint.ttft_at <= self.window_s:
+            speed = min(1.0, self.ttft_target_s / endpoint.ttft_ewma)
+        return (1 - self._error_rate(endpoint, now)) * speed
+
+    def _state(self, endpoint: LLMEndpoint, now: float) -> str:
+        if endpoint.state == OPEN and now - endpoint.opened_at >= self.cooldown_s:
+            return HALF_OPEN
+        return endpoint.state
+
+    def _lets_through(self, endpoint: LLMEndpoint, now: float) -> bool:
+        state = self._state(endpoint, now)
+        return state == CLOSED or (state == HALF_OPEN and not endpoint.probing)
+
+    def _pick(self, tried: set) -> Optional[LLMEndpoint]:
+        now = self.clock()
+        candidates = [e for e in self.endpoints if e.name not in tried and self._lets_through(e, now)]
+        if not candidates:
+            if tried:
+                return None
+            candidates = [min(self.endpoints, key=lambda e: e.opened_at)]
+        # A breaker past its cooldown gets its probe: the failures that opened it don't count against it
+        scores = {e.name: 1.0 if self._state(e, now) == HALF_OPEN else self._score(e, now) for e in candidates}
+        best = max(scores.values())
+        choice = next(e for e in candidates if scores[e.name] >= best - self.score_margin)
+        if self._state(choice, now) != CLOSED:
+            choice.state = HALF_OPEN
+            choice.probing = True
+        return choice
+
+    def _trip(self, endpoint: LLMEndpoint, now: float):
+        if endpoint.state == CLOSED:
+            print(f"LLM endpoint {endpoint.name} circuit opened: {endpoint.last_error}")
+        if endpoint.state != OPEN:
+            endpoint.trips += 1
+        endpoint.state = OPEN
+        endpoint.opened_at = now
+
+    # --- public API ---
+
+    def attempts(self):
+        """Endpoints to try for one request, best first. Stop iterating once one has served it."""
+        tried = set()
+        while True:
+            with self._lock:
+                endpoint = self._pick(tried)
+            if endpoint is None:
+                return
+            tried.add(endpoint.name)
+            yield endpoint
+
+    def record(self, endpoint: LLMEndpoint, error: Optional[BaseException] = None, ttft_s: Optional[float] = None) -> bool:
+        """Record how an attempt went. Returns True if the error should move the request on."""
+        failed = error is not None and is_failover_error(error)
+        with self._lock:
+            now = self.clock()
+            endpoint.probing = False
+            endpoint.requests += 1
+            endpoint.outcomes.append((now, not failed))
+            if failed:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                endpoint.last_error = f"{type(error).__name__}: {error}"[:200]
+                tripped = endpoint.consecutive_failures >= self.failure_threshold or (
+                    len(self._recent(endpoint, now)) >= self.min_samples
+                    and self._error_rate(endpoint, now) >= self.max_error_rate
+                )
+                if endpoint.state != CLOSED or tripped:
+                    self._trip(endpoint, now)
+                return True
+
+            endpoint.consecutive_failures = 0
+            if ttft_s is not None:
+                stale = endpoint.ttft_ewma is None or now - endpoint.ttft_at > self.window_s
+                endpoint.ttft_ewma = ttft_s if stale else 0.3 * ttft_s + 0.7 * endpoint.ttft_ewma
+                endpoint.ttft_at = now
+            if endpoint.state != CLOSED:
+                print(f"LLM endpoint {endpoint.name} circuit closed after probe")
+                endpoint.state = CLOSED
+                # Judge it afresh; the failures that opened the breaker would trip it again at once
+                endpoint.outcomes.clear()
+                endpoint.outcomes.append((now, True))
+            return False
+
+    def abandon(self, endpoint: LLMEndpoint):
+        """The attempt ended without an outcome (cancelled); free its probe slot."""
+        with self._lock:
+            endpoint.probing = False
+
+    def preload(self):
+        for endpoint in self.endpoints:
+            endpoint.client()
+            endpoint.async_client()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self.clock()
+            return {
+                "first_token_timeout_s": self.first_token_timeout_s or None,
+                "endpoints": [
+                    {
+                        "name": e.name,
+                        "base_url": e.base_url,
+                        "state": self._state(e, now),
+                        "score": round(self._score(e, now), 3),
+                        "error_rate": round(self._error_rate(e, now), 3),
+                        "ttft_ewma_s": round(e.ttft_ewma, 4) if e.ttft_ewma is not None else None,
+                        "requests": e.requests,
+                        "failures": e.failures,
+                        "trips": e.trips,
+                        "last_error": e.last_error,
+                    }
+                    for e in self.endpoints
+                ],
+            }
+
+
+def _endpoints_from_env() -> List[LLMEndpoint]:
+    window = int(os.getenv("LLM_ENDPOINT_WINDOW", "50"))
+    configs = json.loads(os.getenv("LLM_ENDPOINTS_JSON", "[]"))
+    if not configs:
+        return [LLMEndpoint(
+            "default",
+            os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+            api_key=os.getenv("OPENAI_API_KEY"),
+            organization=os.getenv("OPENAI_ORGANIZATION_ID") or None,
+            window=window,
+        )]
+
+    # Retrying inside the SDK only delays the switch to a healthy endpoint
+    default_retries = os.getenv("LLM_ENDPOINT_MAX_RETRIES", "0" if len(configs) > 1 else "2")
+    default_timeout = os.getenv("LLM_ENDPOINT_TIMEOUT_S")
+    return [
+        LLMEndpoint(
+            config.get("name") or f"endpoint{i}",
+            config["base_url"],
+            api_key=config.get("api_key") or os.getenv(config.get("api_key_env", "OPENAI_API_KEY")),
+            organization=config.get("organization"),
+            model_map=config.get("model_map"),
+            max_retries=int(config.get("max_retries", default_retries)),
+            timeout_s=config.get("timeout_s", float(default_timeout) if default_timeout else None),
+            window=window,
+        )
+        for i, config in enumerate(configs)
+    ]
+
+
+@lru_cache(maxsize=None)
+def get_llm_pool() -> EndpointPool:
+    """Process-wide endpoint pool, configured from the environment on first use."""
+    endpoints = _endpoints_from_env()
+    return EndpointPool(
+        endpoints,
+        failure_threshold=int(os.getenv("LLM_ENDPOINT_FAILURE_THRESHOLD", "3")),
+        max_error_rate=float(os.getenv("LLM_ENDPOINT_MAX_ERROR_RATE", "0.5")),
+        min_samples=int(os.getenv("LLM_ENDPOINT_MIN_SAMPLES", "10")),
+        cooldown_s=float(os.getenv("LLM_ENDPOINT_COOLDOWN_S", "30")),
+        ttft_target_s=float(os.getenv("LLM_LIVE_TTFT_TARGET_S", "1.5")),
+        score_margin=float(os.getenv("LLM_ENDPOINT_SCORE_MARGIN", "0.2")),
+        window_s=float(os.getenv("LLM_ENDPOINT_WINDOW_S", "120")),
+        # Giving up on the only endpoint gains nothing
+        first_token_timeout_s=float(os.getenv("LLM_LIVE_FIRST_TOKEN_TIMEOUT_S", "5" if len(endpoints) > 1 else "0")),
+    )
@@ -0,0 +1,522 @@
+"""
+LLM Gateway
+
+Single entry point for every upstream LLM call (voice turns, grading, diagram checks, sourcing).
+Each call is recorded with its model, token usage, time-to-first-token (streams only; a blocking
+call has no first token to time), total latency and an estimated cost, tagged by purpose, so we can
+see where token spend and latency actually go.
+
+Aggregates are queryable in-process (get_usage_summary / render_prometheus) and every call can
+also be appended to a JSONL file by setting LLM_USAGE_LOG. Sourcing runs in its own process on the
+xai_sdk client, so its calls are not recorded here; sourcing_backend/usage_log.py writes them to
+its own log in the same format.
+
+Calls built from a PromptLayout pass `prompt_name`: usage is then also aggregated per prompt
+(cached-token ratio and the estimated saving), and the call carries a cache routing key so
+requests sharing a prefix reach the same provider cache.
+
+Requests go to the first healthy endpoint of the pool in app/llm_endpoints.py and fail over to
+the next one when it errors (streams: only before their first token).
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from .admission import (
+    PRIORITY_LIVE,
+    admitted,
+    admitted_async,
+    get_admission_controller,
+    priority_for,
+)
+from .llm_endpoints import FirstTokenTimeout, get_llm_pool, is_failover_error
+from .stats import percentile
+from .tracing import span, start_span
+
+PURPOSE_VOICE_TURN = "voice_turn"
+PURPOSE_GRADING = "grading"
+PURPOSE_DIAGRAM_CHECK = "diagram_check"
+PURPOSE_SOURCING = "sourcing"
+
+# Estimated USD per 1M tokens: (prompt, cached prompt, completion). Override or extend with
+# LLM_PRICING_JSON='{"model": [prompt, cached, completion]}'.
+MODEL_PRICING = {
+    "grok-4-1-fast": (0.20, 0.05, 0.50),
+    "grok-4-1-fast-reasoning": (0.20, 0.05, 0.50),
+    "grok-4-1-fast-non-reasoning": (0.20, 0.05, 0.50),
+    "grok-4": (3.00, 0.75, 15.00),
+    "grok-beta": (5.00, 5.00, 15.00),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4-turbo-preview": (10.00, 10.00, 30.00),
+}
+
+RECENT_CALLS_LIMIT = 1000
+# Completion tokens reserved against the rate budget when a call doesn't set max_tokens
+DEFAULT_COMPLETION_RESERVATION = 512
+
+_lock = threading.Lock()
+_recent_calls: deque = deque(maxlen=RECENT_CALLS_LIMIT)
+_aggregates: Dict[tuple, Dict[str, Any]] = {}
+_prompt_aggregates: Dict[str, Dict[str, Any]] = {}
+
+
+def get_client():
+    """Synchronous OpenAI-compatible client of the primary endpoint."""
+    return get_llm_pool().endpoints[0].client()
+
+
+def get_async_client():
+    """Asynchronous OpenAI-compatible client of the primary endpoint."""
+    return get_llm_pool().endpoints[0].async_client()
+
+
+@lru_cache(maxsize=None)
+def _model_pricing() -> Dict[str, tuple]:
+    # Read on first use rather than at import so values from .env (loaded at startup) apply
+    pricing = dict(MODEL_PRICING)
+    pricing.update({k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICING_JSON", "{}")).items()})
+    return pricing
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """Estimated USD cost of a call; 0.0 for models without a known price."""
+    pricing = _model_pricing().get(model)
+    if pricing is None:
+        return 0.0
+    prompt_price, cached_price, completion_price = pricing
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (uncached * prompt_price + cached_tokens * cached_price + completion_tokens * completion_price) / 1_000_000
+
+
+def _get(obj, key, default=None):
+    """Read a field from an SDK object or a plain dict (older SDKs leave nested usage as dicts)."""
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        return obj.get(key, default)
+    return getattr(obj, key, default)
+
+
+def _usage_fields(usage) -> Dict[str, int]:
+    """Normalize an OpenAI-style usage object into flat token counts."""
+    return {
+        "prompt_tokens": _get(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": _get(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": _get(_get(usage, "prompt_tokens_details"), "cached_tokens", 0) or 0,
+        "reasoning_tokens": _get(_get(usage, "completion_tokens_details"), "reasoning_tokens", 0) or 0,
+    }
+
+
+def record_usage(
+    purpose: str,
+    model: str,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    cached_tokens: int = 0,
+    reasoning_tokens: int = 0,
+    latency_s: float = 0.0,
+    ttft_s: Optional[float] = None,
+    queue_s: float = 0.0,
+    error: Optional[str] = None,
+    provider: str = "openai",
+    prompt: Optional[str] = None,
+    endpoint: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Record one upstream call. Used directly by call sites on other SDKs (e.g. xai_sdk)."""
+    record = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "purpose": purpose,
+        "provider": provider,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "reasoning_tokens": reasoning_tokens,
+        "ttft_s": round(ttft_s, 4) if ttft_s is not None else None,
+        "latency_s": round(latency_s, 4),
+        "queue_s": round(queue_s, 4),
+        "cost_usd": round(estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens), 6),
+        "prompt": prompt,
+        "endpoint": endpoint,
+        "error": error,
+    }
+
+    with _lock:
+        _recent_calls.append(record)
+        agg = _aggregates.setdefault((purpose, model), {
+            "calls": 0,
+            "errors": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "reasoning_tokens": 0,
+            "cost_usd": 0.0,
+            "latency_s_total": 0.0,
+            "queue_s_total": 0.0,
+            "latencies": deque(maxlen=RECENT_CALLS_LIMIT),
+            "ttfts": deque(maxlen=RECENT_CALLS_LIMIT),
+        })
+        agg["calls"] += 1
+        agg["errors"] += 1 if error else 0
+        for key in ("prompt_tokens", "completion_tokens", "cached_tokens", "reasoning_tokens", "cost_usd"):
+            agg[key] += record[key]
+        agg["latency_s_total"] += latency_s
+        agg["queue_s_total"] += queue_s
+        agg["latencies"].append(latency_s)
+        if ttft_s is not None:
+            agg["ttfts"].append(ttft_s)
+        if prompt:
+            by_prompt = _prompt_aggregates.setdefault(prompt, {
+                "calls": 0,
+                "prompt_tokens": 0,
+                "cached_tokens": 0,
+                "cost_usd": 0.0,
+                "saved_usd": 0.0,
+                "ttfts": deque(maxlen=RECENT_CALLS_LIMIT),
+            })
+            by_prompt["calls"] += 1
+            by_prompt["prompt_tokens"] += prompt_tokens
+            by_prompt["cached_tokens"] += cached_tokens
+            by_prompt["cost_usd"] += record["cost_usd"]
+            # What the cached tokens would have cost at the full prompt rate
+            by_prompt["saved_usd"] += estimate_cost(model, cached_tokens, 0) - estimate_cost(model, cached_tokens, 0, cached_tokens)
+            if ttft_s is not None:
+                by_prompt["ttfts"].append(ttft_s)
+
+    usage_log = os.getenv("LLM_USAGE_LOG")
+    if usage_log:
+        try:
+            with open(usage_log, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except Exception as e:
+            print(f"Error writing LLM usage log: {e}")
+
+    return record
+
+
+def estimate_request_tokens(kwargs: dict) -> int:
+    """Rough token reservation for admission control: prompt (~4 chars/token) plus expected output."""
+    prompt_chars = sum(len(str(m.get("content") or "")) for m in kwargs.get("messages", []))
+    return prompt_chars // 4 + (kwargs.get("max_tokens") or DEFAULT_COMPLETION_RESERVATION)
+
+
+def _route_to_prompt_cache(kwargs: dict, key: str, base_url: str):
+    """
+    Ask the provider to send calls with the same key to the same cache, so a shared prefix is
+    still warm when the next call arrives (OpenAI: prompt_cache_key; xAI: x-grok-conv-id).
+    """
+    if os.getenv("LLM_PROMPT_CACHE_ROUTING", "true").lower() != "true":
+        return
+    if "x.ai" in base_url:
+        kwargs["extra_headers"] = {**kwargs.get("extra_headers", {}), "x-grok-conv-id": key}
+    elif "api.openai.com" in base_url:
+        kwargs["extra_body"] = {**kwargs.get("extra_body", {}), "prompt_cache_key": key}
+
+
+def _prompt_options(kwargs: dict) -> tuple:
+    """Pop the gateway's own options: returns (prompt_name, cache routing key)."""
+    prompt = kwargs.pop("prompt_name", None)
+    cache_key = kwargs.pop("cache_key", None) or prompt
+    return prompt, cache_key
+
+
+def _endpoint_request(endpoint, kwargs: dict, cache_key: Optional[str]) -> dict:
+    request = endpoint.request(kwargs)
+    if cache_key:
+        _route_to_prompt_cache(request, cache_key, endpoint.base_url)
+    return request
+
+
+async def _until(awaitable, deadline: Optional[float]):
+    """Await with a perf_counter deadline (None: no limit); FirstTokenTimeout once it passes."""
+    if deadline is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, max(deadline - time.perf_counter(), 0.0))
+    except asyncio.TimeoutError:
+        raise FirstTokenTimeout("no token before the first-token timeout")
+
+
+async def _next_chunk(chunks, deadline: Optional[float]):
+    """Next chunk of a stream, None at its end."""
+    try:
+        return await _until(chunks.__anext__(), deadline)
+    except StopAsyncIteration:
+        return None
+
+
+def _span_usage(record: Dict[str, Any]) -> Dict[str, Any]:
+    fields = ("prompt_tokens", "completion_tokens", "cached_tokens", "ttft_s", "cost_usd")
+    return {key: record[key] for key in fields}
+
+
+def chat_completion(purpose: str, **kwargs):
+    """
+    Blocking chat completion through the endpoint pool, recorded under `purpose`.
+    Optional `prompt_name` / `cache_key`: see the module docstring.
+    """
+    prompt, cache_key = _prompt_options(kwargs)
+    model = kwargs.get("model", "")
+    pool = get_llm_pool()
+    queued = time.perf_counter()
+    with (
+        span(f"llm.{purpose}", model=model, prompt=prompt) as call,
+        admitted(purpose, estimate_request_tokens(kwargs)) as ticket,
+    ):
+        started = time.perf_counter()
+        call.set(queue_ms=round((started - queued) * 1000, 3))
+        last_error = None
+        for attempt, endpoint in enumerate(pool.attempts()):
+            request = _endpoint_request(endpoint, kwargs, cache_key)
+            attempt_started = time.perf_counter()
+            try:
+                completion = endpoint.client().chat.completions.create(**request)
+            except Exception as e:
+                record_usage(
+                    purpose, request.get("model", ""), latency_s=time.perf_counter() - attempt_started,
+                    queue_s=started - queued, error=str(e), prompt=prompt, endpoint=endpoint.name,
+                )
+                if pool.record(endpoint, error=e):
+                    print(f"LLM {purpose} call failed on {endpoint.name}, trying next endpoint: {e}")
+                    last_error = e
+                    continue
+                raise
+            pool.record(endpoint)
+
+            latency = time.perf_counter() - attempt_started
+            usage = _usage_fields(completion.usage)
+            ticket["used_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            record = record_usage(
+                purpose, request.get("model", ""), latency_s=latency, queue_s=started - queued,
+                prompt=prompt, endpoint=endpoint.name, **usage
+            )
+            call.set(endpoint=endpoint.name, failovers=attempt, **_span_usage(record))
+            return completion
+        raise last_error
+
+
+async def stream_chat_completion(purpose: str, **kwargs):
+    """
+    Streaming chat completion through the endpoint pool, recorded under `purpose`.
+
+    Yields the provider's chunks unchanged, except the trailing usage-only chunk which is
+    consumed here for accounting. Chunks before the first token are held back, so a failing
+    endpoint can still be swapped for the next one without the caller noticing. The admission
+    slot is held until the stream ends.
+    """
+    prompt, cache_key = _prompt_options(kwargs)
+    model = kwargs.get("model", "")
+    pool = get_llm_pool()
+    live = priority_for(purpose) == PRIORITY_LIVE
+    first_token_timeout = pool.first_token_timeout_s if live and pool.first_token_timeout_s else None
+    queued = time.perf_counter()
+    # Not made current: the caller's own spans run between our yields
+    call = start_span(f"llm.{purpose}", model=model, prompt=prompt, stream=True)
+    error = None
+    try:
+        async with admitted_async(purpose, estimate_request_tokens(kwargs)) as ticket:
+            started = time.perf_counter()
+            call.set(queue_ms=round((started - queued) * 1000, 3))
+            last_error = None
+            for attempt, endpoint in enumerate(pool.attempts()):
+                request = _endpoint_request(endpoint, kwargs, cache_key)
+                extra_body = {**request.pop("extra_body", {}), "stream_options": {"include_usage": True}}
+                attempt_started = time.perf_counter()
+                deadline = attempt_started + first_token_timeout if first_token_timeout else None
+                ttft = None
+                usage = None
+                attempt_error = None
+                finished = False
+                try:
+                    stream = await _until(
+                        endpoint.async_client().chat.completions.create(stream=True, extra_body=extra_body, **request),
+                        deadline,
+                    )
+                    chunks = stream.__aiter__()
+                    held = []
+                    while True:
+                        try:
+                            chunk = await _next_chunk(chunks, deadline if ttft is None else None)
+                        except FirstTokenTimeout:
+                            await stream.close()
+                            raise
+                        if chunk is None:
+                            break
+                        if getattr(chunk, "usage", None):
+                            usage = chunk.usage
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        if ttft is None:
+                            if not (delta.content or delta.tool_calls):
+                                held.append(chunk)
+                                continue
+                            ttft = time.perf_counter() - attempt_started
+                            if live:
+                                # What the caller waited, failed attempts included
+                                get_admission_controller().record_live_ttft(time.perf_counter() - started)
+                            for early in held:
+                                yield early
+                            held = []
+                        yield chunk
+                    for early in held:
+                        yield early
+                    finished = True
+                    return
+                except Exception as e:
+                    attempt_error = e
+                    if ttft is None and is_failover_error(e):
+                        print(f"LLM {purpose} stream failed on {endpoint.name} before first token, trying next endpoint: {e}")
+                        last_error = e
+                        continue
+                    raise
+                finally:
+                    fields = _usage_fields(usage)
+                    if usage is not None:
+                        ticket["used_tokens"] = fields["prompt_tokens"] + fields["completion_tokens"]
+                    record = record_usage(
+                        purpose,
+                        request.get("model", ""),
+                        latency_s=time.perf_counter() - attempt_started,
+                        ttft_s=ttft,
+                        queue_s=started - queued,
+                        error=str(attempt_error) if attempt_error is not None else None,
+                        prompt=prompt,
+                        endpoint=endpoint.name,
+                        **fields,
+                    )
+                    call.set(endpoint=endpoint.name, failovers=attempt, **_span_usage(record))
+                    if attempt_error is not None:
+                        pool.record(endpoint, error=attempt_error)
+                    elif finished or ttft is not None:
+                        pool.record(endpoint, ttft_s=ttft)
+                    else:
+                        pool.abandon(endpoint)
+            raise last_error
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        call.end(error)
+
+
+def get_usage_summary() -> Dict[str, Any]:
+    """Aggregate token, cost and latency numbers per purpose and model."""
+    with _lock:
+        by_purpose = []
+        for (purpose, model), agg in sorted(_aggregates.items()):
+            by_purpose.append({
+                "purpose": purpose,
+                "model": model,
+                "calls": agg["calls"],
+                "errors": agg["errors"],
+                "prompt_tokens": agg["prompt_tokens"],
+                "completion_tokens": agg["completion_tokens"],
+                "cached_tokens": agg["cached_tokens"],
+                "reasoning_tokens": agg["reasoning_tokens"],
+                "cost_usd": round(agg["cost_usd"], 6),
+                "latency_s_avg": round(agg["latency_s_total"] / agg["calls"], 4),
+                "queue_s_avg": round(agg["queue_s_total"] / agg["calls"], 4),
+                "latency_s_p50": percentile(agg["latencies"], 50, 4),
+                "latency_s_p95": percentile(agg["latencies"], 95, 4),
+                "ttft_s_p50": percentile(agg["ttfts"], 50, 4),
+                "ttft_s_p95": percentile(agg["ttfts"], 95, 4),
+            })
+        totals = {
+            "calls": sum(a["calls"] for a in _aggregates.values()),
+            "prompt_tokens": sum(a["prompt_tokens"] for a in _aggregates.values()),
+            "completion_tokens": sum(a["completion_tokens"] for a in _aggregates.values()),
+            "cost_usd": round(sum(a["cost_usd"] for a in _aggregates.values()), 6),
+        }
+        by_prompt = [
+            {
+                "prompt": prompt,
+                "calls": agg["calls"],
+                "prompt_tokens": agg["prompt_tokens"],
+                "cached_tokens": agg["cached_tokens"],
+                "cache_hit_ratio": round(agg["cached_tokens"] / agg["prompt_tokens"], 3) if agg["prompt_tokens"] else None,
+                "cost_usd": round(agg["cost_usd"], 6),
+                "saved_usd": round(agg["saved_usd"], 6),
+                "ttft_s_p50": percentile(agg["ttfts"], 50, 4),
+            }
+            for prompt, agg in sorted(_prompt_aggregates.items())
+        ]
+    return {"totals": totals, "by_purpose": by_purpose, "by_prompt": by_prompt}
+
+
+def get_recent_calls(limit: int = 100) -> list:
+    with _lock:
+        return list(_recent_calls)[-limit:]
+
+
+def render_prometheus() -> str:
+    """Render aggregates in Prometheus text exposition format."""
+    lines = []
+    counters = [
+        ("llm_calls_total", "calls"),
+        ("llm_errors_total", "errors"),
+        ("llm_prompt_tokens_total", "prompt_tokens"),
+        ("llm_completion_tokens_total", "completion_tokens"),
+        ("llm_cached_tokens_total", "cached_tokens"),
+        ("llm_reasoning_tokens_total", "reasoning_tokens"),
+        ("llm_cost_usd_total", "cost_usd"),
+        ("llm_latency_seconds_sum", "latency_s_total"),
+        ("llm_admission_queue_seconds_sum", "queue_s_total"),
+    ]
+    with _lock:
+        for metric, key in counters:
+            lines.append(f"# TYPE {metric} counter")
+            for (purpose, model), agg in sorted(_aggregates.items()):
+                lines.append(f'{metric}{{purpose="{purpose}",model="{model}"}} {agg[key]}')
+        for metric, key in (("llm_latency_seconds", "latencies"), ("llm_ttft_seconds", "ttfts")):
+            lines.append(f"# TYPE {metric} summary")
+            for (purpose, model), agg in sorted(_aggregates.items()):
+                for quantile in (50, 95, 99):
+                    value = percentile(agg[key], quantile, 4)
+                    if value is not None:
+                        lines.append(
+                            f'{metric}{{purpose="{purpose}",model="{model}",quantile="{quantile / 100}"}} {value}'
+                        )
+        for metric, key in (("llm_prompt_layout_prompt_tokens_total", "prompt_tokens"),
+                            ("llm_prompt_layout_cached_tokens_total", "cached_tokens")):
+            lines.append(f"# TYPE {metric} counter")
+            for prompt, agg in sorted(_prompt_aggregates.items()):
+                lines.append(f'{metric}{{prompt="{prompt}"}} {agg[key]}')
+
+    admission = get_admission_controller().status()
+    lines.append("# TYPE llm_admission_degraded gauge")
+    lines.append(f"llm_admission_degraded {int(admission['degraded'])}")
+    for metric, key in (("llm_admission_active", "active"), ("llm_admission_waiting", "waiting"),
+                        ("llm_admission_effective_cap", "effective_cap")):
+        lines.append(f"# TYPE {metric} gauge")
+        for priority, stats in admission["classes"].items():
+            lines.append(f'{metric}{{priority="{priority}"}} {stats[key]}')
+
+    endpoints = get_llm_pool().status()["endpoints"]
+    for metric, kind, value in (
+        ("llm_endpoint_health_score", "gauge", lambda e: e["score"]),
+        ("llm_endpoint_circuit_open", "gauge", lambda e: int(e["state"] != "closed")),
+        ("llm_endpoint_requests_total", "counter", lambda e: e["requests"]),
+        ("llm_endpoint_failures_total", "counter", lambda e: e["failures"]),
+        ("llm_endpoint_circuit_trips_total", "counter", lambda e: e["trips"]),
+    ):
+        lines.append(f"# TYPE {metric} {kind}")
+        for endpoint in endpoints:
+            lines.append(f'{metric}{{endpoint="{endpoint["name"]}"}} {value(endpoint)}')
+    return "\n".join(lines) + "\n"
+
+
+def reset_usage():
+    """Clear all recorded usage (tests and benchmarks)."""
+    with _lock:
+        _recent_calls.clear()
+        _aggregates.clear()
+        _prompt_aggregates.clear()
@@ -0,0 +1,68 @@
+"""
+Event Loop Lag Monitor
+
+A background task that asks to wake up every `interval_s` and records how late it actually
+woke. The lateness is how long any coroutine on this loop (a webhook ack, a voice turn) waits
+behind blocking work, so it is the number to watch under load.
+
+Enabled with LOOP_LAG_MONITOR=true; read at GET /loop-lag.
+"""
+
+import asyncio
+import os
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from .stats import percentile
+
+
+def loop_lag_monitor_enabled() -> bool:
+    return os.getenv("LOOP_LAG_MONITOR", "false").lower() == "true"
+
+
+class LoopLagMonitor:
+    def __init__(self, interval_s: float = 0.05, max_samples: int = 20000):
+        self.interval_s = interval_s
+        self._samples: deque = deque(maxlen=max_samples)
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            self._samples.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def reset(self):
+        self._samples.clear()
+
+    def status(self) -> Dict[str, Any]:
+        samples = list(self._samples)
+        to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+        return {
+            "running": self._task is not None,
+            "interval_s": self.interval_s,
+            "samples": len(samples),
+            "p50_ms": to_ms(percentile(samples, 50)),
+            "p99_ms": to_ms(percentile(samples, 99)),
+            "max_ms": to_ms(max(samples) if samples else None),
+        }
+
+
+@lru_cache(maxsize=None)
+def get_loop_monitor() -> LoopLagMonitor:
+    return LoopLagMonitor(float(os.getenv("LOOP_LAG_INTERVAL_S", "0.05")))
@@ -0,0 +1,427 @@
+"""
+Parquet Export
+
+Flattens the interview records in call_data/ and tavus_webhooks/ into Parquet tables for
+analysts. Querying then scans a few columns instead of parsing hundreds of nested JSON files:
+
+- calls: one row per Retell call (status, timing, cost, Retell's analysis, latency percentiles)
+- utterances: one row per turn, from Retell's transcript_object (with word timings) and from
+  Tavus transcription_ready transcripts
+- tool_calls: one row per tool call in a Retell call, its invocation joined with its result
+- tavus_events: one row per saved Tavus webhook, properties kept as a JSON string
+- grades: phone screen and system design grades
+
+Each table lives in its own directory, partitioned by day (calls/date=2025-12-07/part-*.parquet),
+and every table has a fixed schema (SCHEMAS), so files from different runs read as one dataset.
+
+Runs are incremental. _export_state.json records every source file already exported, and a
+run only reads new files and adds one part file per touched partition. A run that dies
+half-way leaves part files without a recorded run id; the next run deletes them before
+starting. --compact merges each partition's parts into one file. It records its run id and the
+parts it replaces before deleting any of them, so a compaction cut short is finished by the
+next run instead of losing the merged file as an orphan.
+
+    python -m app.parquet_export --out exports
+    python -m app.parquet_export --out exports --compact
+
+Reading (memory-mapped, only the columns asked for):
+    import pyarrow.dataset as ds
+    calls = ds.dataset("exports/calls", format="parquet", partitioning="hive")
+    calls.to_table(columns=["call_id", "duration_ms", "cost_usd"], filter=ds.field("date") >= "2025-12-01")
+"""
+
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+STATE_FILE = "_export_state.json"
+
+SCHEMAS = {
+    "calls": pa.schema([
+        ("call_id", pa.string()),
+        ("agent_id", pa.string()),
+        ("agent_version", pa.int64()),
+        ("call_type", pa.string()),
+        ("call_status", pa.string()),
+        ("disconnection_reason", pa.string()),
+        ("start_time", pa.timestamp("ms")),
+        ("end_time", pa.timestamp("ms")),
+        ("duration_ms", pa.int64()),
+        ("cost_usd", pa.float64()),
+        ("user_sentiment", pa.string()),
+        ("call_successful", pa.bool_()),
+        ("in_voicemail", pa.bool_()),
+        ("call_summary", pa.string()),
+        ("turns", pa.int64()),
+        ("e2e_p50_ms", pa.float64()),
+        ("e2e_p90_ms", pa.float64()),
+        ("e2e_p99_ms", pa.float64()),
+        ("llm_p50_ms", pa.float64()),
+        ("llm_p99_ms", pa.float64()),
+        ("tts_p50_ms", pa.float64()),
+        ("call_ended_received_at", pa.timestamp("us")),
+        ("call_analyzed_received_at", pa.timestamp("us")),
+        ("source_file", pa.string()),
+    ]),
+    "utterances": pa.schema([
+        ("source", pa.string()),  # "retell" or "tavus"
+        ("interview_id", pa.string()),  # call_id or conversation_id
+        ("seq", pa.int64()),
+        ("role", pa.string()),
+        ("content", pa.string()),
+        ("start_s", pa.float64()),
+        ("end_s", pa.float64()),
+        ("words", pa.int64()),
+    ]),
+    "tool_calls": pa.schema([
+        ("call_id", pa.string()),
+        ("seq", pa.int64()),
+        ("tool_call_id", pa.string()),
+        ("name", pa.string()),
+        ("arguments", pa.string()),
+        ("result", pa.string()),
+        ("successful", pa.bool_()),
+        ("time_s", pa.float64()),
+    ]),
+    "tavus_events": pa.schema([
+        ("conversation_id", pa.string()),
+        ("event_type", pa.string()),
+        ("message_type", pa.string()),
+        ("event_time", pa.timestamp("us")),
+        ("received_at", pa.timestamp("us")),
+        ("replica_id", pa.string()),
+        ("properties", pa.string()),
+        ("source_file", pa.string()),
+    ]),
+    "grades": pa.schema([
+        ("interview_id", pa.string()),
+        ("interview_type", pa.string()),
+        ("score", pa.int64()),
+        ("summary", pa.string()),
+        ("reasoning", pa.string()),
+        ("graded_at", pa.timestamp("us")),
+        ("source_file", pa.string()),
+    ]),
+}
+
+
+def _timestamp(value) -> Optional[datetime]:
+    """UTC-naive datetime from an ISO string (ours are utcnow()) or epoch milliseconds (Retell)."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc).replace(tzinfo=None)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+def _day(moment: Optional[datetime]) -> str:
+    return moment.strftime("%Y-%m-%d") if moment else "unknown"
+
+
+def _percentile(latency: dict, metric: str, p: int) -> Optional[float]:
+    return (latency.get(metric) or {}).get(f"p{p}")
+
+
+def _call_rows(record: Dict[str, Any], source_file: str) -> Dict[str, List[dict]]:
+    call: Dict[str, Any] = {}
+    for key in ("call_ended_webhook", "call_analyzed_webhook", "retell_api_data"):
+        call.update({k: v for k, v in (record.get(key) or {}).items() if v is not None})
+    call_id = record.get("call_id") or call.get("call_id")
+    start = _timestamp(call.get("start_timestamp"))
+    analysis = call.get("call_analysis") or {}
+    latency = call.get("latency") or {}
+    received = record.get("timestamps") or {}
+    cost = (call.get("call_cost") or {}).get("combined_cost")
+    utterances = call.get("transcript_object") or []
+
+    rows: Dict[str, List[dict]] = {"calls": [{
+        "call_id": call_id,
+        "agent_id": call.get("agent_id"),
+        "agent_version": call.get("agent_version"),
+        "call_type": call.get("call_type"),
+        "call_status": call.get("call_status"),
+        "disconnection_reason": call.get("disconnection_reason"),
+        "start_time": start,
+        "end_time": _timestamp(call.get("end_timestamp")),
+        "duration_ms": call.get("duration_ms"),
+        # Retell reports cost in cents
+        "cost_usd": cost / 100 if isinstance(cost, (int, float)) else None,
+        "user_sentiment": analysis.get("user_sentiment"),
+        "call_successful": analysis.get("call_successful"),
+        "in_voicemail": analysis.get("in_voicemail"),
+        "call_summary": analysis.get("call_summary"),
+        "turns": len(utterances),
+        "e2e_p50_ms": _percentile(latency, "e2e", 50),
+        "e2e_p90_ms": _percentile(latency, "e2e", 90),
+        "e2e_p99_ms": _percentile(latency, "e2e", 99),
+        "llm_p50_ms": _percentile(latency, "llm", 50),
+        "llm_p99_ms": _percentile(latency, "llm", 99),
+        "tts_p50_ms": _percentile(latency, "tts", 50),
+        "call_ended_received_at": _timestamp(received.get("call_ended_received")),
+        "call_analyzed_received_at": _timestamp(received.get("call_analyzed_received")),
+        "source_file": source_file,
+    }]}
+
+    rows["utterances"] = []
+    for seq, utterance in enumerate(utterances):
+        words = utterance.get("words") or []
+        rows["utterances"].append({
+            "source": "retell",
+            "interview_id": call_id,
+            "seq": seq,
+            "role": utterance.get("role"),
+            "content": utterance.get("content"),
+            "start_s": words[0].get("start") if words else None,
+            "end_s": words[-1].get("end") if words else None,
+            "words": len(words),
+        })
+
+    tool_calls: Dict[str, dict] = {}
+    for item in call.get("transcript_with_tool_calls") or []:
+        if item.get("role") == "tool_call_invocation":
+            tool_calls[item.get("tool_call_id")] = {
+                "call_id": call_id,
+                "seq": len(tool_calls),
+                "tool_call_id": item.get("tool_call_id"),
+                "name": item.get("name"),
+                "arguments": item.get("arguments"),
+                "result": None,
+                "successful": None,
+                "time_s": item.get("time_sec"),
+            }
+        elif item.get("role") == "tool_call_result" and item.get("tool_call_id") in tool_calls:
+            tool_calls[item["tool_call_id"]].update(result=item.get("content"), successful=item.get("successful"))
+    if not tool_calls:
+        # Older records only have the summary list
+        for item in call.get("tool_calls") or []:
+            tool_calls[item.get("tool_call_id")] = {
+                "call_id": call_id,
+                "seq": len(tool_calls),
+                "tool_call_id": item.get("tool_call_id"),
+                "name": item.get("name"),
+                "arguments": item.get("arguments"),
+                "result": None,
+                "successful": None,
+                "time_s": item.get("start_time_sec"),
+            }
+    rows["tool_calls"] = list(tool_calls.values())
+
+    for table in rows.values():
+        for row in table:
+            row["date"] = _day(start)
+    return rows
+
+
+def _tavus_rows(saved: Dict[str, Any], source_file: str) -> Dict[str, List[dict]]:
+    payload = saved.get("payload") or {}
+    properties = payload.get("properties") or {}
+    received = _timestamp(saved.get("timestamp"))
+    conversation_id = payload.get("conversation_id")
+    rows: Dict[str, List[dict]] = {"tavus_events": [{
+        "conversation_id": conversation_id,
+        "event_type": payload.get("event_type"),
+        "message_type": payload.get("message_type"),
+        "event_time": _timestamp(payload.get("timestamp")),
+        "received_at": received,
+        "replica_id": properties.get("replica_id"),
+        "properties": json.dumps(properties, ensure_ascii=False),
+        "source_file": source_file,
+        "date": _day(received),
+    }]}
+    if payload.get("event_type") == "application.transcription_ready":
+        rows["utterances"] = [
+            {
+                "source": "tavus",
+                "interview_id": conversation_id,
+                "seq": seq,
+                "role": turn.get("role"),
+                "content": turn.get("content"),
+                "start_s": None,
+                "end_s": None,
+                "words": None,
+                "date": _day(received),
+            }
+            # The system prompt is configuration, not conversation
+            for seq, turn in enumerate(t for t in properties.get("transcript") or [] if t.get("role") != "system")
+        ]
+    return rows
+
+
+def _grade_rows(grade: Dict[str, Any], interview_id: str, source_file: str) -> Dict[str, List[dict]]:
+    graded_at = _timestamp(grade.get("graded_at"))
+    score = grade.get("score")
+    return {"grades": [{
+        "interview_id": interview_id,
+        "interview_type": grade.get("interview_type"),
+        "score": score if isinstance(score, int) else None,
+        "summary": grade.get("summary"),
+        "reasoning": grade.get("reasoning"),
+        "graded_at": graded_at,
+        "source_file": source_file,
+        "date": _day(graded_at),
+    }]}
+
+
+def rows_for_file(path: Path, source_dir: str) -> Dict[str, List[dict]]:
+    """Rows per table for one saved JSON file; empty for files we don't export."""
+    with open(path) as f:
+        data = json.load(f)
+    source_file = f"{source_dir}/{path.name}"
+    name = path.name
+    if name.endswith("_phone_screen_grade.json"):
+        return _grade_rows(data, name[: -len("_phone_screen_grade.json")], source_file)
+    if name.endswith("_system_design_grade.json"):
+        # {conversation_id}_{timestamp}_system_design_grade.json
+        return _grade_rows(data, name.split("_", 1)[0], source_file)
+    if isinstance(data, dict) and isinstance(data.get("payload"), dict):
+        return _tavus_rows(data, source_file)
+    if isinstance(data, dict) and data.get("call_id"):
+        return _call_rows(data, source_file)
+    return {}
+
+
+class ParquetExporter:
+    def __init__(self, out_dir: Path, sources: Dict[str, Path]):
+        self.out_dir = Path(out_dir)
+        self.sources = sources  # label ("call_data") -> directory
+        self.state_path = self.out_dir / STATE_FILE
+
+    def _load_state(self) -> Dict[str, Any]:
+        if self.state_path.exists():
+            with open(self.state_path) as f:
+                return json.load(f)
+        return {"runs": [], "files": {}}
+
+    def _save_state(self, state: Dict[str, Any]):
+        tmp = self.state_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp, self.state_path)
+
+    def _parts(self):
+        return self.out_dir.glob("*/date=*/part-*.parquet")
+
+    def _finish_compaction(self, state: Dict[str, Any]):
+        """Delete the part files a recorded compaction merged, if it stopped before it could."""
+        superseded = state.pop("superseded", [])
+        for name in superseded:
+            path = self.out_dir / name
+            if path.exists():
+                path.unlink()
+        if superseded:
+            self._save_state(state)
+
+    def _remove_orphans(self, runs: set):
+        """Delete part files from runs that never recorded their state (crashed part-way)."""
+        for path in self._parts():
+            if path.stem[len("part-"):] not in runs:
+                print(f"Removing part file from an unfinished run: {path}")
+                path.unlink()
+
+    def _write(self, table: str, date: str, rows: List[dict], run_id: str) -> Path:
+        partition = self.out_dir / table / f"date={date}"
+        partition.mkdir(parents=True, exist_ok=True)
+        path = partition / f"part-{run_id}.parquet"
+        schema = SCHEMAS[table]
+        columns = {field.name: [row.get(field.name) for row in rows] for field in schema}
+        tmp = path.with_suffix(".tmp")
+        pq.write_table(pa.Table.from_pydict(columns, schema=schema), tmp, compression="zstd")
+        os.replace(tmp, path)
+        return path
+
+    def run(self) -> Dict[str, Any]:
+        """Export files not exported before; returns counts of files read and rows written per table."""
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        state = self._load_state()
+        self._finish_compaction(state)
+        self._remove_orphans(set(state["runs"]))
+
+        run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+        pending: Dict[tuple, List[dict]] = {}
+        exported_files = []
+        for label, directory in self.sources.items():
+            if not Path(directory).is_dir():
+                continue
+            for path in sorted(Path(directory).glob("*.json")):
+                key = f"{label}/{path.name}"
+                if key in state["files"]:
+                    continue
+                try:
+                    file_rows = rows_for_file(path, label)
+                except (OSError, ValueError) as e:
+                    # Possibly still being written; picked up next run
+                    print(f"Skipping {key}: {e}")
+                    continue
+                for table, rows in file_rows.items():
+                    for row in rows:
+                        pending.setdefault((table, row.pop("date")), []).append(row)
+                exported_files.append(key)
+
+        written = {table: 0 for table in SCHEMAS}
+        for (table, date), rows in sorted(pending.items()):
+            self._write(table, date, rows, run_id)
+            written[table] += len(rows)
+
+        if exported_files:
+            state["runs"].append(run_id)
+            for key in exported_files:
+                state["files"][key] = run_id
+            self._save_state(state)
+        return {"run_id": run_id if exported_files else None, "files": len(exported_files), "rows": written}
+
+    def compact(self) -> int:
+        """Merge each partition's part files into one; returns the number of partitions rewritten."""
+        state = self._load_state()
+        self._finish_compaction(state)
+        self._remove_orphans(set(state["runs"]))
+        run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S") + "-compact-" + uuid.uuid4().hex[:8]
+        partitions = {}
+        for path in self._parts():
+            partitions.setdefault(path.parent, []).append(path)
+        rewritten = 0
+        superseded = []
+        for partition, parts in sorted(partitions.items()):
+            if len(parts) < 2:
+                continue
+            schema = SCHEMAS[partition.parent.name]
+            merged = pa.concat_tables([pq.read_table(p, schema=schema) for p in sorted(parts)])
+            tmp = partition / f"part-{run_id}.tmp"
+            pq.write_table(merged, tmp, compression="zstd")
+            os.replace(tmp, partition / f"part-{run_id}.parquet")
+            superseded.extend(str(p.relative_to(self.out_dir)) for p in parts)
+            rewritten += 1
+        if rewritten:
+            # Until this is saved the merged files are orphans and the old parts stay authoritative
+            state["runs"].append(run_id)
+            state["superseded"] = superseded
+            self._save_state(state)
+            self._finish_compaction(state)
+        return rewritten
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export interviews and grades to partitioned Parquet")
+    parser.add_argument("--out", type=Path, default=Path(os.getenv("PARQUET_EXPORT_DIR", "exports")))
+    parser.add_argument("--call-data", type=Path, default=Path(os.getenv("CALL_DATA_DIR", "call_data")))
+    parser.add_argument("--tavus-webhooks", type=Path, default=Path(os.getenv("TAVUS_WEBHOOK_DIR", "tavus_webhooks")))
+    parser.add_argument("--compact", action="store_true", help="merge each partition's part files into one")
+    args = parser.parse_args()
+
+    exporter = ParquetExporter(args.out, {"call_data": args.call_data, "tavus_webhooks": args.tavus_webhooks})
+    if args.compact:
+        print(f"Compacted {exporter.compact()} partitions in {args.out}")
+    else:
+        result = exporter.run()
+        print(f"Exported {result['files']} new files to {args.out}: {result['rows']}")
@@ -0,0 +1,186 @@
+"""
+Pending Call Store
+
+Holds each call's call_ended payload until the matching call_analyzed webhook arrives and the
+two are merged into call_data/. A call_ended carries the transcript three times over (text,
+transcript_object, transcript_with_tool_calls), and a call_analyzed that never comes used to
+keep it in memory for the life of the process. The store is bounded:
+
+- At most PENDING_CALLS_MAX_ENTRIES records and PENDING_CALLS_MAX_BYTES of serialized payload
+  in memory; beyond that the oldest are evicted.
+- Records older than PENDING_CALLS_TTL_S are evicted on the next access.
+- Evicted records are spilled to PENDING_CALLS_SPILL_DIR as one JSON file per call, so a late
+  call_analyzed still merges with its call_ended. Spill files older than
+  PENDING_CALLS_SPILL_TTL_S are deleted.
+
+Occupancy and eviction counters: GET /pending-calls and pending_calls_* in /metrics.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class PendingCallStore:
+    def __init__(
+        self,
+        spill_dir: Path,
+        max_entries: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_s: float = 3600.0,
+        spill_ttl_s: float = 7 * 24 * 3600.0,
+        clock=time.time,
+    ):
+        self.spill_dir = Path(spill_dir)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.spill_ttl_s = spill_ttl_s
+        self.clock = clock
+        self._lock = threading.Lock()
+        # call_id -> (stored_at, size, record), oldest first
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._last_spill_prune = 0.0
+        self.counters = {
+            "stored": 0,
+            "evicted_ttl": 0,
+            "evicted_capacity": 0,
+            "spill_errors": 0,
+            "merged_from_memory": 0,
+            "merged_from_disk": 0,
+            "missed": 0,
+        }
+
+    def _spill_path(self, call_id: str) -> Path:
+        return self.spill_dir / (re.sub(r"[^A-Za-z0-9_.-]", "_", call_id) + ".json")
+
+    # --- eviction (call with self._lock held) ---
+
+    def _spill(self, call_id: str, stored_at: float, record: Dict[str, Any]):
+        try:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            with open(self._spill_path(call_id), "w") as f:
+                json.dump({"call_id": call_id, "stored_at": stored_at, "record": record}, f)
+        except Exception as e:
+            self.counters["spill_errors"] += 1
+            print(f"Error spilling pending call {call_id}: {e}")
+
+    def _evict(self, call_id: str, reason: str):
+        stored_at, size, record = self._entries.pop(call_id)
+        self._bytes -= size
+        self.counters[reason] += 1
+        self._spill(call_id, stored_at, record)
+
+    def _evict_expired(self, now: float):
+        while self._entries:
+            call_id, (stored_at, _, _) = next(iter(self._entries.items()))
+            if now - stored_at < self.ttl_s:
+                break
+            self._evict(call_id, "evicted_ttl")
+
+    def _evict_over_capacity(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._evict(next(iter(self._entries)), "evicted_capacity")
+
+    def _prune_spill(self, now: float):
+        if now - self._last_spill_prune < 60 or not self.spill_dir.exists():
+            return
+        self._last_spill_prune = now
+        for path in self.spill_dir.glob("*.json"):
+            try:
+                if now - path.stat().st_mtime > self.spill_ttl_s:
+                    path.unlink()
+            except OSError:
+                pass
+
+    # --- public API ---
+
+    def put(self, call_id: str, record: Dict[str, Any]):
+        size = len(json.dumps(record, default=str))
+        now = self.clock()
+        with self._lock:
+            if call_id in self._entries:
+                self._bytes -= self._entries.pop(call_id)[1]
+            self.counters["stored"] += 1
+            if size > self.max_bytes:
+                # Would push everything else out and still not fit
+                self.counters["evicted_capacity"] += 1
+                self._spill(call_id, now, record)
+                return
+            self._entries[call_id] = (now, size, record)
+            self._bytes += size
+            self._evict_expired(now)
+            self._evict_over_capacity()
+            self._prune_spill(now)
+
+    def pop(self, call_id: str) -> Optional[Dict[str, Any]]:
+        """The call's record, from memory or the spill directory (removed from both); None if unknown."""
+        with self._lock:
+            self._evict_expired(self.clock())
+            entry = self._entries.pop(call_id, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+                self.counters["merged_from_memory"] += 1
+                return entry[2]
+
+            path = self._spill_path(call_id)
+            try:
+                with open(path) as f:
+                    record = json.load(f)["record"]
+                path.unlink()
+            except FileNotFoundError:
+                self.counters["missed"] += 1
+                return None
+            except Exception as e:
+                print(f"Error reading spilled pending call {call_id}: {e}")
+                self.counters["missed"] += 1
+                return None
+            self.counters["merged_from_disk"] += 1
+            return record
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            self._evict_expired(self.clock())
+            spilled = sum(1 for _ in self.spill_dir.glob("*.json")) if self.spill_dir.exists() else 0
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl_s,
+                "spilled_entries": spilled,
+                **self.counters,
+            }
+
+
+@lru_cache(maxsize=None)
+def get_pending_calls() -> PendingCallStore:
+    spill_dir = os.getenv("PENDING_CALLS_SPILL_DIR") or os.path.join(os.getenv("CALL_DATA_DIR", "call_data"), "pending")
+    return PendingCallStore(
+        Path(spill_dir),
+        max_entries=int(os.getenv("PENDING_CALLS_MAX_ENTRIES", "1000")),
+        max_bytes=int(os.getenv("PENDING_CALLS_MAX_BYTES", str(64 * 1024 * 1024))),
+        ttl_s=float(os.getenv("PENDING_CALLS_TTL_S", "3600")),
+        spill_ttl_s=float(os.getenv("PENDING_CALLS_SPILL_TTL_S", str(7 * 24 * 3600))),
+    )
+
+
+def render_pending_calls_metrics() -> str:
+    """Store occupancy and counters in Prometheus text format."""
+    status = get_pending_calls().status()
+    lines = []
+    for metric, key in (("pending_calls_entries", "entries"), ("pending_calls_bytes", "bytes"),
+                        ("pending_calls_spilled_entries", "spilled_entries")):
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {status[key]}")
+    lines.append("# TYPE pending_calls_events_total counter")
+    for key in ("stored", "evicted_ttl", "evicted_capacity", "spill_errors", "merged_from_memory", "merged_from_disk", "missed"):
+        lines.append(f'pending_calls_events_total{{event="{key}"}} {status[key]}')
+    return "\n".join(lines) + "\n"
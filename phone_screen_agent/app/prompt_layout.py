@@ -0,0 +1,54 @@
+"""
+Prompt Layout for Provider Prefix Caching
+
+OpenAI and xAI reuse the work for the longest prompt prefix they have seen recently (OpenAI:
+prompts of 1024+ tokens, matched in 128-token steps) and bill those tokens at the cached rate.
+A prefix only matches byte for byte, so every prompt is laid out the same way:
+
+1. A system message holding all static text: role, rubric, task, output format.
+2. The variable data (transcript, diagram, findings) in the messages after it.
+
+Anything interpolated into the static part (a chunk number, a request id) would end the
+cached prefix right there, so a layout's prefix is fixed when it is built and never formatted.
+
+Calls pass `prompt_name=layout.name` to the gateway, which tracks cached vs. prompt tokens per
+prompt (see /llm-usage "by_prompt") and routes calls sharing a prefix to the same provider cache.
+"""
+
+import hashlib
+from typing import Dict, List, Union
+
+_layouts: Dict[str, "PromptLayout"] = {}
+
+
+class PromptLayout:
+    def __init__(self, name: str, system: str, instructions: str = ""):
+        self.name = name
+        self.prefix = system.strip()
+        if instructions.strip():
+            self.prefix += "\n\n" + instructions.strip()
+        self.prefix_hash = hashlib.sha256(self.prefix.encode()).hexdigest()[:12]
+        _layouts[name] = self
+
+    def messages(self, *variable: Union[str, dict, List[dict]]) -> List[dict]:
+        """
+        The static prefix followed by the variable parts, in order: a string becomes a user
+        message, a dict is used as a message, a list is spliced in (e.g. a transcript).
+        """
+        messages = [{"role": "system", "content": self.prefix}]
+        for part in variable:
+            if isinstance(part, str):
+                messages.append({"role": "user", "content": part})
+            elif isinstance(part, dict):
+                messages.append(part)
+            else:
+                messages.extend(part)
+        return messages
+
+
+def prompt_layouts() -> Dict[str, Dict[str, object]]:
+    """Registered layouts with their prefix hash and approximate static token count."""
+    return {
+        name: {"prefix_hash": layout.prefix_hash, "prefix_tokens_est": len(layout.prefix) // 4}
+        for name, layout in sorted(_layouts.items())
+    }
@@ -0,0 +1,268 @@
+"""
+Excalidraw Scene Compiler
+
+Turns raw Excalidraw elements into a compact typed graph for LLM diagram analysis:
+labelled nodes (bound/overlapping text resolved into its shape), directed edges from arrow
+bindings, and coarse grid positions. The prompt carries only that, with short refs
+(n1, n2, e1, ...) standing in for element ids; resolve_llm_patches maps the model's answer
+back to real element ids, severity colors and label positions.
+"""
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .label_placement import LabelPlacer
+
+SHAPE_TYPES = {"rectangle", "ellipse", "diamond", "image", "frame"}
+CONNECTOR_TYPES = {"arrow", "line"}
+
+# Coarse position grid: the scene's bounding box is split into GRID_SIZE x GRID_SIZE cells
+GRID_SIZE = 10
+
+# How far (px) an unbound arrow endpoint may be from a shape and still connect to it
+ARROW_SNAP_DISTANCE = 40
+
+CRITICAL = "critical"
+MODERATE = "moderate"
+MINOR = "minor"
+
+# (strokeColor, backgroundColor) per severity
+SEVERITY_COLORS = {
+    CRITICAL: ("#ff0000", "#ffe5e5"),
+    MODERATE: ("#ff8800", "#fff0e0"),
+    MINOR: ("#ffcc00", "#fff9db"),
+}
+
+
+def _bbox(el: dict) -> Tuple[float, float, float, float]:
+    x, y = el.get("x", 0), el.get("y", 0)
+    return x, y, x + (el.get("width") or 0), y + (el.get("height") or 0)
+
+
+def _center(el: dict) -> Tuple[float, float]:
+    x1, y1, x2, y2 = _bbox(el)
+    return (x1 + x2) / 2, (y1 + y2) / 2
+
+
+def _contains(outer: dict, point: Tuple[float, float]) -> bool:
+    x1, y1, x2, y2 = _bbox(outer)
+    return x1 <= point[0] <= x2 and y1 <= point[1] <= y2
+
+
+def _distance_to_bbox(el: dict, point: Tuple[float, float]) -> float:
+    x1, y1, x2, y2 = _bbox(el)
+    dx = max(x1 - point[0], 0, point[0] - x2)
+    dy = max(y1 - point[1], 0, point[1] - y2)
+    return (dx * dx + dy * dy) ** 0.5
+
+
+def _clean_text(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def _arrow_endpoints(el: dict) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+    points = el.get("points") or [[0, 0], [el.get("width") or 0, el.get("height") or 0]]
+    x, y = el.get("x", 0), el.get("y", 0)
+    return (x + points[0][0], y + points[0][1]), (x + points[-1][0], y + points[-1][1])
+
+
+class CompiledScene:
+    """Compact graph plus the ref <-> element id mapping needed to decode model output."""
+
+    def __init__(self):
+        self.nodes: List[Dict[str, Any]] = []
+        self.edges: List[Dict[str, Any]] = []
+        self.ref_to_id: Dict[str, str] = {}
+        self.id_to_ref: Dict[str, str] = {}
+        self.elements_by_id: Dict[str, dict] = {}
+        # Everything on the canvas, including excluded elements: labels must avoid those too
+        self.canvas_elements: List[dict] = []
+        self._placer: Optional[LabelPlacer] = None
+
+    def to_prompt(self) -> str:
+        """Render the graph as terse text, one line per node/edge."""
+        lines = ["NODES (ref: kind \"label\" @col,row on a 10x10 grid, 0,0 = top-left)"]
+        for node in self.nodes:
+            label = f' "{node["label"]}"' if node["label"] else ""
+            lines.append(f"{node['ref']}: {node['kind']}{label} @{node['pos'][0]},{node['pos'][1]}")
+        if self.edges:
+            lines.append("EDGES (ref: from -> to \"label\")")
+            for edge in self.edges:
+                arrow = "--" if edge["kind"] == "line" else "->"
+                label = f' "{edge["label"]}"' if edge["label"] else ""
+                lines.append(f"{edge['ref']}: {edge['from'] or '?'} {arrow} {edge['to'] or '?'}{label}")
+        return "\n".join(lines)
+
+    def element_for_ref(self, ref: str) -> Optional[dict]:
+        el_id = self.ref_to_id.get(ref, ref)
+        return self.elements_by_id.get(el_id)
+
+    @property
+    def placer(self) -> LabelPlacer:
+        """Shared across resolve calls, so labels placed earlier in one analysis are avoided."""
+        if self._placer is None:
+            self._placer = LabelPlacer(self.canvas_elements)
+        return self._placer
+
+
+def compile_scene(elements: List[dict], exclude_ids: Optional[Set[str]] = None) -> CompiledScene:
+    """
+    Compile raw Excalidraw elements into a CompiledScene.
+
+    `exclude_ids` drops elements that aren't the candidate's drawing (e.g. labels we added).
+    """
+    scene = CompiledScene()
+    scene.canvas_elements = elements
+    exclude_ids = exclude_ids or set()
+    live = [el for el in elements if el.get("id") and not el.get("isDeleted") and el["id"] not in exclude_ids]
+    scene.elements_by_id = {el["id"]: el for el in live}
+
+    shapes = [el for el in live if el.get("type") in SHAPE_TYPES]
+    connectors = [el for el in live if el.get("type") in CONNECTOR_TYPES]
+    texts = [el for el in live if el.get("type") == "text"]
+
+    # Resolve labels: MCP-style "label" field, bound text (containerId), then text drawn over a shape
+    labels: Dict[str, List[str]] = {}
+    for el in shapes + connectors:
+        if isinstance(el.get("label"), dict) and el["label"].get("text"):
+            labels.setdefault(el["id"], []).append(_clean_text(el["label"]["text"]))
+    free_texts = []
+    for text in texts:
+        content = _clean_text(text.get("text", ""))
+        if not content:
+            continue
+        container = text.get("containerId")
+        if container and container in scene.elements_by_id:
+            labels.setdefault(container, []).append(content)
+            continue
+        host = next((s for s in shapes if _contains(s, _center(text))), None)
+        if host:
+            labels.setdefault(host["id"], []).append(content)
+        else:
+            free_texts.append(text)
+
+    # Coarse grid over the scene bounds
+    boxes = [_bbox(el) for el in shapes + free_texts] or [(0, 0, 1, 1)]
+    min_x = min(b[0] for b in boxes)
+    min_y = min(b[1] for b in boxes)
+    span_x = max(max(b[2] for b in boxes) - min_x, 1)
+    span_y = max(max(b[3] for b in boxes) - min_y, 1)
+
+    def grid_pos(el):
+        cx, cy = _center(el)
+        return (
+            min(GRID_SIZE - 1, int((cx - min_x) / span_x * GRID_SIZE)),
+            min(GRID_SIZE - 1, int((cy - min_y) / span_y * GRID_SIZE)),
+        )
+
+    counters = {"n": 0, "e": 0}
+
+    def add_ref(prefix, el):
+        counters[prefix] += 1
+        ref = f"{prefix}{counters[prefix]}"
+        scene.ref_to_id[ref] = el["id"]
+        scene.id_to_ref[el["id"]] = ref
+        return ref
+
+    # Top-to-bottom, left-to-right so refs read in diagram order
+    for el in sorted(shapes, key=lambda e: (round(_center(e)[1] / 50), _center(e)[0])):
+        scene.nodes.append({
+            "ref": add_ref("n", el),
+            "kind": el["type"],
+            "label": " / ".join(labels.get(el["id"], [])),
+            "pos": grid_pos(el),
+        })
+
+    # Unlabelled free text may itself be the component (e.g. "Redis" written without a box)
+    for el in free_texts:
+        scene.nodes.append({
+            "ref": add_ref("n", el),
+            "kind": "text",
+            "label": _clean_text(el.get("text", "")),
+            "pos": grid_pos(el),
+        })
+
+    endpoints = shapes + free_texts
+
+    def snap(point, binding):
+        bound = (binding or {}).get("elementId")
+        if bound in scene.id_to_ref:
+            return scene.id_to_ref[bound]
+        nearest = min(endpoints, key=lambda s: _distance_to_bbox(s, point), default=None)
+        if nearest and _distance_to_bbox(nearest, point) <= ARROW_SNAP_DISTANCE:
+            return scene.id_to_ref[nearest["id"]]
+        return None
+
+    for el in connectors:
+        start, end = _arrow_endpoints(el)
+        source = snap(start, el.get("startBinding"))
+        target = snap(end, el.get("endBinding"))
+        if not source and not target:
+            continue
+        scene.edges.append({
+            "ref": add_ref("e", el),
+            "kind": el["type"],
+            "from": source,
+            "to": target,
+            "label": " / ".join(labels.get(el["id"], [])),
+        })
+
+    return scene
+
+
+def resolve_llm_patches(llm_response: dict, scene: CompiledScene) -> Tuple[List[dict], List[dict]]:
+    """
+    Map a compact-graph answer back onto the real canvas.
+
+    "issues" ({id: ref, label, severity}) become a severity-colored highlight on the node plus a
+    label placed next to it without overlapping anything. Explicit "elements_to_update" and
+    "elements_to_create" ({near: ref, text, strokeColor} or {x, y, text}) are still accepted.
+    Real element ids work wherever a ref does. Labels already next to their target are skipped.
+    """
+    updates = []
+    highlighted = set()
+    labels = []  # (target element, text, strokeColor, fontSize)
+
+    for issue in llm_response.get("issues", []):
+        el = scene.element_for_ref(str(issue.get("id", "")))
+        if el is None:
+            print(f"Skipping issue on unknown diagram ref: {issue.get('id')}")
+            continue
+        stroke, background = SEVERITY_COLORS.get(str(issue.get("severity", "")).lower(), SEVERITY_COLORS[CRITICAL])
+        # One color per node: the first (most severe) issue on it wins
+        if el["id"] not in highlighted:
+            highlighted.add(el["id"])
+            updates.append({"id": el["id"], "strokeColor": stroke, "backgroundColor": background})
+        if issue.get("label"):
+            labels.append((el, issue["label"], stroke, 20))
+
+    for patch in llm_response.get("elements_to_update", []):
+        el = scene.element_for_ref(str(patch.get("id", "")))
+        if el is None:
+            print(f"Skipping unknown diagram ref: {patch.get('id')}")
+            continue
+        updates.append({**patch, "id": el["id"]})
+
+    creates = []
+    for item in llm_response.get("elements_to_create", []):
+        text = item.get("text")
+        if not text:
+            continue
+        if "x" in item and "y" in item:
+            creates.append(_label_element(item["x"], item["y"], text, item.get("strokeColor", "#ff0000"), item.get("fontSize", 20)))
+            continue
+        target = scene.element_for_ref(str(item.get("near", "")))
+        if target is None:
+            print(f"Skipping label for unknown diagram ref: {item.get('near')}")
+            continue
+        labels.append((target, text, item.get("strokeColor", "#ff0000"), item.get("fontSize", 20)))
+
+    for target, text, stroke, font_size in labels:
+        if scene.placer.already_labelled(target, text):
+            continue
+        x, y = scene.placer.place(target, text, font_size)
+        creates.append(_label_element(x, y, text, stroke, font_size))
+    return updates, creates
+
+
+def _label_element(x: float, y: float, text: str, stroke: str, font_size: float) -> dict:
+    return {"type": "text", "x": x, "y": y, "text": text, "fontSize": font_size, "strokeColor": stroke}
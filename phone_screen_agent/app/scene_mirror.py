@@ -0,0 +1,207 @@
+"""
+Live Scene Mirror
+
+The canvas server broadcasts every element change over its WebSocket. SceneMirror subscribes
+in the background and keeps a versioned in-memory copy of the scene, so /check_diagram can
+read the diagram without a GET /api/elements round trip.
+
+Consistency: a (re)connect starts from the server's `initial_elements` snapshot. A full REST
+resync happens on `elements_synced` (that message carries no elements), on a `sync_status`
+count mismatch, and on an update that skips an element version or targets an unknown element.
+While disconnected the mirror reports itself stale and readers fall back to REST.
+"""
+
+import asyncio
+import json
+import os
+import time
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .canvas_client import get_canvas_client
+
+RECONNECT_BACKOFF_S = (0.5, 1, 2, 5, 10)
+
+
+def _ws_url(base_url: str) -> str:
+    if base_url.startswith("https://"):
+        return "wss://" + base_url[len("https://"):]
+    if base_url.startswith("http://"):
+        return "ws://" + base_url[len("http://"):]
+    return base_url
+
+
+class SceneMirror:
+    def __init__(self, ws_url: str, resync: Callable[[], Awaitable[List[dict]]]):
+        self.ws_url = ws_url
+        self._resync = resync
+        self.elements: Dict[str, dict] = {}
+        # Bumped on every applied change; readers can key work on it
+        self.version = 0
+        self.connected = False
+        self.synced = False
+        self.last_event_at: Optional[float] = None
+        self.disconnected_at: Optional[float] = time.time()
+        self.reconnects = 0
+        self.resyncs = 0
+        self._listeners: List[Callable[[int], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    # -- reading --
+
+    @property
+    def fresh(self) -> bool:
+        """True while connected and holding a full snapshot, i.e. safe to read instead of REST."""
+        return self.connected and self.synced
+
+    def snapshot(self) -> Tuple[int, List[dict]]:
+        return self.version, list(self.elements.values())
+
+    def add_listener(self, callback: Callable[[int], None]):
+        """`callback(version)` runs on the event loop after every change."""
+        self._listeners.append(callback)
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "connected": self.connected,
+            "synced": self.synced,
+            "version": self.version,
+            "elements": len(self.elements),
+            # How long the mirror may have been missing changes (0 while connected)
+            "staleness_s": 0.0 if self.fresh else round(now - (self.disconnected_at or now), 3),
+            "last_event_age_s": round(now - self.last_event_at, 3) if self.last_event_at else None,
+            "reconnects": self.reconnects,
+            "resyncs": self.resyncs,
+        }
+
+    # -- applying changes --
+
+    def _changed(self):
+        self.version += 1
+        for callback in self._listeners:
+            try:
+                callback(self.version)
+            except Exception as e:
+                print(f"Scene mirror listener failed: {e}")
+
+    def _replace(self, elements: List[dict]):
+        self.elements = {el["id"]: el for el in elements if el.get("id")}
+        self.synced = True
+        self._changed()
+
+    async def resync(self, reason: str):
+        print(f"Scene mirror resync ({reason})")
+        self.resyncs += 1
+        self._replace(await self._resync())
+
+    async def apply_message(self, message: dict):
+        """Apply one canvas broadcast; gaps trigger a REST resync."""
+        kind = message.get("type")
+        self.last_event_at = time.time()
+
+        if kind == "initial_elements":
+            self._replace(message.get("elements", []))
+        elif kind in ("element_created", "element_updated"):
+            element = message.get("element") or {}
+            el_id = element.get("id")
+            if not el_id:
+                return
+            known = self.elements.get(el_id)
+            if kind == "element_updated":
+                if known is None:
+                    await self.resync(f"update for unknown element {el_id}")
+                    return
+                known_version, new_version = known.get("version") or 0, element.get("version") or 0
+                if new_version <= known_version:
+                    return  # duplicate or out-of-order delivery
+                if new_version > known_version + 1:
+                    await self.resync(f"missed updates to {el_id}")
+                    return
+            self.elements[el_id] = element
+            self._changed()
+        elif kind == "element_deleted":
+            if self.elements.pop(message.get("elementId"), None) is not None:
+                self._changed()
+        elif kind == "elements_batch_created":
+            for element in message.get("elements", []):
+                if element.get("id"):
+                    self.elements[element["id"]] = element
+            self._changed()
+        elif kind == "elements_synced":
+            await self.resync("frontend sync")
+        elif kind == "sync_status":
+            if message.get("elementCount") != len(self.elements):
+                await self.resync(f"count mismatch: server {message.get('elementCount')}, mirror {len(self.elements)}")
+
+    # -- connection loop --
+
+    async def run(self):
+        import websockets
+
+        attempt = 0
+        while True:
+            try:
+                async with websockets.connect(self.ws_url, max_size=None) as ws:
+                    self.connected = True
+                    self.disconnected_at = None
+                    attempt = 0
+                    print(f"Scene mirror connected to {self.ws_url}")
+                    async for raw in ws:
+                        try:
+                            message = json.loads(raw)
+                        except ValueError:
+                            continue
+                        await self.apply_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Scene mirror connection error: {e}")
+            finally:
+                if self.connected:
+                    self.connected = False
+                    self.synced = False
+                    self.disconnected_at = time.time()
+            delay = RECONNECT_BACKOFF_S[min(attempt, len(RECONNECT_BACKOFF_S) - 1)]
+            attempt += 1
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def stop_scene_mirror():
+    if get_scene_mirror.cache_info().currsize:
+        await get_scene_mirror().stop()
+
+
+def scene_mirror_enabled() -> bool:
+    return os.getenv("CANVAS_MIRROR", "false").lower() == "true"
+
+
+@lru_cache(maxsize=None)
+def get_scene_mirror() -> SceneMirror:
+    base_url = os.getenv("EXCALIDRAW_BASE_URL", "http://localhost:3010")
+    # Resolve the canvas client per resync: it is recreated after close_canvas_client()
+    return SceneMirror(os.getenv("EXCALIDRAW_WS_URL", _ws_url(base_url)), lambda: get_canvas_client().get_elements())
+
+
+async def get_scene_elements() -> Tuple[Optional[int], List[dict]]:
+    """
+    Current scene as (mirror version, elements): from the mirror when it is live, otherwise
+    fetched over REST (version None).
+    """
+    if scene_mirror_enabled() and get_scene_mirror().fresh:
+        return get_scene_mirror().snapshot()
+    return None, await get_canvas_client().get_elements()
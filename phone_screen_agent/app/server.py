@@ -1,27 +1,121 @@
 import json
 import os
 import asyncio
-import requests
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Any, Optional
-from dotenv import load_dotenv
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from concurrent.futures import TimeoutError as ConnectionTimeoutError
-from retell import Retell
-from openai import OpenAI
 from pydantic import BaseModel
 from .custom_types import (
     ConfigResponse,
     ResponseRequiredRequest,
 )
 from .llm_with_func_calling import LlmClient  # or use .llm
+from .admission import get_admission_controller
+from .llm_endpoints import get_llm_pool
+from .canvas_client import close_canvas_client, get_canvas_client
+from .diagram_cache import describe_delta, diagram_cache, scene_fingerprint
+from .diagram_history import get_diagram_history
+from .diagram_rules import build_patches, find_issues, findings_to_issues, template_feedback
+from .diagram_stream import DiagramResponseParser, SentenceSplitter
+from .prompt_layout import PromptLayout, prompt_layouts
+from .scene_graph import compile_scene, resolve_llm_patches
+from .diagram_prefetch import diagram_prefetch_enabled, get_diagram_prefetcher
+from .scene_mirror import get_scene_elements, get_scene_mirror, scene_mirror_enabled, stop_scene_mirror
+from .loop_monitor import get_loop_monitor, loop_lag_monitor_enabled
+from .pending_calls import get_pending_calls, render_pending_calls_metrics
+from .tracing import TracingMiddleware, current_span, flush_spans, link_trace, span
+from .llm_gateway import (
+    PURPOSE_DIAGRAM_CHECK,
+    chat_completion,
+    stream_chat_completion,
+    get_recent_calls,
+    get_usage_summary,
+    render_prometheus,
+)
+
+# Directories for storing data (created on startup, not at import)
+CALL_DATA_DIR = Path(os.getenv("CALL_DATA_DIR", "call_data"))
+TAVUS_WEBHOOK_DIR = Path(os.getenv("TAVUS_WEBHOOK_DIR", "tavus_webhooks"))
+
+
+@lru_cache(maxsize=None)
+def get_retell():
+    """Retell client, constructed on first use (only needed for signature verification)."""
+    from retell import Retell
+
+    return Retell(api_key=os.environ["RETELL_API_KEY"])
+
+
+def diagram_model() -> str:
+    return os.getenv("LLM_MODEL", "gpt-4o-mini")
+
+
+def diagram_analysis_mode() -> str:
+    # "rules": local analyzer finds issues, LLM only phrases feedback; "llm": full LLM analysis
+    return os.getenv("DIAGRAM_ANALYSIS_MODE", "rules").lower()
+
+
+def diagram_feedback_budget_s() -> float:
+    # Time allowed for the LLM to phrase rule findings before falling back to templated feedback
+    return float(os.getenv("DIAGRAM_FEEDBACK_BUDGET_S", "0.8"))
+
+
+async def record_diagram_version(conversation_id: str, elements: list, reason: str):
+    """Snapshot the canvas into the interview's diagram history; never fails the caller."""
+    try:
+        with span("diagram_history.capture", reason=reason, elements=len(elements)):
+            version = await asyncio.to_thread(get_diagram_history().capture, conversation_id, elements, reason)
+        print(f"Diagram history: {conversation_id} v{version} ({reason})")
+    except Exception as e:
+        print(f"Diagram history capture failed: {e}")
+
 
-load_dotenv(override=True)
-app = FastAPI()
-retell = Retell(api_key=os.environ["RETELL_API_KEY"])
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Env, directories and (optionally) SDK clients are set up here so importing this
+    # module stays cheap; the first request then sees everything ready.
+    from dotenv import load_dotenv
+
+    load_dotenv(override=True)
+    CALL_DATA_DIR.mkdir(exist_ok=True)
+    TAVUS_WEBHOOK_DIR.mkdir(exist_ok=True)
+
+    if os.getenv("PRELOAD_CLIENTS", "false").lower() == "true":
+        # Pay SDK setup before the first live call instead of during it
+        get_llm_pool().preload()
+        if os.getenv("RETELL_API_KEY"):
+            get_retell()
+        print("Preloaded LLM and Retell clients")
+
+    if diagram_prefetch_enabled():
+        # Analyze the diagram in the background once the candidate stops drawing
+        get_diagram_prefetcher().analyze = analyze_scene
+    if scene_mirror_enabled():
+        # Keep a live copy of the canvas so diagram checks skip the GET /api/elements round trip
+        get_scene_mirror().start()
+    if loop_lag_monitor_enabled():
+        get_loop_monitor().start()
+
+    yield
+
+    if loop_lag_monitor_enabled():
+        await get_loop_monitor().stop()
+
+    if diagram_prefetch_enabled():
+        get_diagram_prefetcher().stop()
+    await stop_scene_mirror()
+    await close_canvas_client()
+    flush_spans()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -31,25 +125,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# OpenAI client for Excalidraw analysis
-EXCALIDRAW_BASE_URL = os.getenv("EXCALIDRAW_BASE_URL", "http://localhost:3010")
-OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
-
-openai_client = OpenAI(base_url=OPENAI_BASE_URL, api_key=OPENAI_API_KEY)
-
-# In-memory storage for call data
-call_data_store: Dict[str, Dict[str, Any]] = {}
-
-# Create directories for storing data
-CALL_DATA_DIR = Path("call_data")
-CALL_DATA_DIR.mkdir(exist_ok=True)
-
-TAVUS_WEBHOOK_DIR = Path("tavus_webhooks")
-TAVUS_WEBHOOK_DIR.mkdir(exist_ok=True)
-
+# Root span per request; handlers link it to their call_id / conversation_id trace
+app.add_middleware(TracingMiddleware)
 
 # Pydantic models
 class CheckDiagramRequest(BaseModel):
@@ -57,22 +134,16 @@ class CheckDiagramRequest(BaseModel):
 
 
 # Helper functions for Excalidraw
-def get_scene_elements():
-    """Fetch all elements from the Excalidraw canvas."""
-    resp = requests.get(f"{EXCALIDRAW_BASE_URL}/api/elements")
-    data = resp.json()
-    print(f"Fetched {len(data.get('elements', []))} elements from Excalidraw")
-    resp.raise_for_status()
-    return data.get("elements", [])
-
-
-def call_llm_for_db_highlight(elements):
-    """Ask LLM to evaluate the architecture diagram and identify issues."""
-    prompt = f"""
+DIAGRAM_CHECK_PROMPT = PromptLayout(
+    "diagram_check",
+    "You are an expert system design interviewer specializing in web applications. You analyze architecture diagrams for note-taking apps and provide constructive, specific feedback. You return only valid JSON that can be parsed by Python json.loads.",
+    """
 You are an expert system design interviewer evaluating a candidate's architecture diagram for a web-based note-taking application (similar to Google Keep or Notion).
 
-You are given a JSON array of Excalidraw elements (rectangles, arrows, text, etc.).
-Each element has properties like id, type, x, y, width, height, text, strokeColor, backgroundColor, etc.
+You are given the diagram as a compact graph compiled from the Excalidraw canvas:
+- NODES are components (shapes with their labels, or free-standing text), each with a short ref like n3
+  and a coarse position on a 10x10 grid.
+- EDGES are arrows/lines between node refs, with optional labels.
 
 Context - Note-Taking App Requirements:
 A web-based note-taking app typically needs:
@@ -86,68 +157,84 @@ A web-based note-taking app typically needs:
 Your Task:
 Analyze the architecture diagram and identify issues specific to a note-taking application, such as:
 
-Critical Issues (Red - #ff0000):
+Critical Issues (severity "critical"):
 - Single points of failure for data storage (no database replication/backup)
 - Missing authentication/authorization layer
 - No data persistence strategy
 - Single application server (no redundancy for a production app)
 
-Moderate Concerns (Orange - #ff8800):
+Moderate Concerns (severity "moderate"):
 - Missing caching layer (for frequently accessed notes)
 - No CDN for static assets
 - Missing search infrastructure (for note search)
 - No message queue for async operations (email notifications, etc.)
 - Lack of monitoring/logging infrastructure
 
-Minor Improvements (Yellow - #ffcc00):
+Minor Improvements (severity "minor"):
 - Could benefit from read replicas for scaling
 - Missing rate limiting
 - No mention of backup strategy
 
 Return JSON with:
 - "feedback": 2-3 sentences explaining the main issues. Be specific to note-taking app needs (e.g., "Your database is a single point of failure - if it goes down, users lose access to all their notes. Consider adding replication.")
-- "elements_to_update": Highlight problematic components with appropriate severity colors
-- "elements_to_create": Add brief labels (1-3 words) like "SPOF", "No Auth", "Missing Cache", "Add Replicas"
+- "issues": The problematic components, each as its node ref, a brief label (1-3 words) like "SPOF", "No Auth", "Missing Cache", "Add Replicas", and a severity. For a missing component, use the node it should sit next to
 
 Guidelines:
 - Focus on 1-3 most critical issues for a production note-taking app
 - Be constructive and specific
 - If well-designed, acknowledge strengths and suggest minor improvements
-- Position labels near (not overlapping) the components
+- Highlight colors and label positions are handled for you; don't include coordinates or colors
 
 Respond with **only** valid JSON:
 
-{{
+{
   "feedback": "Your specific, actionable feedback here (2-3 sentences)",
-  "elements_to_update": [
-    {{"id": "<element-id>", "strokeColor": "#ff0000", "backgroundColor": "#ffe5e5"}}
-  ],
-  "elements_to_create": [
-    {{
-      "type": "text",
-      "x": <x-position>,
-      "y": <y-position>,
-      "text": "<brief-label>",
-      "fontSize": 20,
-      "strokeColor": "<color-matching-severity>"
-    }}
+  "issues": [
+    {"id": "<node-ref>", "label": "<brief-label>", "severity": "critical"}
   ]
-}}
+}
+
+The diagram (or what changed in it since your last review) is in the next message.
+""",
+)
 
-Here is the current elements array:
 
-{json.dumps(elements, indent=2)}
+def diagram_check_messages(scene, delta: Optional[str] = None, previous_feedback: Optional[str] = None):
     """
+    Prompt for the full LLM diagram analysis.
 
-    completion = openai_client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=[
-            {
-                "role": "system",
-                "content": "You are an expert system design interviewer specializing in web applications. You analyze architecture diagrams for note-taking apps and provide constructive, specific feedback. You return only valid JSON that can be parsed by Python json.loads.",
-            },
-            {"role": "user", "content": prompt},
-        ],
+    With `delta` (what changed since the last check) and `previous_feedback`, the model re-checks
+    only the changes against its earlier verdict instead of re-reading the whole graph.
+    """
+    if delta is not None and previous_feedback:
+        diagram_section = f"""You already reviewed an earlier version of this diagram and told the candidate:
+"{previous_feedback}"
+
+Since then the candidate changed the diagram as follows (nodes listed under ALL CURRENT NODES are
+everything on the canvas now; components not mentioned as added/removed are unchanged):
+
+{delta}
+
+Judge whether these changes address your earlier feedback and whether they introduce new issues.
+Acknowledge fixes explicitly. Only highlight/label components whose status changed; earlier labels are already on the canvas."""
+    else:
+        diagram_section = f"""Here is the current diagram:
+
+{scene.to_prompt()}"""
+
+    return DIAGRAM_CHECK_PROMPT.messages(diagram_section)
+
+
+def call_llm_for_db_highlight(scene, delta: Optional[str] = None, previous_feedback: Optional[str] = None):
+    """
+    Ask LLM to evaluate the architecture diagram and identify issues.
+    The answer is in node refs; resolve_llm_patches maps it onto the canvas.
+    """
+    completion = chat_completion(
+        PURPOSE_DIAGRAM_CHECK,
+        prompt_name=DIAGRAM_CHECK_PROMPT.name,
+        model=diagram_model(),
+        messages=diagram_check_messages(scene, delta, previous_feedback),
         temperature=0.3,
     )
 
@@ -157,54 +244,81 @@ Here is the current elements array:
         if content.lower().startswith("json"):
             content = content[4:].lstrip()
 
-    data = json.loads(content)
-    return data
-
+    return json.loads(content)
 
-def build_element_lookup(elements):
-    return {el["id"]: el for el in elements if "id" in el}
 
+FEEDBACK_PHRASING_PROMPT = PromptLayout(
+    "diagram_feedback_phrasing",
+    "You are an expert system design interviewer reviewing a candidate's architecture diagram for a note-taking app. Reply with 2-3 plain spoken sentences of constructive, specific feedback. No lists, no markdown.",
+)
 
-def apply_updates(elements, updates):
-    """For each element patch {id, ...props}, merge into original and PUT back."""
-    by_id = build_element_lookup(elements)
 
-    for patch in updates:
-        el_id = patch.get("id")
-        if not el_id or el_id not in by_id:
-            print(f"Skipping unknown element id: {el_id}")
-            continue
+def feedback_phrasing_messages(scene, findings, previous_feedback: Optional[str] = None):
+    """Prompt asking the LLM to turn the analyzer's findings into 2-3 spoken sentences."""
+    issues = "\n".join(f"- [{f['severity']}] {f['message']}" for f in findings[:3]) or "- No structural issues found."
+    earlier = (
+        f'\nEarlier you told the candidate: "{previous_feedback}". Acknowledge anything they have fixed since.\n'
+        if previous_feedback
+        else ""
+    )
+    return FEEDBACK_PHRASING_PROMPT.messages(
+        f"Diagram:\n{scene.to_prompt()}\n\nIssues found, most severe first:\n{issues}\n{earlier}"
+    )
 
-        original = by_id[el_id]
-        updated = {**original, **patch}
 
-        url = f"{EXCALIDRAW_BASE_URL}/api/elements/{el_id}"
-        resp = requests.put(url, json=updated)
-        try:
-            resp.raise_for_status()
-            print(f"Updated element {el_id}")
-        except Exception as e:
-            print(f"Failed to update {el_id}: {e}, response={resp.text}")
+async def phrase_diagram_feedback(scene, findings, previous_feedback: Optional[str] = None) -> str:
+    # Async so that cancelling it (the feedback budget) also drops the request and its admission slot
+    stream = stream_chat_completion(
+        PURPOSE_DIAGRAM_CHECK,
+        prompt_name=FEEDBACK_PHRASING_PROMPT.name,
+        model=diagram_model(),
+        messages=feedback_phrasing_messages(scene, findings, previous_feedback),
+        temperature=0.3,
+        max_tokens=160,
+    )
+    parts = [chunk.choices[0].delta.content or "" async for chunk in stream]
+    return "".join(parts).strip()
 
 
-def create_elements(new_elements):
-    """POST new elements to the canvas."""
-    if not new_elements:
-        return
+async def analyze_diagram_with_rules(scene, previous_feedback: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Fast path: deterministic analyzer for patches, LLM (within a latency budget) for wording.
+    Returns None when the analyzer can't make sense of the diagram.
+    """
+    findings = find_issues(scene)
+    if findings is None:
+        return None
+    feedback = template_feedback(findings)
 
-    url = f"{EXCALIDRAW_BASE_URL}/api/elements"
-    
-    success_count = 0
-    for el in new_elements:
+    budget = diagram_feedback_budget_s()
+    if budget > 0:
         try:
-            resp = requests.post(url, json=el)
-            resp.raise_for_status()
-            success_count += 1
+            feedback = await asyncio.wait_for(phrase_diagram_feedback(scene, findings, previous_feedback), budget)
         except Exception as e:
-            print(f"Failed to create element {el.get('type')}: {e}, response={resp.text}")
-            
-    if success_count > 0:
-        print(f"Created {success_count} new elements")
+            print(f"Using templated diagram feedback ({e!r})")
+    return {"feedback": feedback, "issues": findings_to_issues(findings)}
+
+
+async def analyze_scene(scene, previous=None) -> Dict[str, Any]:
+    """
+    Analyze a compiled scene without touching the canvas. `previous` is the conversation's last
+    DiagramAnalysis, if any. Returns the answer in refs/element ids (see resolve_llm_patches).
+    """
+    previous_feedback = previous.feedback if previous else None
+    started = time.perf_counter()
+    response = None
+    with span("diagram.analyze", mode=diagram_analysis_mode(), nodes=len(scene.nodes)) as analysis:
+        if diagram_analysis_mode() == "rules":
+            response = await analyze_diagram_with_rules(scene, previous_feedback)
+        if response is None:
+            delta = describe_delta(previous.signature, scene) if previous else None
+            if delta is not None:
+                print(f"Re-checking diagram changes only ({len(delta.splitlines())} delta lines)")
+            analysis.set(llm_analysis=True, delta=delta is not None)
+            # Run off the event loop: the call may wait for an admission slot
+            response = await asyncio.to_thread(call_llm_for_db_highlight, scene, delta, previous_feedback)
+    print(f"Diagram analyzed in {(time.perf_counter() - started) * 1000:.0f}ms")
+    return response
 
 
 # Helper functions for Retell call data
@@ -215,31 +329,102 @@ def fetch_retell_call_details(call_id: str) -> Optional[Dict[str, Any]]:
         print("RETELL_API_KEY not set, skipping API call")
         return None
     
-    try:
-        headers = {
-            "Authorization": f"Bearer {retell_api_key}",
-            "Content-Type": "application/json"
-        }
-        response = requests.get(
-            f"https://api.retellai.com/v2/get-call/{call_id}",
-            headers=headers
-        )
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print(f"Error fetching call details for {call_id}: {e}")
-        return None
+    import requests
+
+    with span("retell.get_call") as fetch:
+        try:
+            headers = {
+                "Authorization": f"Bearer {retell_api_key}",
+                "Content-Type": "application/json"
+            }
+            response = requests.get(
+                f"{os.getenv('RETELL_API_BASE_URL', 'https://api.retellai.com')}/v2/get-call/{call_id}",
+                headers=headers
+            )
+            fetch.set(status_code=response.status_code)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            fetch.fail(e)
+            print(f"Error fetching call details for {call_id}: {e}")
+            return None
 
 
 def save_call_data(call_id: str, data: Dict[str, Any]):
     """Save merged call data to JSON file."""
     file_path = CALL_DATA_DIR / f"{call_id}.json"
+    with span("file.write", path=str(file_path)) as write:
+        try:
+            with open(file_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            print(f"Saved call data to {file_path}")
+        except Exception as e:
+            write.fail(e)
+            print(f"Error saving call data: {e}")
+
+
+# LLM usage endpoints: aggregate tokens, cost and latency per purpose
+@app.get("/llm-usage")
+async def llm_usage(recent: int = 0):
+    summary = get_usage_summary()
+    summary["admission"] = get_admission_controller().status()
+    summary["llm_endpoints"] = get_llm_pool().status()
+    summary["diagram_cache"] = diagram_cache.stats()
+    summary["prompt_layouts"] = prompt_layouts()
+    if recent:
+        summary["recent_calls"] = get_recent_calls(recent)
+    return summary
+
+
+@app.get("/scene-mirror")
+async def scene_mirror_status():
+    status = {"enabled": scene_mirror_enabled(), **get_scene_mirror().status()}
+    if diagram_prefetch_enabled():
+        status["prefetch"] = get_diagram_prefetcher().status()
+    return status
+
+
+@app.get("/diagram-history/{conversation_id}")
+async def diagram_history(conversation_id: str):
+    history = get_diagram_history()
+    return {"versions": history.versions(conversation_id), **history.stats(conversation_id)}
+
+
+@app.get("/diagram-history/{conversation_id}/{version}")
+async def diagram_history_version(conversation_id: str, version: int):
     try:
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=2)
-        print(f"Saved call data to {file_path}")
-    except Exception as e:
-        print(f"Error saving call data: {e}")
+        elements = await asyncio.to_thread(get_diagram_history().get_version, conversation_id, version)
+    except KeyError as e:
+        from fastapi import HTTPException
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"version": version, "elements": elements}
+
+
+@app.get("/loop-lag")
+async def loop_lag(reset: bool = False):
+    monitor = get_loop_monitor()
+    status = {"enabled": loop_lag_monitor_enabled(), **monitor.status()}
+    if reset:
+        monitor.reset()
+    return status
+
+
+@app.get("/call-analytics")
+async def call_analytics():
+    # Imported here: NumPy isn't needed (or paid for at startup) until someone asks
+    from .call_analytics import get_call_analytics
+
+    return await asyncio.to_thread(get_call_analytics().summary)
+
+
+@app.get("/pending-calls")
+async def pending_calls():
+    return get_pending_calls().status()
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_prometheus() + render_pending_calls_metrics())
 
 
 # Excalidraw endpoint
@@ -247,21 +432,50 @@ def save_call_data(call_id: str, data: Dict[str, Any]):
 async def check_diagram(request: CheckDiagramRequest):
     try:
         print(f"Checking diagram for conversation: {request.conversation_id}")
+        link_trace("conversation_id", request.conversation_id)
         
-        elements = get_scene_elements()
-        print(f"Fetched {len(elements)} elements from Excalidraw")
-
-        llm_response = call_llm_for_db_highlight(elements)
-        updates = llm_response.get("elements_to_update", [])
-        creates = llm_response.get("elements_to_create", [])
+        canvas = get_canvas_client()
+        with span("diagram.fetch_scene") as fetch:
+            mirror_version, elements = await get_scene_elements()
+            fetch.set(elements=len(elements), mirror=mirror_version is not None)
+        source = f"scene mirror v{mirror_version}" if mirror_version is not None else "Excalidraw"
+        print(f"Fetched {len(elements)} elements from {source}")
+        await record_diagram_version(request.conversation_id, elements, "check")
+
+        # Labels we added on earlier checks aren't part of the candidate's design
+        scene = compile_scene(elements, exclude_ids=diagram_cache.injected_ids(request.conversation_id))
+        fingerprint = scene_fingerprint(scene)
+        previous = diagram_cache.get(request.conversation_id)
+        if previous and previous.fingerprint == fingerprint:
+            diagram_cache.record(hit=True)
+            current_span().set(diagram_cache="hit")
+            print("Diagram unchanged since last check, reusing feedback")
+            return {"feedback": previous.feedback}
+        diagram_cache.record(hit=False)
+
+        llm_response = None
+        if diagram_prefetch_enabled():
+            prefetcher = get_diagram_prefetcher()
+            prefetcher.conversation_id = request.conversation_id
+            llm_response = prefetcher.take(request.conversation_id, fingerprint)
+            if llm_response is not None:
+                print("Using background analysis of the current diagram")
+        if llm_response is None:
+            llm_response = await analyze_scene(scene, previous)
+        # Map refs back to real element ids, severity colors and label positions
+        updates, creates = resolve_llm_patches(llm_response, scene)
         feedback = llm_response.get("feedback", "I've analyzed your diagram.")
 
         print("LLM suggested updates:", updates)
         print("LLM suggested creates:", creates)
 
-        apply_updates(elements, updates)
-        create_elements(creates)
+        # One concurrent round of canvas writes: batched creates alongside pooled PUTs
+        result = await canvas.apply_patches(elements, updates, creates)
+        print(f"Updated {len(result['updated'])} and created {result['created']} elements")
+        for failure in result["failed"]:
+            print(f"Canvas write failed: {failure}")
 
+        diagram_cache.put(request.conversation_id, scene, feedback, result["created_ids"])
         print("Done. Check your Excalidraw room; DB should be highlighted and labeled.")
         return {"feedback": feedback}
 
@@ -271,6 +485,168 @@ async def check_diagram(request: CheckDiagramRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_diagram_text(messages, first_token_budget_s: Optional[float] = None, **kwargs):
+    """
+    Yield content deltas of a streamed diagram-check completion. If no text arrives within
+    `first_token_budget_s`, asyncio.TimeoutError is raised so the caller can fall back.
+    """
+    stream = stream_chat_completion(
+        PURPOSE_DIAGRAM_CHECK, model=diagram_model(), messages=messages, temperature=0.3, **kwargs
+    )
+    deadline = time.perf_counter() + first_token_budget_s if first_token_budget_s else None
+    got_text = False
+    try:
+        while True:
+            try:
+                if deadline and not got_text:
+                    chunk = await asyncio.wait_for(stream.__anext__(), max(deadline - time.perf_counter(), 0.001))
+                else:
+                    chunk = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            text = chunk.choices[0].delta.content
+            if text:
+                got_text = True
+                yield text
+    finally:
+        await stream.aclose()
+
+
+async def diagram_check_events(conversation_id: str):
+    """
+    Run one diagram check as a stream of server-sent events:
+    - "feedback": {"text"} one sentence at a time, as the model writes it
+    - "canvas": {"updated", "created", "failed"} each time a batch of highlights lands
+    - "done": full feedback plus time to first feedback token/sentence and total time
+    """
+    started = time.perf_counter()
+    timings = {"first_token_s": None, "first_sentence_s": None}
+    splitter = SentenceSplitter()
+    sentences = []
+    canvas_tasks = []
+    created_ids = []
+
+    def since_start() -> float:
+        return round(time.perf_counter() - started, 4)
+
+    def feedback_events(text: str, final: bool = False):
+        if text and timings["first_token_s"] is None:
+            timings["first_token_s"] = since_start()
+        events = []
+        for sentence in splitter.feed(text) + (splitter.flush() if final else []):
+            if timings["first_sentence_s"] is None:
+                timings["first_sentence_s"] = since_start()
+            sentences.append(sentence)
+            events.append(sse_event("feedback", {"text": sentence}))
+        return events
+
+    def canvas_events(wait: bool = False):
+        events = []
+        for task in list(canvas_tasks):
+            if not (wait or task.done()):
+                continue
+            canvas_tasks.remove(task)
+            try:
+                result = task.result()
+            except Exception as e:
+                result = {"updated": [], "created": 0, "created_ids": [], "failed": [{"error": str(e)}]}
+            created_ids.extend(result["created_ids"])
+            for failure in result["failed"]:
+                print(f"Canvas write failed: {failure}")
+            events.append(sse_event("canvas", {
+                "updated": len(result["updated"]),
+                "created": result["created"],
+                "failed": len(result["failed"]),
+            }))
+        return events
+
+    try:
+        print(f"Streaming diagram check for conversation: {conversation_id}")
+        link_trace("conversation_id", conversation_id)
+        canvas = get_canvas_client()
+        with span("diagram.fetch_scene") as fetch:
+            mirror_version, elements = await get_scene_elements()
+            fetch.set(elements=len(elements), mirror=mirror_version is not None)
+        await record_diagram_version(conversation_id, elements, "check")
+        scene = compile_scene(elements, exclude_ids=diagram_cache.injected_ids(conversation_id))
+        previous = diagram_cache.get(conversation_id)
+
+        def apply_async(updates, creates):
+            if updates or creates:
+                canvas_tasks.append(asyncio.create_task(canvas.apply_patches(elements, updates, creates)))
+
+        if previous and previous.fingerprint == scene_fingerprint(scene):
+            diagram_cache.record(hit=True)
+            for event in feedback_events(previous.feedback, final=True):
+                yield event
+            yield sse_event("done", {"feedback": previous.feedback, "cached": True, "total_s": since_start(), **timings})
+            return
+        diagram_cache.record(hit=False)
+        previous_feedback = previous.feedback if previous else None
+
+        findings = find_issues(scene) if diagram_analysis_mode() == "rules" else None
+        if findings is not None:
+            # Highlights are known up front; the model only words the feedback
+            apply_async(*build_patches(findings, scene))
+            try:
+                async for text in stream_diagram_text(
+                    feedback_phrasing_messages(scene, findings, previous_feedback),
+                    first_token_budget_s=diagram_feedback_budget_s() or None,
+                    max_tokens=160,
+                    prompt_name=FEEDBACK_PHRASING_PROMPT.name,
+                ):
+                    for event in feedback_events(text) + canvas_events():
+                        yield event
+            except Exception as e:
+                if sentences or timings["first_token_s"] is not None:
+                    raise
+                print(f"Using templated diagram feedback ({e!r})")
+                for event in feedback_events(template_feedback(findings)):
+                    yield event
+        else:
+            delta = describe_delta(previous.signature, scene) if previous else None
+            parser = DiagramResponseParser()
+            async for text in stream_diagram_text(
+                diagram_check_messages(scene, delta, previous_feedback), prompt_name=DIAGRAM_CHECK_PROMPT.name
+            ):
+                feedback_delta, patches = parser.feed(text)
+                if any(patches.values()):
+                    apply_async(*resolve_llm_patches(patches, scene))
+                for event in feedback_events(feedback_delta) + canvas_events():
+                    yield event
+
+        for event in feedback_events("", final=True) + canvas_events():
+            yield event
+        if canvas_tasks:
+            await asyncio.wait(canvas_tasks)
+        for event in canvas_events(wait=True):
+            yield event
+
+        feedback = " ".join(sentences) or "I've analyzed your diagram."
+        diagram_cache.put(conversation_id, scene, feedback, created_ids)
+        print(
+            f"Diagram feedback streamed: first token {timings['first_token_s']}s, "
+            f"first sentence {timings['first_sentence_s']}s, total {since_start()}s"
+        )
+        yield sse_event("done", {"feedback": feedback, "cached": False, "total_s": since_start(), **timings})
+
+    except Exception as e:
+        print(f"Error in streaming check_diagram: {e}")
+        for task in canvas_tasks:
+            task.cancel()
+        yield sse_event("error", {"detail": str(e)})
+
+
+@app.post("/check_diagram/stream")
+async def check_diagram_stream(request: CheckDiagramRequest):
+    """Streaming variant of /check_diagram (server-sent events), so speech can start early."""
+    return StreamingResponse(diagram_check_events(request.conversation_id), media_type="text/event-stream")
+
+
 # Handle webhook from Tavus. Dump all payloads to files for debugging.
 @app.post("/tavus-webhook")
 async def handle_tavus_webhook(request: Request):
@@ -283,6 +659,10 @@ async def handle_tavus_webhook(request: Request):
         
         # Log webhook receipt
         print(f"📥 Tavus webhook: {event_type} (conversation: {conversation_id})")
+        link_trace("conversation_id", conversation_id)
+        current_span().set(event=event_type)
+        if diagram_prefetch_enabled() and conversation_id != "unknown":
+            get_diagram_prefetcher().conversation_id = conversation_id
         
         # Generate filename: conversation_id_datetime_event.json
         timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")
@@ -300,11 +680,20 @@ async def handle_tavus_webhook(request: Request):
             "payload": post_data
         }
         
-        with open(file_path, 'w') as f:
-            json.dump(webhook_data, f, indent=2)
+        with span("file.write", path=str(file_path)):
+            with open(file_path, 'w') as f:
+                json.dump(webhook_data, f, indent=2)
         
         print(f"✓ Saved to: {file_path.name}")
         
+        if event_type == "system.shutdown" and conversation_id != "unknown":
+            # Keep the final state of the candidate's diagram with the interview
+            try:
+                _, elements = await get_scene_elements()
+                await record_diagram_version(conversation_id, elements, "end")
+            except Exception as e:
+                print(f"⚠ Could not fetch final diagram: {e}")
+        
         # Check if this webhook contains a transcript (for grading)
         # Transcript comes in the payload.properties.transcript field
         properties = post_data.get("properties", {})
@@ -319,15 +708,16 @@ async def handle_tavus_webhook(request: Request):
             
             if tavus_transcript:
                 # Grade system design interview
-                grade = grade_interview(tavus_transcript, "system_design")
+                grade = await asyncio.to_thread(grade_interview, tavus_transcript, "system_design")
                 print(f"✓ System design grade: {grade['score']}/3")
                 
                 # Save grade to file
                 grade_filename = f"{conversation_id}_{timestamp}_system_design_grade.json"
                 grade_file_path = TAVUS_WEBHOOK_DIR / grade_filename
                 
-                with open(grade_file_path, 'w') as f:
-                    json.dump(grade, f, indent=2)
+                with span("file.write", path=str(grade_file_path)):
+                    with open(grade_file_path, 'w') as f:
+                        json.dump(grade, f, indent=2)
                 
                 print(f"✓ Saved grade to: {grade_file_path}")
             else:
@@ -337,6 +727,7 @@ async def handle_tavus_webhook(request: Request):
     
     except Exception as err:
         print(f"❌ Tavus webhook error: {err}")
+        current_span().fail(err)
         import traceback
         traceback.print_exc()
         return JSONResponse(
@@ -356,6 +747,8 @@ async def handle_webhook(request: Request):
         call_data = post_data.get("data") or post_data.get("call", {})
         call_id = call_data.get("call_id", "unknown")
         print(f"📥 Retell webhook: {event} (call: {call_id})")
+        link_trace("call_id", call_id)
+        current_span().set(event=event)
         
         # Verify signature
         skip_verification = os.getenv("SKIP_SIGNATURE_VERIFICATION", "false").lower() == "true"
@@ -364,15 +757,18 @@ async def handle_webhook(request: Request):
             print("⚠ SKIPPING signature verification (SKIP_SIGNATURE_VERIFICATION=true)")
             valid_signature = True
         else:
-            try:
-                valid_signature = retell.verify(
-                    json.dumps(post_data, separators=(",", ":"), ensure_ascii=False),
-                    api_key=str(os.environ["RETELL_API_KEY"]),
-                    signature=str(request.headers.get("X-Retell-Signature")),
-                )
-            except Exception as verify_err:
-                print(f"⚠ Signature verification error: {verify_err}")
-                valid_signature = False
+            with span("retell.verify_signature") as verify:
+                try:
+                    valid_signature = get_retell().verify(
+                        json.dumps(post_data, separators=(",", ":"), ensure_ascii=False),
+                        api_key=str(os.environ["RETELL_API_KEY"]),
+                        signature=str(request.headers.get("X-Retell-Signature")),
+                    )
+                except Exception as verify_err:
+                    verify.fail(verify_err)
+                    print(f"⚠ Signature verification error: {verify_err}")
+                    valid_signature = False
+                verify.set(valid=valid_signature)
         
         if not valid_signature:
             print(f"❌ Unauthorized webhook")
@@ -386,32 +782,33 @@ async def handle_webhook(request: Request):
             print(f"✓ Call started: {call_id}")
         elif event == "call_ended":
             print(f"✓ Call ended: {call_id}")
-            # Store call data in memory
-            call_data_store[call_id] = {
+            # Hold until call_analyzed arrives (bounded; spills to disk)
+            get_pending_calls().put(call_id, {
                 "event": event,
                 "call_ended_data": call_data,
                 "received_at": datetime.utcnow().isoformat()
-            }
+            })
             # Grade phone screen interview
             transcript = call_data.get("transcript", "")
             if transcript:
                 print(f"📊 Grading phone screen...")
                 from .grading import grade_interview
                 
-                grade = grade_interview(transcript, "phone_screen")
+                grade = await asyncio.to_thread(grade_interview, transcript, "phone_screen")
                 print(f"✓ Grade: {grade['score']}/3 - Saved to {call_id}_phone_screen_grade.json")
                 
                 # Save grade to file
                 grade_filename = f"{call_id}_phone_screen_grade.json"
                 grade_file_path = CALL_DATA_DIR / grade_filename
                 
-                with open(grade_file_path, 'w') as f:
-                    json.dump(grade, f, indent=2)
+                with span("file.write", path=str(grade_file_path)):
+                    with open(grade_file_path, 'w') as f:
+                        json.dump(grade, f, indent=2)
 
         elif event == "call_analyzed":
             print(f"✓ Call analyzed: {call_id}")
-            # Get stored call_ended data
-            stored_data = call_data_store.get(call_id, {})
+            # Get stored call_ended data (removes it from the pending store)
+            stored_data = get_pending_calls().pop(call_id) or {}
             
             # Fetch full call details from Retell API
             api_call_data = fetch_retell_call_details(call_id)
@@ -430,16 +827,13 @@ async def handle_webhook(request: Request):
             
             # Save merged data to JSON file
             save_call_data(call_id, merged_data)
-            
-            # Clean up from memory
-            if call_id in call_data_store:
-                del call_data_store[call_id]
         else:
             print(f"⚠ Unknown event: {event}")
         
         return JSONResponse(status_code=200, content={"received": True})
     except Exception as err:
         print(f"❌ Retell webhook error: {err}")
+        current_span().fail(err)
         import traceback
         traceback.print_exc()
         return JSONResponse(
@@ -454,7 +848,7 @@ async def handle_webhook(request: Request):
 async def websocket_handler(websocket: WebSocket, call_id: str):
     try:
         await websocket.accept()
-        llm_client = LlmClient()
+        llm_client = LlmClient(call_id)
 
         # Send optional config to Retell server
         config = ConfigResponse(
@@ -504,10 +898,13 @@ async def websocket_handler(websocket: WebSocket, call_id: str):
                     f"""Received interaction_type={request_json['interaction_type']}, response_id={response_id}, last_transcript={request_json['transcript'][-1]['content']}"""
                 )
 
-                async for event in llm_client.draft_response(request):
-                    await websocket.send_json(event.__dict__)
-                    if request.response_id < response_id:
-                        break  # new response needed, abandon this one
+                with span("voice.turn", response_id=request.response_id, turns=len(request.transcript)) as turn:
+                    link_trace("call_id", call_id)
+                    async for event in llm_client.draft_response(request):
+                        await websocket.send_json(event.__dict__)
+                        if request.response_id < response_id:
+                            turn.set(abandoned=True)
+                            break  # new response needed, abandon this one
 
         async for data in websocket.iter_json():
             asyncio.create_task(handle_message(data))
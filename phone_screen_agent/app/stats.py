@@ -0,0 +1,25 @@
+"""
+Percentiles
+
+One definition shared by every latency summary (LLM usage, loop lag, call analytics): the
+nearest-rank percentile, i.e. the smallest sample with at least pct% of samples at or below it.
+It is always an observed value, and matches numpy's method="inverted_cdf".
+"""
+
+import math
+from typing import Iterable, Optional
+
+
+def percentile_rank(count: int, pct: float) -> int:
+    """1-based rank of the pct-th percentile among `count` ordered samples (count > 0)."""
+    # pct * count first: exact for integer percentiles, where pct / 100 * count can round up a rank
+    return min(count, max(1, math.ceil(pct * count / 100)))
+
+
+def percentile(values: Iterable[float], pct: float, ndigits: Optional[int] = None) -> Optional[float]:
+    """Nearest-rank percentile of `values`; None when there are none."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    value = ordered[percentile_rank(len(ordered), pct) - 1]
+    return round(value, ndigits) if ndigits is not None else value
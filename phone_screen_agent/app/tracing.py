@@ -0,0 +1,341 @@
+"""
+Request Tracing
+
+Lightweight spans for following one call or interview through the server: webhook receive,
+signature check, file writes, Retell API fetch, grading, LLM calls and each canvas request.
+
+- Every HTTP request gets a root span (TracingMiddleware); code inside opens child spans with
+  `with span("name", **attributes)`. Nesting follows contextvars, so it carries through
+  asyncio tasks and asyncio.to_thread; wrap thread-pool work with in_current_context().
+- Handlers call link_trace("call_id", call_id): all requests for one call or conversation then
+  share a trace id derived from that key, so Retell's call_ended and call_analyzed webhooks
+  (or a conversation's diagram checks) read as one trace.
+- Finished spans are queued and exported by a background thread, never on the request path.
+
+Exporters (TRACE_EXPORTER):
+- "jsonl": one span per line in TRACE_FILE (default traces.jsonl)
+- "otlp": OTLP/HTTP JSON batches POSTed to TRACE_OTLP_ENDPOINT (a local collector)
+- unset or "none": tracing is off and span() does nothing
+
+Reading a trace back:
+    python -m app.tracing call_abc123          # waterfall of one call's spans from TRACE_FILE
+"""
+
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, List, Optional
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def trace_id_for(key: str) -> str:
+    """Trace id shared by everything linked to one call_id / conversation_id."""
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any], exporter: "SpanExporter"):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.attributes = dict(attributes)
+        self.start_time = time.time()
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+        self._exporter = exporter
+        self._ended = False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error: Any):
+        """Mark the span failed for an error that was handled (e.g. turned into a 500)."""
+        self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def end(self, error: Any = None):
+        if self._ended:
+            return
+        self._ended = True
+        if error is not None:
+            self.fail(error)
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        self._exporter.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+    def fail(self, error: Any):
+        pass
+
+    def end(self, error: Any = None):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter:
+    """Queues finished spans; a daemon thread hands them to `write` in batches."""
+
+    def __init__(self, write: Callable[[List[dict]], None], max_batch: int = 512, max_queue: int = 10000):
+        self.write = write
+        self.max_batch = max_batch
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        threading.Thread(target=self._run, name="span-exporter", daemon=True).start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1  # never block a request on tracing
+
+    def flush(self, timeout: float = 5.0):
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch, flushes = [], []
+            while True:
+                if isinstance(item, threading.Event):
+                    flushes.append(item)
+                else:
+                    batch.append(item.to_dict())
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.write(batch)
+                except Exception as e:
+                    print(f"Span export failed ({len(batch)} spans): {e}")
+            for done in flushes:
+                done.set()
+
+
+def jsonl_writer(path: str) -> Callable[[List[dict]], None]:
+    def write(spans: List[dict]):
+        with open(path, "a") as f:
+            f.write("".join(json.dumps(s, default=str) + "\n" for s in spans))
+
+    return write
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: List[dict], service_name: str = "phone_screen_agent") -> Dict[str, Any]:
+    """OTLP/JSON ExportTraceServiceRequest for a batch of span dicts."""
+    otlp_spans = []
+    for s in spans:
+        start_ns = int(s["start_time"] * 1e9)
+        otlp_spans.append({
+            "traceId": s["trace_id"],
+            "spanId": s["span_id"],
+            "parentSpanId": s["parent_id"] or "",
+            "name": s["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int(s["duration_ms"] * 1e6)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s["attributes"].items() if v is not None],
+            "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+        })
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": otlp_spans}],
+        }]
+    }
+
+
+def otlp_writer(endpoint: str) -> Callable[[List[dict]], None]:
+    import httpx
+
+    client = httpx.Client(timeout=5.0)
+
+    def write(spans: List[dict]):
+        client.post(endpoint, json=to_otlp(spans)).raise_for_status()
+
+    return write
+
+
+@lru_cache(maxsize=None)
+def get_exporter() -> Optional[SpanExporter]:
+    kind = os.getenv("TRACE_EXPORTER", "none").lower()
+    if kind == "jsonl":
+        return SpanExporter(jsonl_writer(os.getenv("TRACE_FILE", "traces.jsonl")))
+    if kind == "otlp":
+        return SpanExporter(otlp_writer(os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")))
+    return None
+
+
+def flush_spans(timeout: float = 5.0):
+    if get_exporter.cache_info().currsize and get_exporter() is not None:
+        get_exporter().flush(timeout)
+
+
+def start_span(name: str, **attributes):
+    """
+    A child of the current span that doesn't become current itself; call .end() when done.
+    For work that outlives the code starting it, like a stream consumed by someone else.
+    """
+    exporter = get_exporter()
+    if exporter is None:
+        return NOOP_SPAN
+    return Span(name, _current.get(), attributes, exporter)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    exporter = get_exporter()
+    if exporter is None:
+        yield NOOP_SPAN
+        return
+    parent = _current.get()
+    current = Span(name, parent, attributes, exporter)
+    token = _current.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.fail(e)
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            _current.set(parent)  # ended from another context (e.g. a closed async generator)
+        current.end()
+
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+
+def link_trace(key_name: str, key: Optional[str]):
+    """
+    Move the current span and its open ancestors into the trace of a call or conversation.
+    Call it as soon as the id is known; spans that already ended keep their old trace.
+    """
+    if not key or key == "unknown":
+        return
+    trace_id = trace_id_for(key)
+    node = _current.get()
+    while node is not None:
+        if not node._ended:
+            node.trace_id = trace_id
+            node.attributes.setdefault(key_name, key)
+        node = node.parent
+
+
+def in_current_context(fn: Callable) -> Callable:
+    """Wrap `fn` for a thread pool so its spans nest under the span current right now."""
+    context = copy_context()
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+class TracingMiddleware:
+    """ASGI middleware giving each HTTP request a root span ("POST /webhook", ...)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or get_exporter() is None:
+            await self.app(scope, receive, send)
+            return
+
+        with span(f"{scope['method']} {scope['path']}", path=scope["path"]) as root:
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    root.set(status_code=message["status"])
+                    if message["status"] >= 500 and not root.error:
+                        root.fail(f"HTTP {message['status']}")
+                await send(message)
+
+            await self.app(scope, receive, send_with_status)
+
+
+def read_trace(key: str, path: Optional[str] = None) -> List[dict]:
+    """Spans of one call/conversation (or raw trace id) from a JSONL trace file, in start order."""
+    trace_ids = {key, trace_id_for(key)}
+    spans = []
+    with open(path or os.getenv("TRACE_FILE", "traces.jsonl")) as f:
+        for line in f:
+            try:
+                s = json.loads(line)
+            except ValueError:
+                continue
+            if s["trace_id"] in trace_ids:
+                spans.append(s)
+    return sorted(spans, key=lambda s: s["start_time"])
+
+
+def format_waterfall(spans: List[dict]) -> str:
+    if not spans:
+        return "No spans"
+    by_parent: Dict[Optional[str], List[dict]] = {}
+    ids = {s["span_id"] for s in spans}
+    for s in spans:
+        by_parent.setdefault(s["parent_id"] if s["parent_id"] in ids else None, []).append(s)
+    t0 = spans[0]["start_time"]
+    lines = [f"{'start ms':>10} {'duration ms':>12}  span"]
+
+    def walk(parent_id, depth):
+        for s in by_parent.get(parent_id, []):
+            status = f"  ERROR {s['error']}" if s["status"] == "error" else ""
+            lines.append(f"{(s['start_time'] - t0) * 1000:>10.1f} {s['duration_ms']:>12.1f}  {'  ' * depth}{s['name']}{status}")
+            walk(s["span_id"], depth + 1)
+
+    walk(None, 0)
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print one trace as a waterfall")
+    parser.add_argument("key", help="call_id, conversation_id or trace id")
+    parser.add_argument("--file", default=None, help="JSONL trace file (default: TRACE_FILE or traces.jsonl)")
+    args = parser.parse_args()
+    print(format_waterfall(read_trace(args.key, args.file)))
@@ -0,0 +1,208 @@
+"""
+Sample Excalidraw scenes for diagram-analysis benchmarks
+
+Builds scenes shaped like what the canvas server returns after a frontend sync: every element
+carries the full Excalidraw field set (seed, versionNonce, roundness, boundElements, points...)
+plus the server's sync metadata. Run as a script to (re)write benchmarks/fixtures/diagrams/.
+"""
+
+import json
+import random
+from pathlib import Path
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "diagrams"
+
+SYNC_META = {
+    "syncedAt": "2025-12-07T13:50:12.412Z",
+    "source": "frontend_sync",
+    "syncTimestamp": "2025-12-07T13:50:12.401Z",
+}
+
+
+class SceneBuilder:
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.elements = []
+        self.by_id = {}
+
+    def _id(self) -> str:
+        return "".join(self.rng.choice("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-") for _ in range(21))
+
+    def _base(self, el_type: str, x: float, y: float, width: float, height: float) -> dict:
+        el = {
+            "id": self._id(),
+            "type": el_type,
+            "x": x,
+            "y": y,
+            "width": width,
+            "height": height,
+            "angle": 0,
+            "strokeColor": "#1e1e1e",
+            "backgroundColor": "transparent",
+            "fillStyle": "solid",
+            "strokeWidth": 2,
+            "strokeStyle": "solid",
+            "roughness": 1,
+            "opacity": 100,
+            "groupIds": [],
+            "frameId": None,
+            "roundness": {"type": 3} if el_type == "rectangle" else {"type": 2},
+            "seed": self.rng.randint(1, 2 ** 31),
+            "version": self.rng.randint(2, 40),
+            "versionNonce": self.rng.randint(1, 2 ** 31),
+            "isDeleted": False,
+            "boundElements": None,
+            "updated": 1765115400000 + self.rng.randint(0, 600000),
+            "link": None,
+            "locked": False,
+            **SYNC_META,
+        }
+        self.elements.append(el)
+        self.by_id[el["id"]] = el
+        return el
+
+    def box(self, label: str, x: float, y: float, width: float = 180, height: float = 80, kind: str = "rectangle") -> dict:
+        shape = self._base(kind, x, y, width, height)
+        text = self._base("text", x + 10, y + height / 2 - 12, width - 20, 25)
+        text.update({
+            "text": label,
+            "fontSize": 20,
+            "fontFamily": 5,
+            "textAlign": "center",
+            "verticalAlign": "middle",
+            "containerId": shape["id"],
+            "originalText": label,
+            "autoResize": True,
+            "lineHeight": 1.25,
+            "roundness": None,
+        })
+        shape["boundElements"] = [{"type": "text", "id": text["id"]}]
+        return shape
+
+    def arrow(self, source: dict, target: dict, label: str = None) -> dict:
+        sx, sy = source["x"] + source["width"] / 2, source["y"] + source["height"]
+        tx, ty = target["x"] + target["width"] / 2, target["y"]
+        if abs(ty - sy) < 20:
+            sx, sy = source["x"] + source["width"], source["y"] + source["height"] / 2
+            tx, ty = target["x"], target["y"] + target["height"] / 2
+        mid = [(tx - sx) / 2 + self.rng.uniform(-3, 3), (ty - sy) / 2 + self.rng.uniform(-3, 3)]
+        arrow = self._base("arrow", sx, sy, abs(tx - sx), abs(ty - sy))
+        arrow.update({
+            "points": [[0, 0], mid, [tx - sx, ty - sy]],
+            "lastCommittedPoint": None,
+            "startBinding": {"elementId": source["id"], "focus": round(self.rng.uniform(-0.1, 0.1), 6), "gap": 4},
+            "endBinding": {"elementId": target["id"], "focus": round(self.rng.uniform(-0.1, 0.1), 6), "gap": 4},
+            "startArrowhead": None,
+            "endArrowhead": "arrow",
+            "elbowed": False,
+        })
+        for el in (source, target):
+            el["boundElements"] = (el["boundElements"] or []) + [{"type": "arrow", "id": arrow["id"]}]
+        if label:
+            text = self._base("text", sx + mid[0] - 30, sy + mid[1] - 12, 60, 25)
+            text.update({
+                "text": label,
+                "fontSize": 16,
+                "fontFamily": 5,
+                "textAlign": "center",
+                "verticalAlign": "middle",
+                "containerId": arrow["id"],
+                "originalText": label,
+                "autoResize": True,
+                "lineHeight": 1.25,
+                "roundness": None,
+            })
+            arrow["boundElements"] = [{"type": "text", "id": text["id"]}]
+        return arrow
+
+
+def three_tier() -> list:
+    """The minimal diagram the interview asks for: LB -> app -> single DB."""
+    b = SceneBuilder(1)
+    lb = b.box("Load Balancer", 300, 0)
+    app = b.box("App Server", 300, 200)
+    db = b.box("Database", 300, 400, kind="ellipse")
+    b.arrow(lb, app, "HTTP")
+    b.arrow(app, db, "SQL")
+    return b.elements
+
+
+def note_app_medium() -> list:
+    """A reasonable candidate answer with a dozen components."""
+    b = SceneBuilder(2)
+    client = b.box("Web / Mobile Client", 400, 0, 220)
+    cdn = b.box("CDN", 100, 0)
+    lb = b.box("Load Balancer", 400, 180, 220)
+    auth = b.box("Auth Service", 80, 360)
+    app1 = b.box("App Server 1", 320, 360)
+    app2 = b.box("App Server 2", 560, 360)
+    cache = b.box("Redis Cache", 820, 360)
+    primary = b.box("Postgres Primary", 320, 600, 200, 90, kind="ellipse")
+    replica = b.box("Read Replica", 580, 600, 200, 90, kind="ellipse")
+    search = b.box("Search (Elastic)", 840, 600, 200)
+    queue = b.box("Sync Queue", 80, 600)
+    blob = b.box("S3 Attachments", 80, 800)
+    b.arrow(client, cdn, "static")
+    b.arrow(client, lb, "HTTPS")
+    b.arrow(lb, app1)
+    b.arrow(lb, app2)
+    b.arrow(app1, auth, "JWT")
+    b.arrow(app1, cache)
+    b.arrow(app2, cache)
+    b.arrow(app1, primary, "writes")
+    b.arrow(app2, replica, "reads")
+    b.arrow(primary, replica, "replication")
+    b.arrow(app2, search)
+    b.arrow(app1, queue)
+    b.arrow(queue, blob)
+    return b.elements
+
+
+def note_app_large() -> list:
+    """A sprawling multi-region design, ~40 components."""
+    b = SceneBuilder(3)
+    nodes = []
+    for region, offset in (("us-east", 0), ("eu-west", 1400)):
+        lb = b.box(f"LB {region}", offset + 500, 150, 220)
+        apps = [b.box(f"App {region} #{i + 1}", offset + 150 + i * 240, 350) for i in range(5)]
+        cache = b.box(f"Redis {region}", offset + 150, 560)
+        dbs = [b.box(f"Notes DB shard {i + 1} {region}", offset + 400 + i * 260, 560, 220, 90, kind="ellipse") for i in range(3)]
+        replicas = [b.box(f"Replica {i + 1} {region}", offset + 400 + i * 260, 760, 220, 90, kind="ellipse") for i in range(3)]
+        workers = [b.box(f"Worker {region} #{i + 1}", offset + 150 + i * 240, 960) for i in range(3)]
+        queue = b.box(f"Kafka {region}", offset + 900, 960)
+        for app in apps:
+            b.arrow(lb, app)
+            b.arrow(app, cache)
+            b.arrow(app, dbs[apps.index(app) % 3])
+        for db, replica in zip(dbs, replicas):
+            b.arrow(db, replica, "async repl")
+        for worker in workers:
+            b.arrow(queue, worker)
+        nodes.append((lb, queue))
+    dns = b.box("GeoDNS", 1200, -100, 220)
+    for lb, _ in nodes:
+        b.arrow(dns, lb)
+    b.arrow(nodes[0][1], nodes[1][1], "cross-region")
+    return b.elements
+
+
+SCENES = {
+    "three_tier": three_tier,
+    "note_app_medium": note_app_medium,
+    "note_app_large": note_app_large,
+}
+
+
+def load_scene(name: str) -> list:
+    with open(FIXTURE_DIR / f"{name}.json") as f:
+        return json.load(f)["elements"]
+
+
+if __name__ == "__main__":
+    FIXTURE_DIR.mkdir(parents=True, exist_ok=True)
+    for name, build in SCENES.items():
+        elements = build()
+        # Same envelope as GET /api/elements
+        payload = {"success": True, "elements": elements, "count": len(elements)}
+        (FIXTURE_DIR / f"{name}.json").write_text(json.dumps(payload, indent=2) + "\n")
+        print(f"Wrote {name}.json ({len(elements)} elements)")
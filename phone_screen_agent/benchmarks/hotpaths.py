@@ -0,0 +1,291 @@
+"""
+Hot-path benchmarks on recorded Retell and Tavus payloads
+
+Times the server's per-request work offline: every upstream (LLM, canvas server, Retell API,
+grading) is stubbed, so runs are repeatable and only our own code is measured.
+
+- voice_turn.*: parsing a response_required event, converting its transcript and building the
+  prompt, at growing transcript lengths
+- response.*: building and serializing a ResponseResponse the way the LLM websocket sends it
+- extract.*: transcript extraction from Retell call data and Tavus webhooks
+- webhook.*: Retell and Tavus webhook handlers through the ASGI test client
+- check_diagram.*: /check_diagram end to end on the sample diagrams, with a fake canvas and LLM
+
+Fixtures are the committed payloads listed in benchmarks/payload_fixtures.py.
+
+Usage (from phone_screen_agent/):
+    python -m benchmarks.hotpaths                    # run everything
+    python -m benchmarks.hotpaths -k webhook         # only benchmarks whose name starts with "webhook"
+    python -m benchmarks.hotpaths --check            # exit 1 if anything regressed past the baseline
+    python -m benchmarks.hotpaths --update-baseline  # record benchmarks/baselines/hotpaths.json
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from benchmarks.diagram_fixtures import load_scene
+from benchmarks.payload_fixtures import (
+    CALLS,
+    PROJECT_DIR,
+    TAVUS_CONVERSATIONS,
+    load_call,
+    load_tavus_webhooks,
+    retell_webhook_events,
+    voice_transcript,
+)
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "hotpaths.json"
+TRANSCRIPT_TURNS = (10, 50, 200, 1000)
+DIAGRAM_SCENES = ("three_tier", "note_app_medium", "note_app_large")
+
+FAKE_DIAGRAM_ANALYSIS = json.dumps({
+    "feedback": "Your database is a single point of failure. Consider adding a replica.",
+    "issues": [{"id": "n1", "label": "SPOF", "severity": "critical"}],
+})
+FAKE_FEEDBACK = "Nice start. The database has no replica, so one failure takes every note offline."
+
+
+def time_op(fn, repeat: int = 5) -> dict:
+    """Median time per call of `fn` over `repeat` runs of ~0.2s each."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    per_op = statistics.median(t / number for t in timer.repeat(repeat=repeat, number=number))
+    return {"us_per_op": round(per_op * 1e6, 2), "ops_per_s": round(1 / per_op, 1)}
+
+
+def bench_voice_turn() -> dict:
+    from app.custom_types import ResponseRequiredRequest
+    from app.llm_with_func_calling import LlmClient
+
+    client = LlmClient("bench")
+    call = load_call("long")
+    results = {}
+    for turns in TRANSCRIPT_TURNS:
+        event = {"interaction_type": "response_required", "response_id": 7, "transcript": voice_transcript(call, turns)}
+        request = ResponseRequiredRequest(**event)
+        results[f"voice_turn.parse.{turns}"] = time_op(lambda: ResponseRequiredRequest(**event))
+        results[f"voice_turn.convert.{turns}"] = time_op(
+            lambda: client.convert_transcript_to_openai_messages(request.transcript)
+        )
+        results[f"voice_turn.prepare_prompt.{turns}"] = time_op(lambda: client.prepare_prompt(request))
+    return results
+
+
+def bench_response() -> dict:
+    from app.custom_types import ResponseResponse
+
+    def send_chunk():
+        # What draft_response yields per streamed delta and websocket.send_json encodes
+        event = ResponseResponse(response_id=7, content=" the write path", content_complete=False, end_call=False)
+        return json.dumps(event.__dict__, separators=(",", ":"), ensure_ascii=False)
+
+    event = ResponseResponse(response_id=7, content=" the write path", content_complete=False, end_call=False)
+    return {
+        "response.send_chunk": time_op(send_chunk),
+        "response.model_dump_json": time_op(event.model_dump_json),
+    }
+
+
+def bench_extract() -> dict:
+    from app.grading import extract_transcript_from_retell, extract_transcript_from_tavus
+
+    results = {}
+    for name in CALLS:
+        call = load_call(name)
+        results[f"extract.retell.{name}"] = time_op(lambda: extract_transcript_from_retell(call))
+    for conversation_id in TAVUS_CONVERSATIONS:
+        webhook = next(w for w in load_tavus_webhooks(conversation_id) if w["payload"].get("properties", {}).get("transcript"))
+        results[f"extract.tavus.{conversation_id}"] = time_op(lambda: extract_transcript_from_tavus(webhook))
+    return results
+
+
+def _fake_completion(*args, **kwargs):
+    from app import server
+
+    content = FAKE_DIAGRAM_ANALYSIS if kwargs.get("prompt_name") == server.DIAGRAM_CHECK_PROMPT.name else FAKE_FEEDBACK
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _fake_canvas():
+    """A real CanvasClient whose HTTP calls are answered in-process."""
+    import httpx
+
+    from app.canvas_client import CanvasClient
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/elements/batch":
+            elements = json.loads(request.content)["elements"]
+            return httpx.Response(200, json={"elements": [{**el, "id": f"created-{i}"} for i, el in enumerate(elements)]})
+        return httpx.Response(200, json={"success": True})
+
+    canvas = CanvasClient("http://canvas.test")
+    canvas._client = httpx.AsyncClient(base_url="http://canvas.test", transport=httpx.MockTransport(handle))
+    return canvas
+
+
+@contextlib.contextmanager
+def offline_app(data_dir: Path, elements: list = ()):
+    """app.server with upstreams stubbed and data written under `data_dir`; yields a TestClient."""
+    from fastapi.testclient import TestClient
+
+    from app import grading, server
+    from app.diagram_history import get_diagram_history
+
+    async def scene_elements():
+        return None, list(elements)
+
+    def fake_grade(transcript, interview_type, **kwargs):
+        return {"score": 2, "interview_type": interview_type, "transcript_chars": len(transcript)}
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.object(server, "CALL_DATA_DIR", data_dir / "call_data"))
+        stack.enter_context(mock.patch.object(server, "TAVUS_WEBHOOK_DIR", data_dir / "tavus_webhooks"))
+        stack.enter_context(mock.patch.object(server, "chat_completion", _fake_completion))
+        stack.enter_context(mock.patch.object(server, "get_scene_elements", scene_elements))
+        stack.enter_context(mock.patch.object(server, "get_canvas_client", lambda canvas=_fake_canvas(): canvas))
+        stack.enter_context(mock.patch.object(server, "fetch_retell_call_details", lambda call_id: {"call_id": call_id}))
+        stack.enter_context(mock.patch.object(grading, "grade_interview", fake_grade))
+        get_diagram_history.cache_clear()
+        stack.callback(get_diagram_history.cache_clear)
+        client = stack.enter_context(TestClient(server.app))
+        # After startup, which loads .env over the environment
+        stack.enter_context(mock.patch.dict(os.environ, {
+            "SKIP_SIGNATURE_VERIFICATION": "true",
+            "DIAGRAM_HISTORY_DIR": str(data_dir / "diagram_history"),
+            "CANVAS_MIRROR": "false",
+        }))
+        # The server logs every request; keep the timing output readable
+        stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        yield client
+
+
+def bench_webhooks(data_dir: Path) -> dict:
+    retell_events = [event for name in CALLS for event in retell_webhook_events(load_call(name))]
+    tavus_events = [w["payload"] for cid in TAVUS_CONVERSATIONS for w in load_tavus_webhooks(cid)]
+    results = {}
+    with offline_app(data_dir) as client:
+        for name, path, events in (("retell", "/webhook", retell_events), ("tavus", "/tavus-webhook", tavus_events)):
+            bodies = itertools.cycle(events)
+
+            def post():
+                resp = client.post(path, json=next(bodies))
+                assert resp.status_code == 200, resp.text
+
+            results[f"webhook.{name}"] = time_op(post)
+    return results
+
+
+def bench_check_diagram(data_dir: Path) -> dict:
+    results = {}
+    for scene_name in DIAGRAM_SCENES:
+        with offline_app(data_dir, load_scene(scene_name)) as client:
+            for mode in ("rules", "llm"):
+                with mock.patch.dict(os.environ, {"DIAGRAM_ANALYSIS_MODE": mode}):
+                    # A new conversation each time, so every check analyzes the scene
+                    ids = (f"bench-{mode}-{n}" for n in itertools.count())
+
+                    def check():
+                        resp = client.post("/check_diagram", json={"conversation_id": next(ids)})
+                        assert resp.status_code == 200, resp.text
+
+                    results[f"check_diagram.{mode}.{scene_name}"] = time_op(check, repeat=3)
+            client.post("/check_diagram", json={"conversation_id": "bench-unchanged"})
+            results[f"check_diagram.unchanged.{scene_name}"] = time_op(
+                lambda: client.post("/check_diagram", json={"conversation_id": "bench-unchanged"}), repeat=3
+            )
+    return results
+
+
+def run_benchmarks(pattern: str = "") -> dict:
+    groups = {
+        "voice_turn": bench_voice_turn,
+        "response": bench_response,
+        "extract": bench_extract,
+        "webhook": bench_webhooks,
+        "check_diagram": bench_check_diagram,
+    }
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="hotpaths-") as tmp:
+        data_dir = Path(tmp)
+        for name, bench in groups.items():
+            if pattern and pattern.split(".")[0] != name:
+                continue
+            group = bench(data_dir) if name in ("webhook", "check_diagram") else bench()
+            results.update({k: v for k, v in group.items() if k.startswith(pattern)})
+    return results
+
+
+def git_revision() -> str:
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, capture_output=True, text=True)
+    return proc.stdout.strip() or "unknown"
+
+
+def check_regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return human-readable failures for benchmarks slower than the baseline allows."""
+    failures = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before and result["us_per_op"] > before["us_per_op"] * (1 + tolerance):
+            failures.append(
+                f"{name}: {result['us_per_op']}us/op regressed past baseline "
+                f"{before['us_per_op']}us/op (+{int(tolerance * 100)}% allowed)"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the server's hot paths")
+    parser.add_argument("-k", dest="pattern", default="", help="only run benchmarks whose name starts with this")
+    parser.add_argument("--check", action="store_true", help="exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown vs baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else None
+    results = run_benchmarks(args.pattern)
+
+    print(f"{'benchmark':<40} {'us/op':>12} {'ops/s':>12} {'vs baseline':>12}")
+    for name, result in results.items():
+        before = (baseline or {}).get("results", {}).get(name)
+        change = f"{result['us_per_op'] / before['us_per_op'] - 1:+.0%}" if before else "-"
+        print(f"{name:<40} {result['us_per_op']:>12.2f} {result['ops_per_s']:>12.1f} {change:>12}")
+
+    if args.update_baseline:
+        recorded = {
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "machine": platform.machine(),
+            # A filtered run only replaces the benchmarks it ran
+            "results": {**((baseline or {}).get("results", {}) if args.pattern else {}), **results},
+        }
+        BASELINE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        BASELINE_PATH.write_text(json.dumps(recorded, indent=2) + "\n")
+        print(f"Saved baseline to {BASELINE_PATH}")
+        return
+
+    if args.check:
+        if baseline is None:
+            print("No baseline recorded yet; run with --update-baseline first")
+            sys.exit(1)
+        failures = check_regressions(results, baseline["results"], args.tolerance)
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"No regressions vs baseline {baseline['revision']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Recorded Retell and Tavus payloads for hot-path benchmarks
+
+The fixtures are real calls and webhooks already committed under call_data/ and tavus_webhooks/.
+They are pinned by name here, so calls the server saves later don't change what is measured.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+CALL_DATA_DIR = PROJECT_DIR / "call_data"
+TAVUS_WEBHOOK_DIR = PROJECT_DIR / "tavus_webhooks"
+
+# Phone screens by transcript length (5, 15 and 60 turns)
+CALLS = {
+    "short": "call_8bda518b465d31ea53568477345",
+    "medium": "call_4b2137f53290365e91e98dad936",
+    "long": "call_6ed11a5dd9b2d8cdbce21c69c84",
+}
+
+# Complete system design conversations, webhooks in the order Tavus sent them
+TAVUS_CONVERSATIONS = {
+    "c3b20b9d8ca4d4f2": [
+        "c3b20b9d8ca4d4f2_20251207_135045_512495_system_replica_joined",
+        "c3b20b9d8ca4d4f2_20251207_135226_644476_application_transcription_ready",
+        "c3b20b9d8ca4d4f2_20251207_135227_049029_system_shutdown",
+        "c3b20b9d8ca4d4f2_20251207_135247_628879_application_perception_analysis",
+    ],
+    "c457075873f3c45d": [
+        "c457075873f3c45d_20251207_121700_118386_system_replica_joined",
+        "c457075873f3c45d_20251207_121951_279686_application_transcription_ready",
+        "c457075873f3c45d_20251207_121951_681291_system_shutdown",
+        "c457075873f3c45d_20251207_122251_309856_application_perception_analysis",
+    ],
+}
+
+
+def load_call(name: str) -> dict:
+    """Merged call data (call_ended + call_analyzed webhooks and the Retell API record)."""
+    with open(CALL_DATA_DIR / f"{CALLS[name]}.json") as f:
+        return json.load(f)
+
+
+def load_tavus_webhooks(conversation_id: str) -> List[dict]:
+    """Saved webhooks ({"timestamp", "headers", "payload"}) of one conversation, in order."""
+    webhooks = []
+    for stem in TAVUS_CONVERSATIONS[conversation_id]:
+        with open(TAVUS_WEBHOOK_DIR / f"{stem}.json") as f:
+            webhooks.append(json.load(f))
+    return webhooks
+
+
+def retell_webhook_events(call: dict) -> List[dict]:
+    """The webhook bodies Retell sent for a call, as POSTed to /webhook."""
+    return [
+        {"event": "call_ended", "call": call["call_ended_webhook"]},
+        {"event": "call_analyzed", "call": call["call_analyzed_webhook"]},
+    ]
+
+
+def voice_transcript(call: dict, turns: int) -> List[Dict[str, str]]:
+    """
+    The call's utterances as the LLM websocket receives them, repeated to `turns` entries so
+    prompt building can be measured past the length of any recorded call.
+    """
+    utterances = [
+        {"role": u["role"], "content": u["content"]}
+        for u in call["retell_api_data"]["transcript_object"]
+        if u.get("content")
+    ]
+    return [utterances[i % len(utterances)] for i in range(turns)]
@@ -0,0 +1,52 @@
+"""
+Prompt-size comparison for diagram analysis: raw Excalidraw JSON vs the compiled scene graph
+
+Usage (from phone_screen_agent/):
+    python -m benchmarks.scene_tokens
+"""
+
+import json
+import time
+
+from app.scene_graph import compile_scene
+from benchmarks.diagram_fixtures import SCENES, load_scene
+
+
+def count_tokens(text: str) -> int:
+    """tiktoken's o200k count when available, else the ~4 chars/token estimate."""
+    try:
+        import tiktoken
+
+        return len(tiktoken.get_encoding("o200k_base").encode(text))
+    except Exception:
+        return max(1, len(text) // 4)
+
+
+def measure(elements: list) -> dict:
+    raw = json.dumps(elements, indent=2)
+    started = time.perf_counter()
+    compact = compile_scene(elements).to_prompt()
+    compile_ms = (time.perf_counter() - started) * 1000
+    raw_tokens = count_tokens(raw)
+    compact_tokens = count_tokens(compact)
+    return {
+        "elements": len(elements),
+        "raw_tokens": raw_tokens,
+        "compact_tokens": compact_tokens,
+        "reduction": round(1 - compact_tokens / raw_tokens, 4),
+        "compile_ms": round(compile_ms, 3),
+    }
+
+
+def main():
+    print(f"{'scene':<18} {'elements':>8} {'raw tok':>9} {'graph tok':>10} {'reduction':>10} {'compile ms':>11}")
+    for name in SCENES:
+        r = measure(load_scene(name))
+        print(
+            f"{name:<18} {r['elements']:>8} {r['raw_tokens']:>9} {r['compact_tokens']:>10} "
+            f"{r['reduction']:>10.1%} {r['compile_ms']:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Cold-start benchmark and import-time profile for app.server
+
+Each run starts a fresh interpreter, so numbers reflect what a new container (or a test
+process) pays to import the app and run its lifespan startup.
+
+FastAPI itself is imported first and timed on its own. It is most of the total (~0.85s on a
+small container) and varies by machine, so the absolute budget applies to what the app adds
+on top of it; the total is checked against the committed baseline.
+
+Usage (from phone_screen_agent/):
+    python -m benchmarks.startup --profile          # top modules by import time
+    python -m benchmarks.startup --runs 7           # measure cold start
+    python -m benchmarks.startup --check            # fail if slower than baseline/budget
+    python -m benchmarks.startup --update-baseline  # record current numbers as the baseline
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "startup.json"
+
+STARTUP_SNIPPET = """
+import asyncio, json, time
+t0 = time.perf_counter()
+import fastapi, fastapi.responses, fastapi.middleware.cors
+tf = time.perf_counter()
+import app.server as server
+t1 = time.perf_counter()
+
+async def startup():
+    async with server.app.router.lifespan_context(server.app):
+        pass
+
+asyncio.run(startup())
+t2 = time.perf_counter()
+print(json.dumps({"framework_ms": (tf - t0) * 1000, "import_ms": (t1 - t0) * 1000, "lifespan_ms": (t2 - t1) * 1000}))
+"""
+
+
+def profile_imports(module: str = "app.server", top: int = 25) -> dict:
+    """Run `python -X importtime` on a module and return the slowest imports."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+
+    top_level = [r for r in rows if r["module"] == module]
+    return {
+        "module": module,
+        "total_ms": top_level[-1]["cumulative_ms"] if top_level else None,
+        "modules_imported": len(rows),
+        "by_cumulative": sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top],
+        "by_self": sorted(rows, key=lambda r: r["self_ms"], reverse=True)[:top],
+    }
+
+
+def measure_startup(runs: int = 5) -> dict:
+    """Median import and lifespan-startup time over `runs` fresh interpreters; app_ms excludes FastAPI's import."""
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-c", STARTUP_SNIPPET],
+            cwd=PROJECT_DIR,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"Startup run failed:\n{proc.stderr[-2000:]}")
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    import_ms = [s["import_ms"] for s in samples]
+    lifespan_ms = [s["lifespan_ms"] for s in samples]
+    return {
+        "runs": runs,
+        "python": sys.version.split()[0],
+        "framework_ms_median": round(statistics.median(s["framework_ms"] for s in samples), 2),
+        "import_ms_median": round(statistics.median(import_ms), 2),
+        "import_ms_min": round(min(import_ms), 2),
+        "lifespan_ms_median": round(statistics.median(lifespan_ms), 2),
+        "app_ms_median": round(statistics.median(s["import_ms"] - s["framework_ms"] + s["lifespan_ms"] for s in samples), 2),
+        "total_ms_median": round(statistics.median(i + l for i, l in zip(import_ms, lifespan_ms)), 2),
+    }
+
+
+def check_regression(result: dict, baseline: dict, tolerance: float, budget_ms: float) -> list:
+    """Return human-readable failures; empty when within baseline tolerance and budget."""
+    failures = []
+    if result["app_ms_median"] > budget_ms:
+        failures.append(f"app startup {result['app_ms_median']}ms (on top of FastAPI's import) exceeds budget {budget_ms}ms")
+    if baseline:
+        limit = baseline["total_ms_median"] * (1 + tolerance)
+        if result["total_ms_median"] > limit:
+            failures.append(
+                f"cold start {result['total_ms_median']}ms regressed past baseline "
+                f"{baseline['total_ms_median']}ms (+{int(tolerance * 100)}% allowed)"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for app.server")
+    parser.add_argument("--profile", action="store_true", help="print the slowest imports")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--check", action="store_true", help="exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline")
+    parser.add_argument("--budget-ms", type=float, default=250.0, help="budget for the app's own startup, excluding FastAPI's import")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    if args.profile:
+        report = profile_imports(top=args.top)
+        print(f"{report['module']}: {report['total_ms']}ms across {report['modules_imported']} modules\n")
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for row in report["by_cumulative"]:
+            print(f"{row['cumulative_ms']:>14.1f} {row['self_ms']:>9.1f}  {row['module']}")
+        return
+
+    result = measure_startup(args.runs)
+    print(json.dumps(result, indent=2))
+
+    if args.update_baseline:
+        BASELINE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        BASELINE_PATH.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"Saved baseline to {BASELINE_PATH}")
+        return
+
+    if args.check:
+        baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else None
+        if baseline is None:
+            print("No baseline recorded yet; checking the absolute budget only")
+        failures = check_regression(result, baseline, args.tolerance, args.budget_ms)
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if failures:
+            sys.exit(1)
+        print("Startup within budget")
+
+
+if __name__ == "__main__":
+    main()
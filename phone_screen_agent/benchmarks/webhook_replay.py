@@ -0,0 +1,372 @@
+"""
+Webhook replay and throughput benchmark
+
+Rebuilds the webhook traffic of recorded interviews and fires it at a running server:
+- Retell, from call_data/*.json: call_started, call_ended and call_analyzed per call, spaced as
+  they were (call start -> end, then the analysis delay)
+- Tavus, from tavus_webhooks/*.json: every system/application event of a conversation in the
+  order and spacing it was received, with its original headers
+
+Each stage replays the whole set at a rate multiplier (--speed 10 plays a 15 minute interview's
+events in 90s; 0 sends them back to back), --copies times over with fresh call/conversation ids,
+at most --concurrency requests in flight. It reports sustained events/sec, ack latency
+percentiles and, if the server runs with LOOP_LAG_MONITOR=true, its event loop lag.
+
+The server must not reach real upstreams. `stub` serves stand-ins for the OpenAI-compatible LLM
+API (canned grading JSON after --llm-latency-ms), Retell's get-call and the canvas server:
+
+    python -m benchmarks.webhook_replay stub --port 8100
+    OPENAI_BASE_URL=http://localhost:8100/v1 RETELL_API_BASE_URL=http://localhost:8100 \\
+    EXCALIDRAW_BASE_URL=http://localhost:8100 SKIP_SIGNATURE_VERIFICATION=true LOOP_LAG_MONITOR=true \\
+    CALL_DATA_DIR=/tmp/replay/call_data TAVUS_WEBHOOK_DIR=/tmp/replay/tavus_webhooks \\
+        uvicorn app.server:app --port 8080
+    python -m benchmarks.webhook_replay run --url http://localhost:8080 --speed 10 100 0 --copies 5
+
+With --retell-api-key the Retell events are signed, so signature verification can stay on.
+"""
+
+import argparse
+import asyncio
+import copy
+import hashlib
+import hmac
+import json
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.payload_fixtures import CALL_DATA_DIR, TAVUS_WEBHOOK_DIR
+
+# Recorded headers that describe the original hop, not the event
+DROP_HEADERS = {"host", "content-length", "accept-encoding", "connection", "x-forwarded-for", "x-forwarded-host", "x-forwarded-proto"}
+# Fields of Retell's call object that only exist once the call is over
+POST_CALL_FIELDS = {
+    "end_timestamp", "duration_ms", "transcript", "transcript_object", "transcript_with_tool_calls",
+    "recording_url", "recording_multi_channel_url", "public_log_url", "disconnection_reason", "latency",
+    "call_cost", "call_analysis", "tool_calls",
+}
+
+STUB_GRADE = {
+    "score": 2,
+    "reasoning": "Replay stub grade.",
+    "summary": "Replay stub summary.",
+    "evidence": ["replay stub evidence"],
+}
+
+
+def _parse_time(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def load_retell_sequences(call_dir: Path = CALL_DATA_DIR) -> List[dict]:
+    sequences = []
+    for path in sorted(Path(call_dir).glob("call_*.json")):
+        if path.stem.endswith("_grade"):
+            continue
+        data = json.loads(path.read_text())
+        ended = data.get("call_ended_webhook") or {}
+        analyzed = data.get("call_analyzed_webhook") or {}
+        call = ended or analyzed
+        if not call.get("call_id"):
+            continue
+        started = {k: v for k, v in call.items() if k not in POST_CALL_FIELDS}
+        started["call_status"] = "ongoing"
+        duration_s = (call.get("end_timestamp", 0) - call.get("start_timestamp", 0)) / 1000
+        received = data.get("timestamps") or {}
+        analysis_delay_s = 0.0
+        if received.get("call_ended_received") and received.get("call_analyzed_received"):
+            analysis_delay_s = _parse_time(received["call_analyzed_received"]) - _parse_time(received["call_ended_received"])
+        events = [{"offset_s": 0.0, "path": "/webhook", "headers": {}, "body": {"event": "call_started", "call": started}}]
+        if ended:
+            events.append({"offset_s": max(duration_s, 0.0), "path": "/webhook", "headers": {}, "body": {"event": "call_ended", "call": ended}})
+        if analyzed:
+            events.append({
+                "offset_s": max(duration_s, 0.0) + max(analysis_delay_s, 0.0),
+                "path": "/webhook",
+                "headers": {},
+                "body": {"event": "call_analyzed", "call": analyzed},
+            })
+        sequences.append({"kind": "retell", "id": call["call_id"], "events": events})
+    return sequences
+
+
+def load_tavus_sequences(webhook_dir: Path = TAVUS_WEBHOOK_DIR) -> List[dict]:
+    by_conversation: Dict[str, List[dict]] = {}
+    for path in sorted(Path(webhook_dir).glob("*.json")):
+        saved = json.loads(path.read_text())
+        payload = saved.get("payload")
+        if not isinstance(payload, dict) or not payload.get("conversation_id"):
+            continue  # grade files and anything else saved next to the webhooks
+        by_conversation.setdefault(payload["conversation_id"], []).append(saved)
+    sequences = []
+    for conversation_id, saved_events in by_conversation.items():
+        saved_events.sort(key=lambda s: s["timestamp"])
+        t0 = _parse_time(saved_events[0]["timestamp"])
+        events = [
+            {
+                "offset_s": _parse_time(s["timestamp"]) - t0,
+                "path": "/tavus-webhook",
+                "headers": {k: v for k, v in s.get("headers", {}).items() if k.lower() not in DROP_HEADERS},
+                "body": s["payload"],
+            }
+            for s in saved_events
+        ]
+        sequences.append({"kind": "tavus", "id": conversation_id, "events": events})
+    return sequences
+
+
+def _replace_id(value: Any, old: str, new: str) -> Any:
+    if isinstance(value, str):
+        return new if value == old else value
+    if isinstance(value, dict):
+        return {k: _replace_id(v, old, new) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_replace_id(v, old, new) for v in value]
+    return value
+
+
+def retell_signature(body: str, api_key: str) -> str:
+    """X-Retell-Signature for a body, in the v=<ms>,d=<hmac> form Retell.verify checks."""
+    timestamp = int(time.time() * 1000)
+    digest = hmac.new(api_key.encode(), (body + str(timestamp)).encode(), hashlib.sha256).hexdigest()
+    return f"v={timestamp},d={digest}"
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Replay:
+    def __init__(self, base_url: str, concurrency: int = 32, retell_api_key: Optional[str] = None, timeout_s: float = 30.0):
+        import httpx
+
+        self.base_url = base_url.rstrip("/")
+        self.retell_api_key = retell_api_key
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=timeout_s,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+    async def _post(self, event: dict, due: float, results: List[dict]):
+        body = json.dumps(event["body"], separators=(",", ":"), ensure_ascii=False)
+        headers = {**event["headers"], "content-type": "application/json"}
+        if event["path"] == "/webhook" and self.retell_api_key:
+            headers["X-Retell-Signature"] = retell_signature(body, self.retell_api_key)
+        async with self.semaphore:
+            sent = time.perf_counter()
+            try:
+                resp = await self.client.post(event["path"], content=body.encode(), headers=headers)
+                status = resp.status_code
+            except Exception as e:
+                status = type(e).__name__
+        results.append({
+            "path": event["path"],
+            "status": status,
+            "sent": sent,
+            # How far behind schedule the request left: the client (or --concurrency) is the bottleneck
+            "slip_s": max(0.0, sent - due),
+            "ack_s": time.perf_counter() - sent,
+        })
+
+    async def _play(self, sequence: dict, start: float, speed: float, results: List[dict]):
+        """Events of one call/conversation in order; each waits for the previous ack, like the sender."""
+        for event in sequence["events"]:
+            due = start + (event["offset_s"] / speed if speed else 0.0)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._post(event, due, results)
+
+    async def loop_lag(self, reset: bool = False) -> Optional[dict]:
+        try:
+            resp = await self.client.get("/loop-lag", params={"reset": str(reset).lower()})
+            status = resp.json()
+        except Exception:
+            return None
+        return status if status.get("enabled") else None
+
+    async def run_stage(self, sequences: List[dict], speed: float, copies: int, ramp_s: float) -> dict:
+        plays = []
+        for n in range(copies):
+            for sequence in sequences:
+                # Fresh ids so copies are separate calls to the server (and don't overwrite files)
+                new_id = f"{sequence['id']}-replay{n}"
+                plays.append({**sequence, "events": _replace_id(copy.deepcopy(sequence["events"]), sequence["id"], new_id)})
+
+        await self.loop_lag(reset=True)
+        results: List[dict] = []
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            self._play(play, start + (ramp_s * i / len(plays) if ramp_s else 0.0), speed, results)
+            for i, play in enumerate(plays)
+        ))
+        elapsed = time.perf_counter() - start
+        lag = await self.loop_lag()
+
+        acks = [r["ack_s"] for r in results if r["status"] == 200]
+        errors: Dict[str, int] = {}
+        for r in results:
+            if r["status"] != 200:
+                errors[str(r["status"])] = errors.get(str(r["status"]), 0) + 1
+        to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+        return {
+            "speed": speed,
+            "sequences": len(plays),
+            "events": len(results),
+            "ok": len(acks),
+            "errors": errors,
+            "elapsed_s": round(elapsed, 3),
+            "events_per_s": round(len(results) / elapsed, 1) if elapsed else None,
+            "ack_p50_ms": to_ms(_percentile(acks, 50)),
+            "ack_p99_ms": to_ms(_percentile(acks, 99)),
+            "ack_max_ms": to_ms(max(acks) if acks else None),
+            "ack_mean_ms": to_ms(statistics.mean(acks) if acks else None),
+            "slip_max_ms": to_ms(max((r["slip_s"] for r in results), default=None)),
+            "loop_lag": lag and {k: lag[k] for k in ("samples", "p50_ms", "p99_ms", "max_ms")},
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+async def run_replay(args) -> List[dict]:
+    sequences = []
+    if not args.tavus_only:
+        sequences += load_retell_sequences(args.call_data)
+    if not args.retell_only:
+        sequences += load_tavus_sequences(args.tavus_webhooks)
+    events = sum(len(s["events"]) for s in sequences)
+    print(f"Replaying {len(sequences)} recorded calls/conversations ({events} events) x {args.copies} against {args.url}")
+
+    replay = Replay(args.url, args.concurrency, args.retell_api_key)
+    stages = []
+    try:
+        for speed in args.speed:
+            stage = await replay.run_stage(sequences, speed, args.copies, args.ramp_s)
+            stages.append(stage)
+            lag = stage["loop_lag"]
+            print(
+                f"speed {'max' if not speed else f'{speed:g}x':>6}: {stage['events']} events in {stage['elapsed_s']}s "
+                f"({stage['events_per_s']}/s), ack p50 {stage['ack_p50_ms']}ms p99 {stage['ack_p99_ms']}ms "
+                f"max {stage['ack_max_ms']}ms, loop lag "
+                + (f"p99 {lag['p99_ms']}ms max {lag['max_ms']}ms" if lag else "n/a (LOOP_LAG_MONITOR off)")
+                + (f", errors {stage['errors']}" if stage["errors"] else "")
+            )
+    finally:
+        await replay.aclose()
+    return stages
+
+
+def stub_app(call_dir: Path, llm_latency_s: float, llm_error_rate: float = 0.0):
+    """
+    Stand-ins for the LLM API, Retell's get-call and the canvas server. The LLM answers a
+    `llm_error_rate` share of requests with a 503 (for endpoint failover drills) and streams when asked.
+    """
+    import random
+
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI()
+    recorded_calls = {}
+    for path in Path(call_dir).glob("call_*.json"):
+        if not path.stem.endswith("_grade"):
+            data = json.loads(path.read_text())
+            if data.get("retell_api_data"):
+                recorded_calls[data["call_id"]] = data["retell_api_data"]
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(llm_latency_s)
+        if random.random() < llm_error_rate:
+            return JSONResponse({"error": {"message": "stub overloaded", "type": "server_error"}}, status_code=503)
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in body.get("messages", [])) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": 40, "total_tokens": prompt_tokens + 40}
+        if body.get("stream"):
+            def chunk(delta, finish_reason=None, usage=None):
+                choices = [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else []
+                return "data: " + json.dumps({
+                    "id": "chatcmpl-replay", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": body.get("model", "stub"), "choices": choices, "usage": usage,
+                }) + "\n\n"
+
+            async def events():
+                yield chunk({"role": "assistant", "content": ""})
+                for word in "This is the replay stub talking.".split(" "):
+                    yield chunk({"content": word + " "})
+                yield chunk({}, "stop")
+                yield chunk(None, usage=usage)
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+        return {
+            "id": "chatcmpl-replay",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(STUB_GRADE)},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }
+
+    @app.get("/v2/get-call/{call_id}")
+    async def get_call(call_id: str):
+        original = call_id.split("-replay")[0]
+        return {**recorded_calls.get(original, {}), "call_id": call_id}
+
+    @app.get("/api/elements")
+    async def elements():
+        return {"success": True, "elements": [], "count": 0}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded webhooks against a running server")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="replay webhooks and report throughput")
+    run.add_argument("--url", default="http://localhost:8080")
+    run.add_argument("--speed", type=float, nargs="+", default=[10.0], help="rate multipliers, one stage each (0 = no pacing)")
+    run.add_argument("--copies", type=int, default=1, help="replays of the recorded set per stage")
+    run.add_argument("--concurrency", type=int, default=32, help="max requests in flight")
+    run.add_argument("--ramp-s", type=float, default=0.0, help="spread sequence starts over this many seconds")
+    run.add_argument("--call-data", type=Path, default=CALL_DATA_DIR)
+    run.add_argument("--tavus-webhooks", type=Path, default=TAVUS_WEBHOOK_DIR)
+    run.add_argument("--retell-only", action="store_true")
+    run.add_argument("--tavus-only", action="store_true")
+    run.add_argument("--retell-api-key", default=None, help="sign Retell events with this key")
+    run.add_argument("--json", type=Path, default=None, help="also write the stage reports here")
+
+    stub = sub.add_parser("stub", help="serve stub LLM / Retell / canvas upstreams")
+    stub.add_argument("--port", type=int, default=8100)
+    stub.add_argument("--llm-latency-ms", type=float, default=500.0)
+    stub.add_argument("--llm-error-rate", type=float, default=0.0, help="share of LLM requests answered with a 503")
+    stub.add_argument("--call-data", type=Path, default=CALL_DATA_DIR)
+
+    args = parser.parse_args()
+    if args.command == "stub":
+        import uvicorn
+
+        uvicorn.run(stub_app(args.call_data, args.llm_latency_ms / 1000, args.llm_error_rate), port=args.port, log_level="warning")
+        return
+
+    stages = asyncio.run(run_replay(args))
+    if args.json:
+        args.json.write_text(json.dumps(stages, indent=2) + "\n")
+        print(f"Saved report to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
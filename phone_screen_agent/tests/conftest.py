@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class StubLLM:
+    """
+    Local OpenAI-compatible /v1/chat/completions server. Each attribute can be changed between
+    requests:
+
+    - status: HTTP status to answer with (non-200 returns an error body)
+    - tokens: content tokens of the answer, streamed one chunk each
+    - stall_before_s / stall_after_first_s: pause before the first token / after it
+    - drop_after_first: close the connection mid-stream, right after the first token
+    """
+
+    def __init__(self):
+        self.status = 200
+        self.tokens = ["Hello", " there"]
+        self.stall_before_s = 0.0
+        self.stall_after_first_s = 0.0
+        self.drop_after_first = False
+        self.requests = 0
+        self.stopped = threading.Event()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stub.requests += 1
+                if stub.status != 200:
+                    self._json(stub.status, {"error": {"message": f"stub {stub.status}", "type": "stub"}})
+                elif body.get("stream"):
+                    self._stream(body)
+                else:
+                    self._json(200, {
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", ""),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(stub.tokens)},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {"prompt_tokens": 10, "completion_tokens": len(stub.tokens), "total_tokens": 10 + len(stub.tokens)},
+                    })
+
+            def _json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _event(self, payload):
+                data = f"data: {json.dumps(payload) if isinstance(payload, dict) else payload}\n\n".encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _chunk(self, delta, model):
+                return {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                }
+
+            def _stream(self, body):
+                model = body.get("model", "")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                self._event(self._chunk({"role": "assistant", "content": ""}, model))
+                stub.stopped.wait(stub.stall_before_s)
+                for i, token in enumerate(stub.tokens):
+                    self._event(self._chunk({"content": token}, model))
+                    if i == 0:
+                        if stub.drop_after_first:
+                            # No terminating chunk: the client sees a broken stream
+                            self.close_connection = True
+                            return
+                        stub.stopped.wait(stub.stall_after_first_s)
+                self._event({
+                    "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model, "choices": [],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": len(stub.tokens), "total_tokens": 10 + len(stub.tokens)},
+                })
+                self._event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_llm():
+    """Factory for StubLLM servers, shut down after the test."""
+    stubs = []
+
+    def start():
+        stubs.append(StubLLM())
+        return stubs[-1]
+
+    yield start
+    for stub in stubs:
+        stub.close()
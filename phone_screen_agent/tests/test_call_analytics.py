@@ -0,0 +1,121 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from app.call_analytics import CallAnalytics
+
+
+def _save_call(directory, call_id: str, e2e_values, cost_cents=None, e2e_p50=None, reason="user_hangup"):
+    call = {
+        "call_id": call_id,
+        "start_timestamp": 1765100000000,
+        "duration_ms": 60_000,
+        "disconnection_reason": reason,
+        "latency": {"e2e": {"values": list(e2e_values), "p50": e2e_p50}},
+    }
+    if cost_cents is not None:
+        call["call_cost"] = {"combined_cost": cost_cents}
+    (directory / f"{call_id}.json").write_text(json.dumps({"call_id": call_id, "call_ended_webhook": call}))
+
+
+def _save_grade(directory, call_id: str, score):
+    (directory / f"{call_id}_phone_screen_grade.json").write_text(json.dumps({"score": score}))
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    """300 graded calls (more than the initial column capacity) with known latencies and scores."""
+    rng = random.Random(7)
+    samples, p50s, scores = [], [], []
+    for i in range(300):
+        values = [rng.uniform(300, 3000) for _ in range(5)]
+        score = rng.randint(0, 3)
+        p50 = 800 + 200 * score + rng.uniform(-50, 50)
+        _save_call(tmp_path, f"call_{i:04d}", values, cost_cents=25, e2e_p50=p50)
+        _save_grade(tmp_path, f"call_{i:04d}", score)
+        samples.extend(values)
+        p50s.append(p50)
+        scores.append(score)
+    return tmp_path, samples, p50s, scores
+
+
+def test_fleet_aggregates(fleet):
+    call_dir, samples, p50s, scores = fleet
+    summary = CallAnalytics(call_dir).summary()
+
+    assert summary["calls"] == summary["graded_calls"] == 300
+    e2e = summary["latency"]["e2e"]
+    assert e2e["samples"] == len(samples)
+    for p in (50, 90, 99):
+        # 1 ms histogram bins: within a bin of the exact order statistic
+        assert abs(e2e[f"p{p}_ms"] - np.percentile(samples, p, method="inverted_cdf")) <= 1
+    assert summary["cost_usd"]["per_call"] == 0.25
+    assert summary["cost_usd"]["per_graded_interview"] == 0.25
+    assert summary["duration_s"]["mean"] == 60.0
+    assert summary["scores"]["distribution"] == {str(s): scores.count(s) for s in range(4)}
+    expected_r = np.corrcoef(p50s, scores)[0, 1]
+    assert summary["latency_score_correlation"]["e2e_p50"]["pearson_r"] == pytest.approx(expected_r, abs=1e-3)
+    assert summary["disconnection_reasons"] == {"user_hangup": 300}
+
+
+def test_incremental_refresh_matches_a_full_load(fleet):
+    call_dir = fleet[0]
+    analytics = CallAnalytics(call_dir)
+    analytics.summary()
+
+    _save_call(call_dir, "call_late", [100, 200], cost_cents=50, e2e_p50=150, reason="agent_hangup")
+    _save_grade(call_dir, "call_late", 3)
+    assert analytics.refresh() == 2
+    assert analytics.refresh() == 0
+
+    incremental, full = analytics.summary(), CallAnalytics(call_dir).summary()
+    for summary in (incremental, full):
+        summary.pop("refreshed_at")
+    assert incremental == full
+    assert incremental["calls"] == 301
+
+
+def test_grade_joins_its_call_in_either_order(tmp_path):
+    analytics = CallAnalytics(tmp_path)
+    _save_grade(tmp_path, "call_a", 2)
+    summary = analytics.summary()
+    assert (summary["graded_calls"], summary["grades_without_call_record"]) == (0, 1)
+
+    _save_call(tmp_path, "call_a", [500], cost_cents=40)
+    _save_call(tmp_path, "call_b", [700])
+    summary = analytics.summary()
+    assert (summary["calls"], summary["graded_calls"], summary["grades_without_call_record"]) == (2, 1, 0)
+    assert summary["scores"]["mean"] == 2.0
+
+    _save_grade(tmp_path, "call_b", "n/a")
+    assert analytics.summary()["graded_calls"] == 1
+
+
+def test_failed_and_out_of_range_grades_are_skipped(tmp_path):
+    _save_call(tmp_path, "call_a", [500], cost_cents=40, e2e_p50=500)
+    _save_grade(tmp_path, "call_a", 3)
+    for call_id in ("call_bad0", "call_bad1"):
+        _save_call(tmp_path, call_id, [900], cost_cents=90, e2e_p50=900)
+    # What grade_interview writes when grading fails
+    (tmp_path / "call_bad0_phone_screen_grade.json").write_text(
+        json.dumps({"score": -1, "reasoning": "Error during grading: timeout", "summary": "Grading failed"})
+    )
+    _save_grade(tmp_path, "call_bad1", 7)
+
+    summary = CallAnalytics(tmp_path).summary()
+    assert summary["calls"] == 3
+    assert summary["graded_calls"] == 1
+    assert summary["scores"]["mean"] == 3.0
+    assert summary["scores"]["distribution"] == {"0": 0, "1": 0, "2": 0, "3": 1}
+    assert summary["cost_usd"]["per_graded_interview"] == 0.4
+    assert summary["latency_score_correlation"]["e2e_p50"]["calls"] == 1
+
+
+def test_summary_is_reused_until_something_changes(tmp_path):
+    analytics = CallAnalytics(tmp_path / "missing")
+    first = analytics.summary()
+    assert first["calls"] == 0
+    assert first["latency"]["e2e"]["p50_ms"] is None
+    assert analytics.summary() is first
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+
+from app.canvas_client import CanvasClient
+
+
+def _client(handler) -> CanvasClient:
+    canvas = CanvasClient("http://canvas")
+    canvas._client = httpx.AsyncClient(base_url="http://canvas", transport=httpx.MockTransport(handler))
+    return canvas
+
+
+def test_server_import_does_not_load_httpx():
+    code = "import sys, app.server; print('httpx' in sys.modules)"
+    proc = subprocess.run(
+        [sys.executable, "-c", code], cwd=Path(__file__).resolve().parent.parent, capture_output=True, text=True,
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == "False"
+
+
+def test_apply_patches_batches_creates_and_merges_updates():
+    requests = []
+
+    def handler(request):
+        requests.append((request.method, request.url.path, json.loads(request.content or b"null")))
+        if request.url.path == "/api/elements/batch":
+            created = [{**el, "id": f"new{i}"} for i, el in enumerate(json.loads(request.content)["elements"])]
+            return httpx.Response(200, json={"elements": created})
+        return httpx.Response(200, json={})
+
+    elements = [{"id": "db", "type": "rectangle", "strokeColor": "#000"}]
+    updates = [{"id": "db", "strokeColor": "#f00"}, {"id": "db", "backgroundColor": "#fee"}, {"id": "gone"}]
+    creates = [{"type": "text", "text": "SPOF"}, {"type": "text", "text": "Queue"}]
+    result = asyncio.run(_client(handler).apply_patches(elements, updates, creates))
+
+    assert result["updated"] == ["db"]
+    assert result["created"] == 2
+    assert result["created_ids"] == ["new0", "new1"]
+    assert result["failed"] == [{"op": "update", "id": "gone", "error": "unknown element id"}]
+    puts = [r for r in requests if r[0] == "PUT"]
+    assert puts == [("PUT", "/api/elements/db", {"id": "db", "type": "rectangle", "strokeColor": "#f00", "backgroundColor": "#fee"})]
+    assert sum(1 for r in requests if r[1] == "/api/elements/batch") == 1
+
+
+def test_rejected_batch_falls_back_to_single_creates():
+    def handler(request):
+        if request.url.path == "/api/elements/batch":
+            return httpx.Response(400, json={"error": "invalid element"})
+        element = json.loads(request.content)
+        if element["type"] == "bogus":
+            return httpx.Response(400, text="unknown type")
+        return httpx.Response(200, json={"element": {**element, "id": "ok"}})
+
+    result = asyncio.run(_client(handler).create_elements([{"type": "text"}, {"type": "bogus"}]))
+    assert result["created"] == [{"type": "text", "id": "ok"}]
+    assert result["failed"] == [{"op": "create", "index": 1, "type": "bogus", "error": "400: unknown type"}]
+
+
+class FakeCanvas:
+    """The canvas server's create routes: the batch is validated whole before anything is stored."""
+
+    def __init__(self):
+        self.stored = []
+
+    @staticmethod
+    def _invalid(element) -> bool:
+        return not isinstance(element.get("x"), (int, float))
+
+    def handler(self, request):
+        body = json.loads(request.content)
+        if request.url.path == "/api/elements/batch":
+            bad = next((i for i, el in enumerate(body["elements"]) if self._invalid(el)), None)
+            if bad is not None:
+                return httpx.Response(400, json={"success": False, "error": f"Element {bad}: x", "index": bad})
+            created = [self._store(el) for el in body["elements"]]
+            return httpx.Response(200, json={"success": True, "elements": created})
+        if self._invalid(body):
+            return httpx.Response(400, json={"success": False, "error": "x"})
+        return httpx.Response(200, json={"success": True, "element": self._store(body)})
+
+    def _store(self, element):
+        self.stored.append({**element, "id": f"el{len(self.stored)}"})
+        return self.stored[-1]
+
+
+def test_batch_failing_midway_creates_each_valid_element_once():
+    canvas = FakeCanvas()
+    creates = [{"type": "text", "text": "A", "x": 0}, {"type": "text", "text": "B"}, {"type": "text", "text": "C", "x": 5}]
+    result = asyncio.run(_client(canvas.handler).create_elements(creates))
+
+    assert sorted(el["text"] for el in canvas.stored) == ["A", "C"]
+    assert {el["id"] for el in result["created"]} == {el["id"] for el in canvas.stored}
+    assert [(f["index"], f["error"][:3]) for f in result["failed"]] == [(1, "400")]
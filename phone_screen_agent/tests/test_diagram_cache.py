@@ -0,0 +1,79 @@
+from app.diagram_cache import DiagramAnalysisCache, describe_delta, scene_fingerprint, scene_signature
+from app.scene_graph import compile_scene
+from benchmarks.diagram_fixtures import SceneBuilder, three_tier
+
+
+def _three_tier(seed: int, offset: float = 0, cache: bool = False) -> list:
+    b = SceneBuilder(seed)
+    lb = b.box("Load Balancer", 300 + offset, 0)
+    app = b.box("App Server", 300 + offset, 200)
+    db = b.box("Database", 300 + offset, 400, kind="ellipse")
+    b.arrow(lb, app, "HTTP")
+    b.arrow(app, db, "SQL")
+    if cache:
+        b.arrow(app, b.box("Redis Cache", 600, 200))
+    return b.elements
+
+
+def test_fingerprint_ignores_ids_layout_color_and_our_labels():
+    base = scene_fingerprint(compile_scene(three_tier()))
+    moved = _three_tier(seed=99, offset=120)
+    for el in moved:
+        el["strokeColor"] = "#ff0000"
+    label = {"id": "ours", "type": "text", "x": 900, "y": 0, "width": 60, "height": 20, "text": "SPOF"}
+    assert scene_fingerprint(compile_scene(moved + [label], exclude_ids={"ours"})) == base
+    assert scene_fingerprint(compile_scene(moved + [label])) != base
+
+
+def test_fingerprint_sees_relabels_and_rewiring():
+    base = scene_fingerprint(compile_scene(three_tier()))
+    relabelled = three_tier()
+    next(el for el in relabelled if el.get("text") == "SQL")["text"] = "gRPC"
+    assert scene_fingerprint(compile_scene(relabelled)) != base
+    assert scene_fingerprint(compile_scene(_three_tier(seed=1, cache=True))) != base
+
+
+def test_delta_lists_additions_with_current_refs():
+    previous = scene_signature(compile_scene(three_tier()))
+    scene = compile_scene(_three_tier(seed=5, cache=True))
+    delta = describe_delta(previous, scene)
+    lines = delta.splitlines()
+    assert lines[0] == "ADDED NODES"
+    assert lines[1].startswith('n3: rectangle "Redis Cache" @')
+    assert 'e3: n2 rectangle "App Server" -> n3 rectangle "Redis Cache"' in lines
+    assert "REMOVED NODES" not in lines
+    assert lines[lines.index("ALL CURRENT NODES") + 1:] == [
+        f'{n["ref"]}: {n["kind"]} "{n["label"]}"' for n in scene.nodes
+    ]
+
+
+def test_delta_lists_removals_by_label():
+    previous = scene_signature(compile_scene(_three_tier(seed=5, cache=True)))
+    delta = describe_delta(previous, compile_scene(three_tier()))
+    assert '- rectangle "redis cache"' in delta.splitlines()
+    assert '- rectangle "app server" -> rectangle "redis cache"' in delta.splitlines()
+
+
+def test_unchanged_scene_has_empty_delta_and_rewrites_send_the_full_graph():
+    previous = scene_signature(compile_scene(three_tier()))
+    assert describe_delta(previous, compile_scene(_three_tier(seed=8, offset=50))) == ""
+
+    b = SceneBuilder(4)
+    b.arrow(b.box("Web", 0, 0), b.box("Queue", 0, 200))
+    assert describe_delta(previous, compile_scene(b.elements)) is None
+
+
+def test_cache_is_lru_and_accumulates_injected_ids():
+    cache = DiagramAnalysisCache(max_conversations=2)
+    scene = compile_scene(three_tier())
+    cache.put("a", scene, "first", ["l1"])
+    cache.put("a", scene, "second", ["l2"])
+    assert cache.get("a").feedback == "second"
+    assert cache.injected_ids("a") == {"l1", "l2"}
+
+    cache.put("b", scene, "", [])
+    cache.get("a")
+    cache.put("c", scene, "", [])
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["conversations"] == 2
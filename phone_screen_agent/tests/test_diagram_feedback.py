@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+import pytest
+
+from app import admission, llm_gateway, server
+from app.admission import PRIORITY_BATCH, PRIORITY_DIAGRAM, PRIORITY_LIVE, AdmissionController
+from app.diagram_rules import find_issues, template_feedback
+from app.llm_endpoints import EndpointPool, LLMEndpoint
+from app.scene_graph import compile_scene
+from benchmarks.diagram_fixtures import three_tier
+
+
+@pytest.fixture
+def endpoint(stub_llm, monkeypatch):
+    stub = stub_llm()
+    pool = EndpointPool([LLMEndpoint("stub", stub.base_url, api_key="test", max_retries=0, timeout_s=5)])
+    monkeypatch.setattr(llm_gateway, "get_llm_pool", lambda: pool)
+    llm_gateway.reset_usage()
+    yield stub
+    llm_gateway.reset_usage()
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = AdmissionController(caps={PRIORITY_LIVE: 4, PRIORITY_DIAGRAM: 1, PRIORITY_BATCH: 1})
+    monkeypatch.setattr(admission, "get_admission_controller", lambda: controller)
+    return controller
+
+
+def test_phrased_feedback_within_budget(endpoint, monkeypatch):
+    monkeypatch.setenv("DIAGRAM_FEEDBACK_BUDGET_S", "3")
+    endpoint.tokens = ["Add a ", "replica."]
+    response = asyncio.run(server.analyze_diagram_with_rules(compile_scene(three_tier())))
+    assert response["feedback"] == "Add a replica."
+
+
+def _check_over_budget(scene):
+    async def check():
+        response = await server.analyze_diagram_with_rules(scene)
+        # Nothing left behind holding a slot or waiting on the stalled stream
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        return response, pending
+
+    started = time.perf_counter()
+    response, pending = asyncio.run(check())
+    assert time.perf_counter() - started < 1  # includes waiting for any worker thread
+    assert response["feedback"] == template_feedback(find_issues(scene))
+    assert pending == []
+
+
+def test_over_budget_phrasing_is_cancelled(endpoint, controller, monkeypatch):
+    monkeypatch.setenv("DIAGRAM_FEEDBACK_BUDGET_S", "0.3")
+    endpoint.stall_before_s = 5
+    _check_over_budget(compile_scene(three_tier()))
+
+    assert controller.status()["classes"][PRIORITY_DIAGRAM]["active"] == 0
+    record = llm_gateway.get_recent_calls(1)[0]
+    assert record["purpose"] == llm_gateway.PURPOSE_DIAGRAM_CHECK
+    assert record["latency_s"] < 1
+
+
+def test_over_budget_wait_for_a_slot_is_abandoned(endpoint, controller, monkeypatch):
+    monkeypatch.setenv("DIAGRAM_FEEDBACK_BUDGET_S", "0.3")
+    controller.acquire(PRIORITY_DIAGRAM)  # another check holds the only slot
+    _check_over_budget(compile_scene(three_tier()))
+
+    status = controller.status()["classes"][PRIORITY_DIAGRAM]
+    assert (status["active"], status["waiting"], status["admitted"]) == (1, 0, 1)
+    assert endpoint.requests == 0
@@ -0,0 +1,83 @@
+import copy
+
+import pytest
+
+from app.diagram_history import DiagramHistory, apply_delta, diff_scenes
+
+
+def _el(el_id: str, **fields) -> dict:
+    return {"id": el_id, "type": "rectangle", "x": 0, "y": 0, **fields}
+
+
+def _edits() -> list:
+    """Successive canvases: add, move, restyle, delete, reorder, drop a field."""
+    v1 = [_el("a", text="LB"), _el("b", text="App")]
+    v2 = v1 + [_el("c", text="DB")]
+    v3 = [_el("a", text="LB", x=40), v2[1], _el("c", text="DB", strokeColor="#f00")]
+    v4 = [v3[0], v3[2]]
+    v5 = [v4[1], v4[0], _el("d", text="Cache")]
+    v6 = [{k: v for k, v in el.items() if k != "strokeColor"} for el in v5]
+    return [v1, v2, v3, v4, v5, v6]
+
+
+def test_diff_and_apply_round_trip():
+    scenes = [{el["id"]: el for el in elements} for elements in _edits()]
+    for old, new in zip(scenes, scenes[1:]):
+        result = apply_delta(copy.deepcopy(old), diff_scenes(old, new))
+        assert list(result.items()) == list(new.items())
+
+
+def test_every_version_reconstructs(tmp_path):
+    history = DiagramHistory(tmp_path, keyframe_interval=3)
+    edits = _edits()
+    for elements in edits:
+        history.capture("conv", elements)
+
+    kinds = [v["kind"] for v in history.versions("conv")]
+    assert kinds == ["keyframe", "delta", "delta", "keyframe", "delta", "delta"]
+    reopened = DiagramHistory(tmp_path, keyframe_interval=3)
+    for version, elements in enumerate(edits, 1):
+        assert history.get_version("conv", version) == elements
+        assert reopened.get_version("conv", version) == elements
+    assert history.get_version("conv") == edits[-1]
+
+
+def test_unchanged_scene_adds_no_version(tmp_path):
+    history = DiagramHistory(tmp_path)
+    elements = _edits()[0]
+    assert history.capture("conv", elements) == 1
+    assert history.capture("conv", copy.deepcopy(elements)) == 1
+    assert history.capture("conv", elements + [_el("x", isDeleted=True)]) == 1
+    assert history.capture("conv", list(reversed(elements))) == 2
+
+
+def test_unknown_version_raises(tmp_path):
+    history = DiagramHistory(tmp_path)
+    history.capture("conv", _edits()[0])
+    with pytest.raises(KeyError):
+        history.get_version("conv", 2)
+
+
+def test_caches_are_bounded(tmp_path):
+    history = DiagramHistory(tmp_path, keyframe_interval=3, cache_size=2)
+    edits = _edits()
+    conversations = [f"conv{i}" for i in range(5)]
+    for elements in edits:
+        for conversation_id in conversations:
+            history.capture(conversation_id, elements)
+            assert len(history._indexes) <= 2
+            assert len(history._latest) <= 2
+
+    # Evicted conversations were diffed against their scene read back from disk
+    for conversation_id in conversations:
+        assert history.stats(conversation_id)["count"] == len(edits)
+        assert history.get_version(conversation_id) == edits[-1]
+
+
+def test_lookups_of_unknown_conversations_are_not_cached(tmp_path):
+    history = DiagramHistory(tmp_path)
+    for i in range(100):
+        assert history.versions(f"nobody{i}") == []
+        assert history.stats(f"nobody{i}")["count"] == 0
+    assert len(history._indexes) == 0
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,69 @@
+import asyncio
+
+from app.diagram_cache import scene_fingerprint
+from app.diagram_prefetch import DiagramPrefetcher
+from app.scene_graph import compile_scene
+from benchmarks.diagram_fixtures import three_tier
+
+
+class FakeMirror:
+    fresh = True
+
+    def __init__(self, elements):
+        self.elements = elements
+
+    def snapshot(self):
+        return 1, self.elements
+
+
+def _prefetcher(elements):
+    async def analyze(scene, previous):
+        return {"feedback": "Add a replica", "issues": [{"id": "n3"}]}
+
+    return DiagramPrefetcher(FakeMirror(elements), analyze=analyze)
+
+
+def test_answers_are_kept_per_conversation():
+    elements = three_tier()
+    fingerprint = scene_fingerprint(compile_scene(elements))
+    prefetcher = _prefetcher(elements)
+
+    async def run():
+        for conversation_id in ("prefetch_a", "prefetch_b"):
+            prefetcher.conversation_id = conversation_id
+            await prefetcher._analyze_current()
+
+    asyncio.run(run())
+    assert prefetcher.analyses == 2
+    # b taking over the canvas doesn't discard a's answer, and each gets its own
+    assert prefetcher.take("prefetch_a", fingerprint)["feedback"] == "Add a replica"
+    assert prefetcher.take("prefetch_b", fingerprint) is not None
+    assert prefetcher.take("prefetch_c", fingerprint) is None
+    assert prefetcher.take("prefetch_a", "other") is None
+    assert (prefetcher.hits, prefetcher.misses) == (2, 2)
+
+
+def test_nothing_is_analyzed_or_served_without_a_conversation():
+    elements = three_tier()
+    prefetcher = _prefetcher(elements)
+    asyncio.run(prefetcher._analyze_current())
+    assert prefetcher.analyses == 0
+    assert prefetcher.take(None, scene_fingerprint(compile_scene(elements))) is None
+    assert prefetcher.status()["conversations"] == 0
+
+
+def test_results_are_bounded():
+    elements = three_tier()
+    prefetcher = _prefetcher(elements)
+    prefetcher.max_conversations = 2
+
+    async def run():
+        for conversation_id in ("prefetch_x", "prefetch_y", "prefetch_z"):
+            prefetcher.conversation_id = conversation_id
+            await prefetcher._analyze_current()
+
+    asyncio.run(run())
+    fingerprint = scene_fingerprint(compile_scene(elements))
+    assert prefetcher.take("prefetch_x", fingerprint) is None
+    assert prefetcher.take("prefetch_z", fingerprint) is not None
+    assert prefetcher.status()["result_version"] == 1
@@ -0,0 +1,81 @@
+import re
+
+import pytest
+
+from app.diagram_rules import build_patches, find_issues, findings_to_issues
+from app.scene_graph import CRITICAL, MINOR, MODERATE, compile_scene
+from benchmarks.diagram_fixtures import SceneBuilder, note_app_medium, three_tier
+
+# The line of the diagram_check prompt each rule stands in for
+PROMPT_LINES = {
+    "db_spof": "Single points of failure for data storage",
+    "single_app_server": "Single application server",
+    "no_auth": "Missing authentication/authorization layer",
+    "no_cache": "Missing caching layer",
+    "no_cdn": "No CDN for static assets",
+    "no_search": "Missing search infrastructure",
+    "no_queue": "No message queue for async operations",
+    "db_no_replica": "Could benefit from read replicas",
+}
+
+
+def _rules(elements) -> dict:
+    return {f["rule"]: f for f in find_issues(compile_scene(elements))}
+
+
+def _prompt_severity(line: str) -> str:
+    from app.server import DIAGRAM_CHECK_PROMPT
+
+    prompt = DIAGRAM_CHECK_PROMPT.prefix
+    sections = re.split(r'\(severity "(critical|moderate|minor)"\):', prompt)
+    # ["intro", "critical", "<critical items>", "moderate", "<moderate items>", ...]
+    for severity, items in zip(sections[1::2], sections[2::2]):
+        if line in items.split("\n\n")[0]:
+            return severity
+    raise AssertionError(f"{line!r} not in the diagram prompt")
+
+
+def test_three_tier_findings():
+    findings = _rules(three_tier())
+    assert findings["db_spof"]["severity"] == CRITICAL
+    assert findings["single_app_server"]["severity"] == CRITICAL
+    assert "no_load_balancer" not in findings
+    assert "db_no_replica" not in findings
+
+
+def test_findings_sorted_most_severe_first():
+    order = {CRITICAL: 0, MODERATE: 1, MINOR: 2}
+    findings = find_issues(compile_scene(three_tier()))
+    assert [order[f["severity"]] for f in findings] == sorted(order[f["severity"]] for f in findings)
+
+
+def test_complete_design_has_no_structural_findings():
+    assert _rules(note_app_medium()) == {}
+
+
+def test_unrecognised_scene_is_left_to_the_llm():
+    b = SceneBuilder(7)
+    b.arrow(b.box("Thing", 0, 0), b.box("Other thing", 0, 200))
+    assert find_issues(compile_scene(b.elements)) is None
+
+
+@pytest.mark.parametrize("rule", sorted(PROMPT_LINES))
+def test_rule_severity_matches_prompt(rule):
+    b = SceneBuilder(11)
+    # Two databases without replicas trigger db_no_replica; one triggers db_spof
+    app = b.box("App Server", 0, 0)
+    dbs = [b.box("Database", 0, 200)] if rule != "db_no_replica" else [b.box("DB 1", 0, 200), b.box("DB 2", 300, 200)]
+    for db in dbs:
+        b.arrow(app, db)
+    finding = _rules(b.elements)[rule]
+    assert finding["severity"] == _prompt_severity(PROMPT_LINES[rule])
+
+
+def test_patches_target_top_findings():
+    scene = compile_scene(three_tier())
+    findings = find_issues(scene)
+    issues = findings_to_issues(findings)
+    updates, creates = build_patches(findings, scene)
+    assert len(issues) == 3
+    assert {u["id"] for u in updates} == {scene.element_for_ref(i["id"])["id"] for i in issues}
+    assert sorted(c["text"] for c in creates) == sorted(i["label"] for i in issues)
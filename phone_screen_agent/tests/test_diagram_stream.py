@@ -0,0 +1,60 @@
+import json
+
+from app.diagram_stream import DiagramResponseParser, SentenceSplitter
+
+RESPONSE = {
+    "feedback": 'Your "DB" is a single point of failure.\nAdd a replica — then a cache.',
+    "issues": [
+        {"id": "n3", "label": "SPOF {db}", "severity": "critical"},
+        {"id": "n2", "label": "No cache", "severity": "moderate", "meta": {"feedback": "nested"}},
+    ],
+    "elements_to_create": [{"near": "n1", "text": "Add CDN"}],
+}
+
+
+def _feed_all(parser, text: str, step: int):
+    feedback, patches = "", {}
+    for i in range(0, len(text), step):
+        delta, done = parser.feed(text[i: i + step])
+        feedback += delta
+        for key, items in done.items():
+            patches.setdefault(key, []).extend(items)
+    return feedback, patches
+
+
+def test_any_chunking_yields_the_same_answer():
+    text = "```json\n" + json.dumps(RESPONSE, indent=1) + "\n```"
+    expected_feedback = RESPONSE["feedback"].replace("\n", " ")
+    for step in (1, 2, 7, 64, len(text)):
+        feedback, patches = _feed_all(DiagramResponseParser(), text, step)
+        assert feedback == expected_feedback
+        assert patches["issues"] == RESPONSE["issues"]
+        assert patches["elements_to_create"] == RESPONSE["elements_to_create"]
+        assert patches["elements_to_update"] == []
+
+
+def test_unicode_escapes_decode_across_chunks():
+    text = json.dumps({"feedback": "café — ok"}, ensure_ascii=True)
+    feedback, _ = _feed_all(DiagramResponseParser(), text, 1)
+    assert feedback == "café — ok"
+
+
+def test_patch_is_returned_when_its_closing_brace_arrives():
+    parser = DiagramResponseParser()
+    text = json.dumps({"feedback": "", "issues": [{"id": "n1"}, {"id": "n2"}]})
+    first_close = text.index("}") + 1
+    _, patches = parser.feed(text[: first_close - 1])
+    assert patches["issues"] == []
+    _, patches = parser.feed(text[first_close - 1: first_close])
+    assert patches["issues"] == [{"id": "n1"}]
+    _, patches = parser.feed(text[first_close:])
+    assert patches["issues"] == [{"id": "n2"}]
+
+
+def test_sentences_split_on_terminal_punctuation():
+    splitter = SentenceSplitter()
+    assert splitter.feed("Good start. Your DB") == ["Good start."]
+    assert splitter.feed(' is a SPOF! Add "a replica." Then') == ["Your DB is a SPOF!", 'Add "a replica."']
+    assert splitter.feed(" scale v1.2 out") == []
+    assert splitter.flush() == ["Then scale v1.2 out"]
+    assert splitter.flush() == []
@@ -0,0 +1,105 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app import grading
+
+
+def _completion(content: dict):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(content)))],
+        usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10),
+    )
+
+
+class FakeLLM:
+    """Stands in for chat_completion: scores criteria from a table, optionally failing the first attempts."""
+
+    def __init__(self, scores: dict, bad_attempts: int = 0):
+        self.scores = scores
+        self.bad_attempts = bad_attempts
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, purpose, messages, response_format, **kwargs):
+        with self._lock:
+            self.calls += 1
+            malformed = self.calls <= self.bad_attempts
+        if malformed:
+            return _completion({"unexpected": True})
+        if response_format["json_schema"]["name"] == "interview_summary":
+            return _completion({"summary": "A summary."})
+        task = messages[-1]["content"]
+        name = next(name for name in self.scores if name in task)
+        return _completion({"score": self.scores[name], "reasoning": "because", "evidence": []})
+
+
+def _scores(interview_type: str, values: tuple) -> dict:
+    criteria = grading.parse_rubric_criteria(grading._rubric_for(interview_type))
+    return {c["name"]: value for c, value in zip(criteria, values)}
+
+
+def test_rubric_weights_sum_to_one():
+    for interview_type in ("phone_screen", "system_design"):
+        criteria = grading.parse_rubric_criteria(grading._rubric_for(interview_type))
+        assert criteria
+        assert sum(c["weight"] for c in criteria) == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("values, expected", [
+    ((2, 2, 3, 3, 3), 3),  # weighted 2.5
+    ((1, 3, 3, 3, 1), 3),  # weighted 2.4999999999999996
+    ((0, 1, 0, 1, 0), 1),  # weighted 0.5
+    ((0, 0, 0, 0, 0), 0),
+    ((3, 3, 3, 3, 3), 3),
+])
+def test_weighted_score_rounds_half_up(monkeypatch, values, expected):
+    monkeypatch.setattr(grading, "chat_completion", FakeLLM(_scores("system_design", values)))
+    result = grading._grade_per_criterion("Agent: hi\nUser: hello", "system_design", None)
+    assert result["score"] == expected
+
+
+def test_per_criterion_runs_every_call_at_once_by_default(monkeypatch):
+    pools = []
+
+    class RecordingPool(grading.ThreadPoolExecutor):
+        def __init__(self, max_workers):
+            pools.append(max_workers)
+            super().__init__(max_workers=max_workers)
+
+    monkeypatch.setattr(grading, "ThreadPoolExecutor", RecordingPool)
+    monkeypatch.setattr(grading, "chat_completion", FakeLLM(_scores("system_design", (1,) * 5)))
+    result = grading._grade_per_criterion("Agent: hi", "system_design", None)
+    assert pools == [6]
+    assert result["grading_stats"]["max_workers"] == 6
+
+
+def test_llm_calls_count_retries(monkeypatch):
+    monkeypatch.setattr(grading, "GRADING_CRITERION_RETRIES", 2)
+    llm = FakeLLM(_scores("phone_screen", (2, 2, 2, 2)), bad_attempts=2)
+    monkeypatch.setattr(grading, "chat_completion", llm)
+    result = grading._grade_per_criterion("Agent: hi", "phone_screen", None)
+    assert result["grading_stats"]["llm_calls"] == llm.calls == 4 + 1 + 2
+    assert result["grading_stats"]["prompt_tokens"] == 100 * llm.calls
+
+
+def test_failed_criterion_is_dropped_and_counted(monkeypatch):
+    monkeypatch.setattr(grading, "GRADING_CRITERION_RETRIES", 1)
+    scores = _scores("phone_screen", (3, 3, 3, 3))
+    failing = next(iter(scores))
+    llm = FakeLLM(scores)
+
+    def completion(purpose, messages, response_format, **kwargs):
+        if failing in messages[-1]["content"]:
+            with llm._lock:
+                llm.calls += 1
+            return _completion({})
+        return llm(purpose, messages, response_format, **kwargs)
+
+    monkeypatch.setattr(grading, "chat_completion", completion)
+    result = grading._grade_per_criterion("Agent: hi", "phone_screen", None)
+    assert result["failed_criteria"] == [failing]
+    assert result["score"] == 3
+    assert result["grading_stats"]["llm_calls"] == llm.calls == 3 + 1 + 2
@@ -0,0 +1,169 @@
+import asyncio
+
+import openai
+import pytest
+
+from app import llm_gateway
+from app.llm_endpoints import CLOSED, HALF_OPEN, OPEN, EndpointPool, LLMEndpoint
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def pair(stub_llm, monkeypatch):
+    """Primary and fallback stub endpoints behind a pool with a hand-driven clock."""
+    primary, fallback = stub_llm(), stub_llm()
+    clock = FakeClock()
+    pool = EndpointPool(
+        [
+            LLMEndpoint("primary", primary.base_url, api_key="test", max_retries=0, timeout_s=5),
+            LLMEndpoint("fallback", fallback.base_url, api_key="test", max_retries=0, timeout_s=5),
+        ],
+        failure_threshold=3,
+        cooldown_s=30,
+        # Route by configured order alone, so only the breaker moves traffic off the primary
+        score_margin=1.0,
+        first_token_timeout_s=0.3,
+        clock=clock,
+    )
+    monkeypatch.setattr(llm_gateway, "get_llm_pool", lambda: pool)
+    llm_gateway.reset_usage()
+    yield primary, fallback, pool, clock
+    llm_gateway.reset_usage()
+
+
+def _complete():
+    completion = llm_gateway.chat_completion(llm_gateway.PURPOSE_GRADING, model="stub-model", messages=MESSAGES)
+    return completion.choices[0].message.content
+
+
+async def _drain(purpose: str) -> str:
+    stream = llm_gateway.stream_chat_completion(purpose, model="stub-model", messages=MESSAGES)
+    return "".join([chunk.choices[0].delta.content or "" async for chunk in stream])
+
+
+def _state(pool: EndpointPool, name: str) -> str:
+    return next(e["state"] for e in pool.status()["endpoints"] if e["name"] == name)
+
+
+def test_breaker_trips_after_consecutive_failures(pair):
+    primary, fallback, pool, _ = pair
+    primary.status = 503
+    for _ in range(3):
+        assert _complete() == "Hello there"
+    assert primary.requests == 3
+    assert _state(pool, "primary") == OPEN
+
+    # Open: new requests skip the primary entirely
+    for _ in range(3):
+        assert _complete() == "Hello there"
+    assert primary.requests == 3
+    assert fallback.requests == 6
+
+
+def test_half_open_probe_recovers(pair):
+    primary, fallback, pool, clock = pair
+    primary.status = 503
+    for _ in range(3):
+        _complete()
+    assert _state(pool, "primary") == OPEN
+
+    clock.now += 31
+    assert _state(pool, "primary") == HALF_OPEN
+    primary.status = 200
+    assert _complete() == "Hello there"
+    assert primary.requests == 4
+    assert _state(pool, "primary") == CLOSED
+
+    # Closed again with a clean record: traffic is back on the primary
+    fallback_before = fallback.requests
+    for _ in range(3):
+        _complete()
+    assert primary.requests == 7
+    assert fallback.requests == fallback_before
+
+
+def test_failed_probe_reopens(pair):
+    primary, fallback, pool, clock = pair
+    primary.status = 503
+    for _ in range(3):
+        _complete()
+
+    clock.now += 31
+    assert _complete() == "Hello there"  # probe fails, request moves to the fallback
+    assert primary.requests == 4
+    assert _state(pool, "primary") == OPEN
+    assert pool.status()["endpoints"][0]["trips"] == 2  # the reopen counts as a trip
+
+    # The cooldown restarted from the failed probe
+    clock.now += 10
+    _complete()
+    assert primary.requests == 4
+
+
+@pytest.mark.parametrize("status", [401, 403, 408, 409, 429, 500, 502, 503])
+def test_failover_status_codes(pair, status):
+    primary, fallback, _, _ = pair
+    primary.status = status
+    assert _complete() == "Hello there"
+    assert (primary.requests, fallback.requests) == (1, 1)
+
+
+@pytest.mark.parametrize("status", [400, 404, 422])
+def test_request_errors_are_not_failed_over(pair, status):
+    primary, fallback, pool, _ = pair
+    primary.status = status
+    with pytest.raises(openai.APIStatusError):
+        _complete()
+    assert (primary.requests, fallback.requests) == (1, 0)
+    # The endpoint answered; a bad request says nothing about its health
+    assert pool.status()["endpoints"][0]["failures"] == 0
+
+
+def test_stream_fails_over_before_first_token(pair):
+    primary, fallback, _, _ = pair
+    primary.status = 503
+    assert asyncio.run(_drain(llm_gateway.PURPOSE_VOICE_TURN)) == "Hello there"
+    assert (primary.requests, fallback.requests) == (1, 1)
+
+
+def test_live_stream_first_token_timeout_fails_over(pair):
+    primary, fallback, _, _ = pair
+    primary.stall_before_s = 2
+    assert asyncio.run(_drain(llm_gateway.PURPOSE_VOICE_TURN)) == "Hello there"
+    assert (primary.requests, fallback.requests) == (1, 1)
+    assert llm_gateway.get_recent_calls(2)[0]["endpoint"] == "primary"
+
+
+def test_background_stream_waits_past_first_token_timeout(pair):
+    primary, fallback, _, _ = pair
+    primary.stall_before_s = 0.5
+    assert asyncio.run(_drain(llm_gateway.PURPOSE_GRADING)) == "Hello there"
+    assert (primary.requests, fallback.requests) == (1, 0)
+
+
+def test_no_failover_after_first_token(pair):
+    primary, fallback, _, _ = pair
+
+    async def scenario():
+        # A stall after the first token is past the timeout but must be waited out
+        primary.stall_after_first_s = 0.5
+        assert await _drain(llm_gateway.PURPOSE_VOICE_TURN) == "Hello there"
+
+        # A stream dropped mid-answer can't be replayed elsewhere without repeating the first token
+        primary.stall_after_first_s = 0
+        primary.drop_after_first = True
+        with pytest.raises(Exception):
+            await _drain(llm_gateway.PURPOSE_VOICE_TURN)
+
+    # One event loop: the endpoint's async client keeps its connections across both streams
+    asyncio.run(scenario())
+    assert (primary.requests, fallback.requests) == (2, 0)
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from app import llm_gateway
+from app.llm_endpoints import EndpointPool, LLMEndpoint
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture
+def endpoint(stub_llm, monkeypatch):
+    stub = stub_llm()
+    pool = EndpointPool([LLMEndpoint("stub", stub.base_url, api_key="test", max_retries=0, timeout_s=5)])
+    monkeypatch.setattr(llm_gateway, "get_llm_pool", lambda: pool)
+    llm_gateway.reset_usage()
+    yield stub
+    llm_gateway.reset_usage()
+
+
+async def _drain(purpose: str):
+    return [chunk async for chunk in llm_gateway.stream_chat_completion(purpose, model="stub-model", messages=MESSAGES)]
+
+
+def _summary_for(purpose: str) -> dict:
+    return next(row for row in llm_gateway.get_usage_summary()["by_purpose"] if row["purpose"] == purpose)
+
+
+def test_blocking_call_has_no_ttft(endpoint):
+    completion = llm_gateway.chat_completion(llm_gateway.PURPOSE_GRADING, model="stub-model", messages=MESSAGES)
+    assert completion.choices[0].message.content == "Hello there"
+
+    record = llm_gateway.get_recent_calls(1)[0]
+    assert record["ttft_s"] is None
+    assert record["latency_s"] > 0
+    assert record["prompt_tokens"] == 10
+    assert _summary_for(llm_gateway.PURPOSE_GRADING)["ttft_s_p50"] is None
+    assert 'llm_ttft_seconds{purpose="grading"' not in llm_gateway.render_prometheus()
+
+
+def test_streaming_call_records_ttft(endpoint):
+    endpoint.stall_after_first_s = 0.2
+    chunks = asyncio.run(_drain(llm_gateway.PURPOSE_VOICE_TURN))
+    assert "".join(c.choices[0].delta.content or "" for c in chunks) == "Hello there"
+
+    record = llm_gateway.get_recent_calls(1)[0]
+    assert record["ttft_s"] is not None
+    assert record["ttft_s"] < 0.2 <= record["latency_s"]
+    assert record["completion_tokens"] == 2
+    assert _summary_for(llm_gateway.PURPOSE_VOICE_TURN)["ttft_s_p50"] == record["ttft_s"]
@@ -0,0 +1,104 @@
+import json
+
+import pyarrow.dataset as ds
+import pytest
+
+from app.parquet_export import ParquetExporter
+
+DAY_MS = 1765100000000  # 2025-12-07
+
+
+def _save_call(directory, call_id: str, turns: int = 2):
+    directory.mkdir(exist_ok=True)
+    record = {
+        "call_id": call_id,
+        "retell_api_data": {
+            "call_id": call_id,
+            "call_status": "ended",
+            "start_timestamp": DAY_MS,
+            "transcript_object": [{"role": "agent", "content": f"turn {i}"} for i in range(turns)],
+        },
+    }
+    (directory / f"{call_id}.json").write_text(json.dumps(record))
+
+
+def _call_ids(out) -> list:
+    table = ds.dataset(out / "calls", format="parquet", partitioning="hive").to_table(columns=["call_id"])
+    return sorted(table.column("call_id").to_pylist())
+
+
+@pytest.fixture
+def export(tmp_path):
+    calls = tmp_path / "call_data"
+    out = tmp_path / "exports"
+
+    def exporter():
+        return ParquetExporter(out, {"call_data": calls})
+
+    return calls, out, exporter
+
+
+def test_runs_are_incremental(export):
+    calls, out, exporter = export
+    _save_call(calls, "call_a")
+    assert exporter().run()["files"] == 1
+    again = exporter().run()
+    assert again["run_id"] is None
+    assert again["files"] == 0
+
+    _save_call(calls, "call_b")
+    result = exporter().run()
+    assert result["files"] == 1
+    assert result["rows"]["utterances"] == 2
+    assert _call_ids(out) == ["call_a", "call_b"]
+    assert len(list((out / "calls" / "date=2025-12-07").glob("part-*.parquet"))) == 2
+
+
+def test_compact_merges_parts(export):
+    calls, out, exporter = export
+    for call_id in ("call_a", "call_b", "call_c"):
+        _save_call(calls, call_id)
+        exporter().run()
+
+    assert exporter().compact() == 2  # calls and utterances
+    assert len(list((out / "calls" / "date=2025-12-07").glob("part-*.parquet"))) == 1
+    assert _call_ids(out) == ["call_a", "call_b", "call_c"]
+    assert exporter().compact() == 0
+
+
+def test_compaction_interrupted_before_its_state_is_saved(export, monkeypatch):
+    calls, out, exporter = export
+    for call_id in ("call_a", "call_b"):
+        _save_call(calls, call_id)
+        exporter().run()
+
+    def crash(state):
+        raise KeyboardInterrupt
+
+    crashing = exporter()
+    monkeypatch.setattr(crashing, "_save_state", crash)
+    with pytest.raises(KeyboardInterrupt):
+        crashing.compact()
+
+    # The merged file is an orphan: the next run drops it and keeps the original parts
+    exporter().run()
+    assert _call_ids(out) == ["call_a", "call_b"]
+
+
+def test_compaction_interrupted_before_old_parts_are_deleted(export, monkeypatch):
+    calls, out, exporter = export
+    for call_id in ("call_a", "call_b"):
+        _save_call(calls, call_id)
+        exporter().run()
+
+    crashing = exporter()
+    monkeypatch.setattr(crashing, "_finish_compaction", lambda state: None)
+    crashing.compact()
+    assert json.loads((out / "_export_state.json").read_text())["superseded"]
+
+    # The next run deletes the merged-away parts, never the merged file
+    _save_call(calls, "call_c")
+    exporter().run()
+    assert _call_ids(out) == ["call_a", "call_b", "call_c"]
+    assert len(list((out / "calls" / "date=2025-12-07").glob("part-*.parquet"))) == 2
+    assert "superseded" not in json.loads((out / "_export_state.json").read_text())
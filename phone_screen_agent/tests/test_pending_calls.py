@@ -0,0 +1,94 @@
+import json
+import os
+import time
+
+from app.pending_calls import PendingCallStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _record(call_id: str, padding: int = 0) -> dict:
+    return {"call_ended_webhook": {"call_id": call_id, "transcript": "x" * padding}}
+
+
+def test_pop_from_memory_once(tmp_path):
+    store = PendingCallStore(tmp_path / "spill")
+    store.put("call_a", _record("call_a"))
+    assert store.pop("call_a") == _record("call_a")
+    assert store.pop("call_a") is None
+    status = store.status()
+    assert (status["merged_from_memory"], status["missed"], status["bytes"]) == (1, 1, 0)
+
+
+def test_capacity_evicts_oldest_to_disk(tmp_path):
+    store = PendingCallStore(tmp_path / "spill", max_entries=2)
+    for call_id in ("call_a", "call_b", "call_c"):
+        store.put(call_id, _record(call_id))
+    status = store.status()
+    assert (status["entries"], status["spilled_entries"], status["evicted_capacity"]) == (2, 1, 1)
+
+    # A late call_analyzed still finds its call_ended
+    assert store.pop("call_a") == _record("call_a")
+    assert store.status()["merged_from_disk"] == 1
+    assert store.status()["spilled_entries"] == 0
+
+
+def test_byte_budget_and_oversized_records(tmp_path):
+    store = PendingCallStore(tmp_path / "spill", max_bytes=500)
+    store.put("call_a", _record("call_a", 200))
+    store.put("call_b", _record("call_b", 200))
+    assert store.status()["entries"] == 1
+    assert store.status()["bytes"] <= 500
+
+    store.put("call_big", _record("call_big", 1000))
+    assert store.status()["entries"] == 1  # call_b stays; the big one goes straight to disk
+    assert store.pop("call_big") == _record("call_big", 1000)
+    assert store.pop("call_b") == _record("call_b", 200)
+
+
+def test_ttl_evicts_on_next_access(tmp_path):
+    clock = FakeClock()
+    store = PendingCallStore(tmp_path / "spill", ttl_s=60, clock=clock)
+    store.put("call_a", _record("call_a"))
+    clock.now += 61
+    assert store.status()["entries"] == 0
+    assert store.status()["evicted_ttl"] == 1
+    assert store.pop("call_a") == _record("call_a")
+
+
+def test_replacing_a_record_keeps_the_byte_count(tmp_path):
+    store = PendingCallStore(tmp_path / "spill")
+    store.put("call_a", _record("call_a", 100))
+    store.put("call_a", _record("call_a", 10))
+    status = store.status()
+    assert status["entries"] == 1
+    assert status["bytes"] == len(json.dumps(_record("call_a", 10)))
+
+
+def test_old_spill_files_are_pruned(tmp_path):
+    clock = FakeClock()
+    clock.now = time.time()  # compared against real file mtimes
+    store = PendingCallStore(tmp_path / "spill", max_entries=1, spill_ttl_s=3600, clock=clock)
+    store.put("call_a", _record("call_a"))
+    store.put("call_b", _record("call_b"))
+    spilled = tmp_path / "spill" / "call_a.json"
+    assert spilled.exists()
+
+    os.utime(spilled, (clock.now - 7200, clock.now - 7200))
+    clock.now += 120
+    store.put("call_c", _record("call_c"))
+    assert not spilled.exists()
+    assert store.pop("call_a") is None
+
+
+def test_unsafe_call_ids_stay_inside_the_spill_dir(tmp_path):
+    store = PendingCallStore(tmp_path / "spill", max_entries=0)
+    store.put("../escape", _record("../escape"))
+    assert [p.name for p in (tmp_path / "spill").iterdir()] == [".._escape.json"]
+    assert store.pop("../escape") == _record("../escape")
@@ -0,0 +1,114 @@
+from app.label_placement import element_box, text_box_size
+from app.scene_graph import SEVERITY_COLORS, compile_scene, resolve_llm_patches
+from benchmarks.diagram_fixtures import SceneBuilder, three_tier
+
+
+def _el(el_id: str, el_type: str, x: float, y: float, w: float = 100, h: float = 60, **fields) -> dict:
+    return {"id": el_id, "type": el_type, "x": x, "y": y, "width": w, "height": h, **fields}
+
+
+def _overlaps(a, b) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _label_box(label: dict):
+    width, height = text_box_size(label["text"], label["fontSize"])
+    return label["x"], label["y"], label["x"] + width, label["y"] + height
+
+
+def test_three_tier_graph():
+    scene = compile_scene(three_tier())
+    assert [(n["ref"], n["label"]) for n in scene.nodes] == [
+        ("n1", "Load Balancer"), ("n2", "App Server"), ("n3", "Database"),
+    ]
+    assert [(e["from"], e["to"], e["label"]) for e in scene.edges] == [("n1", "n2", "HTTP"), ("n2", "n3", "SQL")]
+    prompt = scene.to_prompt()
+    assert 'n3: ellipse "Database"' in prompt
+    assert 'e2: n2 -> n3 "SQL"' in prompt
+
+
+def test_labels_from_overlapping_and_free_text():
+    elements = [
+        _el("box", "rectangle", 0, 0, 200, 100),
+        _el("over", "text", 50, 30, 80, 20, text="  API\n Gateway "),
+        _el("free", "text", 600, 0, 60, 20, text="Redis"),
+        _el("blank", "text", 600, 300, 60, 20, text="   "),
+        _el("gone", "rectangle", 0, 400, isDeleted=True),
+    ]
+    scene = compile_scene(elements)
+    assert [(n["kind"], n["label"]) for n in scene.nodes] == [("rectangle", "API Gateway"), ("text", "Redis")]
+    assert "gone" not in scene.id_to_ref
+
+
+def test_unbound_arrows_snap_to_nearby_shapes():
+    elements = [
+        _el("a", "rectangle", 0, 0),
+        _el("b", "rectangle", 0, 300),
+        # Ends 20px short of both boxes
+        _el("arrow", "arrow", 50, 80, 0, 200, points=[[0, 0], [0, 200]]),
+        # Nowhere near anything
+        _el("stray", "arrow", 900, 900, 50, 0, points=[[0, 0], [50, 0]]),
+    ]
+    scene = compile_scene(elements)
+    assert [(e["ref"], e["from"], e["to"]) for e in scene.edges] == [("e1", "n1", "n2")]
+
+
+def test_excluded_elements_stay_on_the_canvas():
+    elements = three_tier()
+    label = _el("ours", "text", 500, 0, 80, 20, text="SPOF")
+    scene = compile_scene(elements + [label], exclude_ids={"ours"})
+    assert "ours" not in scene.id_to_ref
+    assert label in scene.canvas_elements
+
+
+def test_issues_highlight_once_and_place_labels_clear_of_the_scene():
+    elements = three_tier()
+    scene = compile_scene(elements)
+    db_id = scene.ref_to_id["n3"]
+    updates, creates = resolve_llm_patches({"issues": [
+        {"id": "n3", "label": "Single DB", "severity": "critical"},
+        {"id": "n3", "label": "No replica", "severity": "minor"},
+        {"id": "n9", "label": "Nowhere", "severity": "minor"},
+    ]}, scene)
+
+    stroke, background = SEVERITY_COLORS["critical"]
+    assert updates == [{"id": db_id, "strokeColor": stroke, "backgroundColor": background}]
+    assert [c["text"] for c in creates] == ["Single DB", "No replica"]
+    first, second = (_label_box(c) for c in creates)
+    assert not _overlaps(first, second)
+    shapes = [element_box(el) for el in elements if el["type"] in ("rectangle", "ellipse")]
+    assert not any(_overlaps(label, shape) for label in (first, second) for shape in shapes)
+
+
+def test_explicit_patches_accept_refs_and_element_ids():
+    scene = compile_scene(three_tier())
+    app_id = scene.ref_to_id["n2"]
+    updates, creates = resolve_llm_patches({
+        "elements_to_update": [{"id": "n1", "strokeColor": "#00f"}, {"id": app_id, "strokeWidth": 4}, {"id": "zz"}],
+        "elements_to_create": [
+            {"x": 10, "y": 20, "text": "Note"},
+            {"near": "n2", "text": "Scale out", "strokeColor": "#f80"},
+            {"near": "n2"},
+        ],
+    }, scene)
+    assert updates == [
+        {"id": scene.ref_to_id["n1"], "strokeColor": "#00f"},
+        {"id": app_id, "strokeWidth": 4},
+    ]
+    assert creates[0] == {"type": "text", "x": 10, "y": 20, "text": "Note", "fontSize": 20, "strokeColor": "#ff0000"}
+    assert creates[1]["text"] == "Scale out"
+    assert creates[1]["strokeColor"] == "#f80"
+    assert len(creates) == 2
+
+
+def test_label_already_next_to_its_target_is_not_repeated():
+    b = SceneBuilder(3)
+    db = b.box("Database", 0, 0)
+    scene = compile_scene(b.elements)
+    _, creates = resolve_llm_patches({"issues": [{"id": "n1", "label": "SPOF", "severity": "critical"}]}, scene)
+    label = {**creates[0], "id": "label"}
+
+    again = compile_scene(b.elements + [label], exclude_ids={"label"})
+    updates, creates = resolve_llm_patches({"issues": [{"id": "n1", "label": "SPOF", "severity": "critical"}]}, again)
+    assert updates[0]["id"] == db["id"]
+    assert creates == []
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from app.stats import percentile, percentile_rank
+
+
+@pytest.mark.parametrize("count", [1, 2, 7, 20, 100, 101])
+def test_matches_numpy_inverted_cdf(count):
+    values = list(np.random.default_rng(count).uniform(0, 1000, count))
+    for pct in (0, 1, 50, 90, 95, 99, 100):
+        assert percentile(values, pct) == np.percentile(values, pct, method="inverted_cdf")
+
+
+def test_ranks_and_edges():
+    assert percentile_rank(100, 7) == 7  # 7 / 100 * 100 would round up to rank 8
+    assert (percentile_rank(4, 0), percentile_rank(4, 50), percentile_rank(4, 100)) == (1, 2, 4)
+    assert percentile([], 50) is None
+    assert percentile([3.14159, 1.0], 99, ndigits=2) == 3.14
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Batch Sourcing
+Runs grok.run_query over a file of role/profile queries with bounded concurrency and a
+request-rate limit, streaming one JSON line per finished query to the output file.
+
+The output file doubles as the checkpoint: on restart, queries already recorded as "ok" are
+skipped and everything else (failed or never reached) is run again.
+
+Query file: one query per line, or JSON lines with a "query" field (optional "id"; any other
+fields are carried into the result as "meta"). Blank lines and lines starting with # are ignored.
+
+Usage:
+    python batch.py queries.txt -o results.jsonl --concurrency 8 --rpm 120
+
+Results come from the sourcing result cache when fresh (see result_cache.py); --swr also serves
+expired ones immediately and refreshes them in the background, --no-cache always re-runs.
+
+People found are added to the candidate index (see candidate_index.py) as results stream in,
+and a query about someone already in the index is skipped instead of researched again.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+from candidate_index import CandidateIndex, query_candidate
+from result_cache import normalize_prompt
+
+# Seconds to wait before retry n (1-based) of a failed query
+RETRY_BACKOFF_S = (2, 5, 15)
+
+
+def query_id(query: str) -> str:
+    return hashlib.sha1(normalize_prompt(query).encode()).hexdigest()[:12]
+
+
+def load_queries(path: Path) -> List[dict]:
+    queries = []
+    seen = set()
+    for line in Path(path).read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            item = json.loads(line)
+            text = item.pop("query")
+            entry = {"id": str(item.pop("id", None) or query_id(text)), "query": text}
+            if item:
+                entry["meta"] = item
+        else:
+            entry = {"id": query_id(line), "query": line}
+        if entry["id"] in seen:
+            continue
+        seen.add(entry["id"])
+        queries.append(entry)
+    return queries
+
+
+def completed_ids(output_path: Path) -> Set[str]:
+    """Ids already finished successfully in an earlier (possibly interrupted) run."""
+    done = set()
+    if not Path(output_path).exists():
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+class RateLimiter:
+    """Spaces request starts evenly so the API sees at most `per_minute` requests a minute."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        run: Callable[[str, Callable[[], None]], dict],
+        output_path: Path,
+        concurrency: int = 4,
+        requests_per_minute: float = 60,
+        retries: int = 2,
+        index: Optional[CandidateIndex] = None,
+    ):
+        # run(query, throttle) -> result dict; it calls throttle() right before each upstream
+        # request, so answers served from the cache don't use up the rate limit
+        self.run = run
+        self.output_path = Path(output_path)
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(requests_per_minute)
+        self.retries = retries
+        self.index = index
+        self._write_lock = threading.Lock()
+
+    def _write(self, record: dict):
+        line = json.dumps(record, default=str)
+        with self._write_lock:
+            with open(self.output_path, "a") as f:
+                f.write(line + "\n")
+
+    def _run_one(self, entry: dict) -> dict:
+        base = {"id": entry["id"], "query": entry["query"]}
+        if "meta" in entry:
+            base["meta"] = entry["meta"]
+        person = query_candidate(entry) if self.index is not None else None
+        known = self.index.find(person) if person else None
+        if known:
+            record = dict(base, status="ok", attempts=0, known_candidate=known)
+            record["completed_at"] = datetime.utcnow().isoformat()
+            self._write(record)
+            return record
+        for attempt in range(1, self.retries + 2):
+            # Built afresh each attempt so nothing from a failed one (its error) outlives it
+            try:
+                result = self.run(entry["query"], self.limiter.wait)
+                record = dict(base, status="ok", attempts=attempt, **result)
+                if self.index is not None:
+                    record["candidates"] = self.index.add_result(result, source=entry["id"])
+                break
+            except Exception as e:
+                record = dict(base, status="error", attempts=attempt, error=f"{type(e).__name__}: {e}")
+                if attempt <= self.retries:
+                    time.sleep(RETRY_BACKOFF_S[min(attempt, len(RETRY_BACKOFF_S)) - 1])
+        record["completed_at"] = datetime.utcnow().isoformat()
+        self._write(record)
+        return record
+
+    def run_all(self, queries: List[dict]) -> Dict[str, object]:
+        done = completed_ids(self.output_path)
+        pending = [entry for entry in queries if entry["id"] not in done]
+        skipped = len(queries) - len(pending)
+        if skipped:
+            print(f"Resuming: {skipped} of {len(queries)} queries already done")
+        if self.output_path.exists() and self.output_path.stat().st_size:
+            with open(self.output_path, "rb+") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")  # don't glue new records onto a line cut short by a crash
+
+        started = time.perf_counter()
+        ok = failed = cached = known = new_candidates = duplicate_candidates = 0
+        cost = 0.0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = [pool.submit(self._run_one, entry) for entry in pending]
+            for n, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                if record["status"] == "ok":
+                    ok += 1
+                    if record.get("known_candidate"):
+                        known += 1
+                        print(f"[{n}/{len(pending)}] skipped {record['id']}: already indexed as {record['known_candidate']}")
+                        continue
+                    found = record.get("candidates", [])
+                    new_candidates += sum(1 for c in found if c["new"])
+                    duplicate_candidates += sum(1 for c in found if not c["new"])
+                    if record.get("cache") in ("hit", "stale"):
+                        cached += 1
+                        print(f"[{n}/{len(pending)}] ok {record['id']} (cache {record['cache']})")
+                        continue
+                    cost += record.get("cost_usd") or 0.0
+                    print(f"[{n}/{len(pending)}] ok {record['id']} ({record.get('latency_s')}s, {len(record.get('citations', []))} citations)")
+                else:
+                    failed += 1
+                    print(f"[{n}/{len(pending)}] FAILED {record['id']}: {record['error']}")
+
+        elapsed = time.perf_counter() - started
+        return {
+            "queries": len(queries),
+            "skipped": skipped,
+            "ok": ok,
+            "failed": failed,
+            "from_cache": cached,
+            "known_candidates_skipped": known,
+            "new_candidates": new_candidates,
+            "duplicate_candidates": duplicate_candidates,
+            "cost_usd": round(cost, 4),
+            "elapsed_s": round(elapsed, 1),
+            "queries_per_minute": round(len(pending) / elapsed * 60, 1) if pending and elapsed else None,
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run sourcing queries in batch")
+    parser.add_argument("queries", type=Path, help="Query file (text or JSON lines)")
+    parser.add_argument("-o", "--output", type=Path, default=Path("sourcing_results.jsonl"))
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("SOURCING_CONCURRENCY", "4")))
+    parser.add_argument(
+        "--rpm", type=float, default=float(os.getenv("SOURCING_REQUESTS_PER_MINUTE", "60")),
+        help="Max requests started per minute (0 = unlimited)",
+    )
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--no-cache", action="store_true", help="Always re-run queries")
+    parser.add_argument("--swr", action="store_true", help="Serve stale cached results while refreshing them")
+    parser.add_argument(
+        "--index", type=Path,
+        default=Path(os.getenv("SOURCING_CANDIDATE_INDEX", Path(__file__).resolve().parent / "candidates.jsonl")),
+        help="Candidate index file",
+    )
+    parser.add_argument("--no-index", action="store_true", help="Don't dedupe or skip known candidates")
+    parser.add_argument(
+        "--usage-log", type=Path, default=None,
+        help="Append each call's token usage and cost here (default: SOURCING_USAGE_LOG or llm_usage.jsonl)",
+    )
+    args = parser.parse_args(argv)
+
+    from grok import MODEL, SOURCING_INSTRUCTIONS, TOOLS, get_client, run_query
+    from result_cache import get_sourcing_cache
+    from usage_log import usage_log_path
+
+    client = get_client()
+    model = args.model or MODEL
+    usage_log = args.usage_log or usage_log_path()
+    queries = load_queries(args.queries)
+    print(f"Running {len(queries)} queries on {model} (concurrency {args.concurrency}, {args.rpm} rpm)")
+
+    cache = None if args.no_cache else get_sourcing_cache()
+
+    def run(query, throttle):
+        def fetch():
+            throttle()
+            return run_query(client, query, model=model, usage_log=usage_log)
+
+        if cache is None:
+            return fetch()
+        return cache.get_or_run(query, model, TOOLS, fetch, stale_while_revalidate=args.swr, system=SOURCING_INSTRUCTIONS)
+
+    runner = BatchRunner(
+        run,
+        args.output,
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        retries=args.retries,
+        index=None if args.no_index else CandidateIndex(args.index),
+    )
+    summary = runner.run_all(queries)
+    if cache:
+        cache.close()
+        summary["cache"] = cache.stats()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Candidate Index
+Local index of every person sourcing has turned up, so the same candidate found under another
+spelling, handle or profile URL is recognized instead of researched again.
+
+Each candidate becomes a set of features:
+- name:   character trigrams of the normalized name (accents, case, punctuation and word order folded)
+- handle: normalized handles (@jdoe, x.com/jdoe and github.com/jdoe all give "jdoe")
+- emp:    employer words, minus legal suffixes
+- url:    canonical profile URLs (scheme, www, query and trailing slash dropped; twitter.com -> x.com)
+
+Lookups are sub-linear: a shared handle or profile URL matches through an exact map, and
+everything else goes through MinHash signatures bucketed by LSH bands. Only candidates sharing
+a bucket are compared, by exact Jaccard similarity of their features.
+
+The index is an append-only JSON-lines file (one line per added or updated candidate; the last
+line for an id wins), rebuilt in memory on load.
+
+Usage:
+    python candidate_index.py results.jsonl     # index an existing batch output
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+NUM_PERM = 120
+BANDS = 40
+ROWS = NUM_PERM // BANDS
+# Feature-set Jaccard at or above which two candidates are the same person
+MATCH_THRESHOLD = 0.5
+# Handles shorter than this are too ambiguous to match on their own
+MIN_STRONG_HANDLE = 4
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_EMPLOYER_STOPWORDS = {"inc", "llc", "ltd", "corp", "corporation", "co", "company", "the", "gmbh", "plc", "labs"}
+_PROFILE_HOSTS = {"x.com", "linkedin.com", "github.com"}
+_URL_IN_TEXT = re.compile(r"https?://[^\s)\]>\"']+")
+_CANDIDATES_BLOCK = re.compile(r"```(?:json)?\s*(\{.*?\"candidates\".*?\})\s*```", re.S)
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r"[^a-z0-9 ]+", " ", text.lower())
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(sorted(_fold(name).split()))
+
+
+def normalize_handle(handle: str) -> str:
+    return handle.strip().lstrip("@").lower()
+
+
+def canonical_url(url: str) -> Optional[str]:
+    parts = urlsplit(url.strip() if "://" in url else "https://" + url.strip())
+    host = parts.netloc.lower().split(":")[0]
+    if host.startswith("www."):
+        host = host[4:]
+    if host in ("twitter.com", "mobile.twitter.com"):
+        host = "x.com"
+    if not host:
+        return None
+    path = parts.path.rstrip("/")
+    return f"{host}{path}".lower() if host in _PROFILE_HOSTS else f"{host}{path}"
+
+
+def is_profile_url(canonical: str) -> bool:
+    host, _, path = canonical.partition("/")
+    if host in ("x.com", "github.com"):
+        return bool(path) and "/" not in path
+    return host == "linkedin.com" and path.startswith("in/") and path.count("/") == 1
+
+
+def handle_from_url(url: str) -> Optional[str]:
+    """The handle in an X or GitHub profile URL (single path segment), if it is one."""
+    canonical = canonical_url(url)
+    if not canonical:
+        return None
+    host, _, path = canonical.partition("/")
+    if host in ("x.com", "github.com") and path and "/" not in path:
+        return path
+    return None
+
+
+def candidate_features(candidate: dict) -> Set[str]:
+    features = set()
+    name = normalize_name(candidate.get("name") or "")
+    if name:
+        padded = f"  {name} "
+        features.update(f"name:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    handles = {normalize_handle(h) for h in candidate.get("handles", []) if h}
+    urls = {u for u in (canonical_url(url) for url in candidate.get("urls", []) if url) if u}
+    handles.update(h for h in (handle_from_url(url) for url in urls) if h)
+    features.update(f"handle:{h}" for h in handles if h)
+    features.update(f"url:{u}" for u in urls)
+    employer = candidate.get("employer") or ""
+    features.update(f"emp:{w}" for w in _fold(employer).split() if w not in _EMPLOYER_STOPWORDS)
+    return features
+
+
+def _strong_features(features: Iterable[str]) -> List[str]:
+    return [
+        f for f in features
+        if f.startswith("url:") or (f.startswith("handle:") and len(f) - len("handle:") >= MIN_STRONG_HANDLE)
+    ]
+
+
+def _identifying(features: Iterable[str]) -> bool:
+    """An employer alone doesn't identify anyone."""
+    return any(not f.startswith("emp:") for f in features)
+
+
+def _employers_conflict(a: Set[str], b: Set[str]) -> bool:
+    """Both list an employer and none match: same name, different people."""
+    emp_a = {f for f in a if f.startswith("emp:")}
+    emp_b = {f for f in b if f.startswith("emp:")}
+    return bool(emp_a and emp_b and not emp_a & emp_b)
+
+
+def minhash(features: Iterable[str]) -> List[int]:
+    hashes = [int.from_bytes(hashlib.blake2b(f.encode(), digest_size=8).digest(), "big") for f in features]
+    if not hashes:
+        return [_PRIME] * NUM_PERM
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def _bands(signature: List[int]) -> List[Tuple[int, ...]]:
+    return [(band, *signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def extract_candidates(result: dict) -> List[dict]:
+    """
+    People named in a sourcing result: the fenced {"candidates": [...]} block the sourcing prompt
+    asks for, or, if the model left it out, one candidate per X/GitHub/LinkedIn profile cited.
+    """
+    match = _CANDIDATES_BLOCK.search(result.get("content") or "")
+    if match:
+        try:
+            candidates = json.loads(match.group(1)).get("candidates", [])
+            return [c for c in candidates if isinstance(c, dict) and (c.get("name") or c.get("handles") or c.get("urls"))]
+        except ValueError:
+            pass
+    urls = list(result.get("citations", [])) + _URL_IN_TEXT.findall(result.get("content") or "")
+    profiles = {}
+    for url in urls:
+        canonical = canonical_url(url)
+        if canonical and is_profile_url(canonical):
+            profiles.setdefault(canonical, {"urls": [url]})
+    return list(profiles.values())
+
+
+class CandidateIndex:
+    def __init__(self, path: Optional[Path] = None, threshold: float = MATCH_THRESHOLD):
+        self.path = Path(path) if path else None
+        self.threshold = threshold
+        self.candidates: Dict[str, dict] = {}
+        self._features: Dict[str, Set[str]] = {}
+        self._buckets: Dict[Tuple[int, ...], Set[str]] = {}
+        self._strong: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if self.path and self.path.exists():
+            self._load()
+
+    def _load(self):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._index(record)
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def _index(self, record: dict):
+        cid = record["id"]
+        old = self._features.get(cid)
+        if old is not None:
+            for key in _bands(minhash(old)):
+                self._buckets.get(key, set()).discard(cid)
+        features = candidate_features(record)
+        self.candidates[cid] = record
+        self._features[cid] = features
+        for key in _bands(minhash(features)):
+            self._buckets.setdefault(key, set()).add(cid)
+        for feature in _strong_features(features):
+            self._strong.setdefault(feature, cid)
+
+    def _match(self, features: Set[str]) -> Tuple[Optional[str], float]:
+        for feature in _strong_features(features):
+            if feature in self._strong:
+                return self._strong[feature], 1.0
+        seen = set()
+        best, best_score = None, 0.0
+        for key in _bands(minhash(features)):
+            for cid in self._buckets.get(key, ()):
+                if cid in seen:
+                    continue
+                seen.add(cid)
+                if _employers_conflict(features, self._features[cid]):
+                    continue
+                score = jaccard(features, self._features[cid])
+                if score > best_score:
+                    best, best_score = cid, score
+        return (best, best_score) if best_score >= self.threshold else (None, best_score)
+
+    def find(self, candidate: dict) -> Optional[str]:
+        """Id of the indexed candidate this one is a near-duplicate of, if any."""
+        features = candidate_features(candidate)
+        if not _identifying(features):
+            return None
+        with self._lock:
+            return self._match(features)[0]
+
+    def add(self, candidate: dict, source: Optional[str] = None) -> Tuple[str, bool]:
+        """Index a candidate, merging it into its near-duplicate if there is one. Returns (id, is_new)."""
+        features = candidate_features(candidate)
+        if not _identifying(features):
+            raise ValueError("candidate has no name, handle or URL")
+        with self._lock:
+            cid, _ = self._match(features)
+            is_new = cid is None
+            if is_new:
+                cid = hashlib.sha1("\n".join(sorted(features)).encode()).hexdigest()[:12]
+                record = {"id": cid, "name": candidate.get("name"), "handles": [], "urls": [], "employer": None, "sources": []}
+            else:
+                record = dict(self.candidates[cid])
+            merged = self._merge(record, candidate, source)
+            if is_new or merged != self.candidates[cid]:
+                self._index(merged)
+                self._append(merged)
+            return cid, is_new
+
+    @staticmethod
+    def _merge(record: dict, candidate: dict, source: Optional[str]) -> dict:
+        merged = dict(record)
+        merged["name"] = record.get("name") or candidate.get("name")
+        merged["employer"] = record.get("employer") or candidate.get("employer")
+        merged["handles"] = sorted(set(record.get("handles", [])) | {normalize_handle(h) for h in candidate.get("handles", []) if h})
+        merged["urls"] = sorted(set(record.get("urls", [])) | {u for u in candidate.get("urls", []) if u})
+        if source and source not in record.get("sources", []):
+            merged["sources"] = record.get("sources", []) + [source]
+        return merged
+
+    def _append(self, record: dict):
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def add_result(self, result: dict, source: Optional[str] = None) -> List[dict]:
+        """Index every candidate in a sourcing result; returns [{"id", "new"}] per candidate."""
+        added = []
+        for candidate in extract_candidates(result):
+            try:
+                cid, is_new = self.add(candidate, source)
+            except ValueError:
+                continue
+            added.append({"id": cid, "new": is_new})
+        return added
+
+
+def query_candidate(entry: dict) -> Optional[dict]:
+    """
+    The person a query is about, if it names one: name/handle(s)/employer/url(s) fields of a
+    JSON-lines query, plus any @handles and profile URLs in the query text.
+    """
+    meta = entry.get("meta", {})
+    candidate = {
+        "name": meta.get("name"),
+        "employer": meta.get("employer"),
+        "handles": list(meta.get("handles", [])) + ([meta["handle"]] if meta.get("handle") else []),
+        "urls": list(meta.get("urls", [])) + ([meta["url"]] if meta.get("url") else []),
+    }
+    text = entry.get("query", "")
+    candidate["handles"] += re.findall(r"(?<![\w.])@(\w{2,})", text)
+    candidate["urls"] += _URL_IN_TEXT.findall(text)
+    return candidate if candidate["name"] or candidate["handles"] or candidate["urls"] else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index candidates from sourcing results")
+    parser.add_argument("results", type=Path, help="Batch output (JSON lines)")
+    parser.add_argument("--index", type=Path, default=Path(__file__).resolve().parent / "candidates.jsonl")
+    args = parser.parse_args()
+
+    index = CandidateIndex(args.index)
+    before = len(index)
+    seen = 0
+    with open(args.results) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "ok":
+                seen += len(index.add_result(record, source=record.get("id")))
+    print(f"{seen} candidates seen, {len(index) - before} new, {len(index)} in index")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,97 +1,198 @@
 #!/usr/bin/env python3
 """
 xAI Agentic Tool Calling Script
-Simple script to run an xAI agent with a hardcoded prompt
+Simple script to run an xAI agent with a hardcoded prompt. run_query() is the reusable core;
+batch.py runs it over a file of queries.
 """
 
 import os
+import time
+from pathlib import Path
+from typing import Optional
+
 from dotenv import load_dotenv
 from xai_sdk import Client
-from xai_sdk.chat import user
+from xai_sdk.chat import system, user
 from xai_sdk.tools import web_search, x_search, code_execution
 
+from result_cache import get_sourcing_cache
+from usage_log import record_usage, usage_log_path
+
 # Load environment variables from .env file
 load_dotenv()
 
-def main():
-    # Initialize the xAI client
+MODEL = "grok-4-1-fast"  # reasoning model
+
+# Static, so it stays a cached prefix across queries. The trailing JSON block lets
+# candidate_index.py recognize people already sourced.
+SOURCING_INSTRUCTIONS = """You are a technical sourcer researching engineering candidates with web and X search.
+Answer the query with specific, verifiable findings and cite your sources.
+If your answer names specific people, end it with a fenced JSON block listing each person once:
+```json
+{"candidates": [{"name": "...", "handles": ["..."], "employer": "...", "urls": ["<profile URLs>"]}]}
+```"""
+
+# Server-side tools available to sourcing runs; all are active by default
+TOOLS = {
+    "web_search": web_search,
+    "x_search": x_search,
+    "code_execution": code_execution,
+}
+
+
+def get_client() -> Client:
     api_key = os.getenv("XAI_API_KEY")
     if not api_key:
         raise ValueError("XAI_API_KEY environment variable is not set")
-
-    client = Client(api_key=api_key)
-
-    # Create a chat with agentic tools enabled
-    chat = client.chat.create(
-        model="grok-4-1-fast",  # reasoning model
-        # All server-side tools active
-        tools=[
-            web_search(),
-            x_search(),
-            code_execution(),
+    return Client(api_key=api_key)
+
+
+def run_query(client: Client, prompt: str, model: str = MODEL, tools=tuple(TOOLS), on_chunk=None,
+              usage_log: Optional[Path] = None) -> dict:
+    """
+    Run one agentic chat with the given server-side tools to completion and return its content,
+    citations, tool calls and usage. `on_chunk(response, chunk)` sees the stream as it arrives;
+    the call's usage record is appended to `usage_log` if given (see usage_log.py).
+    """
+    chat = client.chat.create(model=model, tools=[TOOLS[name]() for name in tools])
+    chat.append(system(SOURCING_INSTRUCTIONS))
+    chat.append(user(prompt))
+
+    # Not admission-controlled: the server's AdmissionController lives in the server process and
+    # can't see this one. batch.py's --concurrency and --rpm are what bound sourcing traffic.
+    started = time.perf_counter()
+    ttft = None
+    for response, chunk in chat.stream():
+        if chunk.content and ttft is None:
+            ttft = time.perf_counter() - started
+        if on_chunk:
+            on_chunk(response, chunk)
+
+    cached_tokens = getattr(response.usage, "cached_prompt_text_tokens", 0) or 0
+    record = record_usage(
+        model,
+        prompt_tokens=response.usage.prompt_tokens,
+        completion_tokens=response.usage.completion_tokens,
+        cached_tokens=cached_tokens,
+        reasoning_tokens=response.usage.reasoning_tokens or 0,
+        latency_s=time.perf_counter() - started,
+        ttft_s=ttft,
+        prompt="sourcing.query",
+        log_path=usage_log,
+    )
+    return {
+        "model": model,
+        "tools": list(tools),
+        "content": response.content,
+        "citations": list(response.citations),
+        "tool_calls": [
+            {"id": tool_call.id, "name": tool_call.function.name, "arguments": tool_call.function.arguments}
+            for tool_call in response.tool_calls
         ],
+        "server_side_tool_usage": response.server_side_tool_usage,
+        "usage": {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens,
+            "reasoning_tokens": response.usage.reasoning_tokens,
+            "cached_prompt_tokens": cached_tokens,
+        },
+        "cost_usd": record["cost_usd"],
+        "ttft_s": record["ttft_s"],
+        "latency_s": record["latency_s"],
+    }
+
+
+def cached_run_query(client: Client, prompt: str, model: str = MODEL, tools=tuple(TOOLS), cache=None,
+                     stale_while_revalidate: bool = False, on_chunk=None, usage_log: Optional[Path] = None) -> dict:
+    """run_query through the on-disk result cache (see result_cache.py)."""
+    cache = cache or get_sourcing_cache()
+    return cache.get_or_run(
+        prompt, model, tools,
+        lambda: run_query(client, prompt, model=model, tools=tools, on_chunk=on_chunk, usage_log=usage_log),
+        stale_while_revalidate=stale_while_revalidate,
+        system=SOURCING_INSTRUCTIONS,
+        # The stale answer has already been shown; the refresh must not stream over it
+        revalidate=lambda: run_query(client, prompt, model=model, tools=tools, usage_log=usage_log),
     )
 
-    # HARDCODED PROMPT - Change this to your desired question
+
+def main():
+    client = get_client()
+    cache = get_sourcing_cache()
+
+    # HARDCODED PROMPT - Change this to your desired question (batch runs: see batch.py)
     PROMPT = "if you call a tool, will the output be cahced and put into the python repl?"
 
     print(f"Query: {PROMPT}\n")
     print("=" * 80)
 
-    # Add the user prompt to the chat
-    chat.append(user(PROMPT))
+    state = {"thinking": True}
 
-    # Stream the response and show real-time progress
-    is_thinking = True
-    for response, chunk in chat.stream():
+    def show_progress(response, chunk):
         # View the server-side tool calls as they are being made in real-time
         for tool_call in chunk.tool_calls:
             print(f"\nCalling tool: {tool_call.function.name}")
             print(f"  Arguments: {tool_call.function.arguments}")
 
         # Show thinking progress
-        if response.usage.reasoning_tokens and is_thinking:
+        if response.usage.reasoning_tokens and state["thinking"]:
             print(f"\rThinking... ({response.usage.reasoning_tokens} tokens)", end="", flush=True)
 
         # Print final response
-        if chunk.content and is_thinking:
+        if chunk.content and state["thinking"]:
             print("\n\n" + "=" * 80)
             print("Final Response:")
             print("=" * 80)
-            is_thinking = False
+            state["thinking"] = False
 
-        if chunk.content and not is_thinking:
+        if chunk.content and not state["thinking"]:
             print(chunk.content, end="", flush=True)
 
+    # A recent identical query is served from the cache; SOURCING_CACHE_SWR=true also serves
+    # an expired answer immediately while it is refreshed
+    result = cached_run_query(
+        client, PROMPT, cache=cache, on_chunk=show_progress, usage_log=usage_log_path(),
+        stale_while_revalidate=os.getenv("SOURCING_CACHE_SWR", "false").lower() == "true",
+    )
+    if result["cache"] != "miss":
+        age_min = (time.time() - result["cached_at"]) / 60
+        print(f"(cached {result['cache']}, {age_min:.0f} min old)\n")
+        print(result["content"])
+
     # Print additional information
     print("\n\n" + "=" * 80)
     print("Citations:")
     print("=" * 80)
-    for i, citation in enumerate(response.citations, 1):
+    for i, citation in enumerate(result["citations"], 1):
         print(f"{i}. {citation}")
 
     print("\n" + "=" * 80)
     print("Usage Statistics:")
     print("=" * 80)
-    print(f"Completion tokens: {response.usage.completion_tokens}")
-    print(f"Prompt tokens: {response.usage.prompt_tokens}")
-    print(f"Total tokens: {response.usage.total_tokens}")
-    print(f"Reasoning tokens: {response.usage.reasoning_tokens}")
-    if hasattr(response.usage, 'cached_prompt_text_tokens'):
-        print(f"Cached prompt tokens: {response.usage.cached_prompt_text_tokens}")
+    usage = result["usage"]
+    print(f"Completion tokens: {usage['completion_tokens']}")
+    print(f"Prompt tokens: {usage['prompt_tokens']}")
+    print(f"Total tokens: {usage['total_tokens']}")
+    print(f"Reasoning tokens: {usage['reasoning_tokens']}")
+    print(f"Cached prompt tokens: {usage['cached_prompt_tokens']}")
+    print(f"Time to first token: {result['ttft_s']}s, total: {result['latency_s']}s")
+    print(f"Estimated cost: ${result['cost_usd']}")
 
     print("\n" + "=" * 80)
     print("Server-Side Tool Usage:")
     print("=" * 80)
-    print(response.server_side_tool_usage)
+    print(result["server_side_tool_usage"])
 
     print("\n" + "=" * 80)
     print("All Tool Calls Made:")
     print("=" * 80)
-    for i, tool_call in enumerate(response.tool_calls, 1):
-        print(f"\n{i}. ID: {tool_call.id}")
-        print(f"   Function: {tool_call.function.name}")
-        print(f"   Arguments: {tool_call.function.arguments}")
+    for i, tool_call in enumerate(result["tool_calls"], 1):
+        print(f"\n{i}. ID: {tool_call['id']}")
+        print(f"   Function: {tool_call['name']}")
+        print(f"   Arguments: {tool_call['arguments']}")
+
+    cache.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+"""
+Sourcing Result Cache
+Disk-backed cache of agentic query results, so a query answered recently isn't re-run through
+the reasoning model and its web/X searches.
+
+- Key: normalized prompt (case and whitespace folded) + model + tool set + system instructions.
+- Value: the whole run_query result (content, citations, tool-call trace, usage), one JSON
+  file per key in SOURCING_CACHE_DIR.
+- Freshness: each tool class has its own TTL (X results age fastest, code execution slowest).
+  An entry lives as long as the shortest TTL among the tools its run actually called.
+- Stale-while-revalidate: a stale entry (up to max_stale_s past expiry) is returned right away
+  while a background refresh replaces it.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+
+TOOL_CLASS_WEB = "web"
+TOOL_CLASS_X = "x"
+TOOL_CLASS_CODE = "code"
+TOOL_CLASS_NONE = "none"
+
+DEFAULT_TTLS_S = {
+    TOOL_CLASS_X: 3600,  # posts and profiles change within hours
+    TOOL_CLASS_WEB: 86400,
+    TOOL_CLASS_CODE: 7 * 86400,
+    TOOL_CLASS_NONE: 7 * 86400,  # answered from the model alone
+}
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.split()).lower()
+
+
+def tool_class(tool_name: str) -> str:
+    """Map a server-side tool call (x_keyword_search, browse_page, ...) to its TTL class."""
+    if tool_name.startswith("x_"):
+        return TOOL_CLASS_X
+    if tool_name.startswith("code"):
+        return TOOL_CLASS_CODE
+    if "search" in tool_name or "browse" in tool_name:
+        return TOOL_CLASS_WEB
+    return TOOL_CLASS_NONE
+
+
+def cache_key(prompt: str, model: str, tools: Iterable[str], system: str = "") -> str:
+    raw = json.dumps([normalize_prompt(prompt), model, sorted(tools), system])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class SourcingCache:
+    def __init__(
+        self,
+        root: Path,
+        ttls_s: Optional[Dict[str, float]] = None,
+        max_stale_s: float = 7 * 86400,
+        refresh_workers: int = 2,
+    ):
+        self.root = Path(root)
+        self.ttls_s = {**DEFAULT_TTLS_S, **(ttls_s or {})}
+        self.max_stale_s = max_stale_s
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="cache-refresh")
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def ttl_for(self, result: dict) -> float:
+        classes = {tool_class(call["name"]) for call in result.get("tool_calls", [])} or {TOOL_CLASS_NONE}
+        return min(self.ttls_s.get(c, self.ttls_s[TOOL_CLASS_NONE]) for c in classes)
+
+    def load(self, key: str) -> Optional[dict]:
+        try:
+            return json.loads(self._path(key).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key: str, prompt: str, model: str, tools: Iterable[str], result: dict) -> dict:
+        now = time.time()
+        entry = {
+            "prompt": prompt,
+            "model": model,
+            "tools": sorted(tools),
+            "stored_at": now,
+            "expires_at": now + self.ttl_for(result),
+            "result": result,
+        }
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(entry, default=str))
+        os.replace(tmp_path, path)
+        return entry
+
+    def _refresh(self, key: str, prompt: str, model: str, tools: Iterable[str], run: Callable[[], dict]):
+        try:
+            self.store(key, prompt, model, tools, run())
+            self._count("refreshes")
+        except Exception as e:
+            print(f"Background refresh failed for {prompt[:60]!r}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_run(
+        self,
+        prompt: str,
+        model: str,
+        tools: Iterable[str],
+        run: Callable[[], dict],
+        stale_while_revalidate: bool = False,
+        system: str = "",
+        revalidate: Optional[Callable[[], dict]] = None,
+    ) -> dict:
+        """
+        Cached result for this query, or run() it and cache the answer. The returned dict is the
+        result plus "cache" ("hit", "stale" or "miss") and "cached_at". `revalidate` replaces
+        run() for background refreshes, e.g. one that doesn't stream to the console.
+        """
+        tools = list(tools)
+        key = cache_key(prompt, model, tools, system)
+        entry = self.load(key)
+        now = time.time()
+        if entry and now < entry["expires_at"]:
+            self._count("hits")
+            return {**entry["result"], "cache": "hit", "cached_at": entry["stored_at"]}
+        if entry and stale_while_revalidate and now < entry["expires_at"] + self.max_stale_s:
+            with self._lock:
+                self.stale_hits += 1
+                start_refresh = key not in self._refreshing
+                self._refreshing.add(key)
+            if start_refresh:
+                self._refresher.submit(self._refresh, key, prompt, model, tools, revalidate or run)
+            return {**entry["result"], "cache": "stale", "cached_at": entry["stored_at"]}
+
+        self._count("misses")
+        entry = self.store(key, prompt, model, tools, run())
+        return {**entry["result"], "cache": "miss", "cached_at": entry["stored_at"]}
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses, "refreshes": self.refreshes}
+
+    def close(self):
+        """Wait for background refreshes to land (call before the process exits)."""
+        self._refresher.shutdown(wait=True)
+
+
+@lru_cache(maxsize=None)
+def get_sourcing_cache() -> SourcingCache:
+    ttls = {
+        TOOL_CLASS_X: float(os.getenv("SOURCING_CACHE_TTL_X_S", DEFAULT_TTLS_S[TOOL_CLASS_X])),
+        TOOL_CLASS_WEB: float(os.getenv("SOURCING_CACHE_TTL_WEB_S", DEFAULT_TTLS_S[TOOL_CLASS_WEB])),
+        TOOL_CLASS_CODE: float(os.getenv("SOURCING_CACHE_TTL_CODE_S", DEFAULT_TTLS_S[TOOL_CLASS_CODE])),
+        TOOL_CLASS_NONE: float(os.getenv("SOURCING_CACHE_TTL_DEFAULT_S", DEFAULT_TTLS_S[TOOL_CLASS_NONE])),
+    }
+    return SourcingCache(
+        Path(os.getenv("SOURCING_CACHE_DIR", Path(__file__).resolve().parent / ".sourcing_cache")),
+        ttls_s=ttls,
+        max_stale_s=float(os.getenv("SOURCING_CACHE_MAX_STALE_S", 7 * 86400)),
+    )
@@ -0,0 +1,38 @@
+import json
+
+import batch
+from batch import BatchRunner
+
+
+def test_successful_retry_leaves_no_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "RETRY_BACKOFF_S", (0,))
+    calls = []
+
+    def run(query, throttle):
+        calls.append(query)
+        if len(calls) == 1:
+            raise TimeoutError("upstream timed out")
+        return {"content": "found", "citations": []}
+
+    output = tmp_path / "results.jsonl"
+    runner = BatchRunner(run, output, requests_per_minute=0, retries=2)
+    summary = runner.run_all([{"id": "q1", "query": "rust engineers", "meta": {"team": "infra"}}])
+
+    assert (summary["ok"], summary["failed"]) == (1, 0)
+    record = json.loads(output.read_text())
+    assert record["status"] == "ok"
+    assert record["attempts"] == 2
+    assert record["meta"] == {"team": "infra"}
+    assert "error" not in record
+
+
+def test_exhausted_retries_keep_the_last_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "RETRY_BACKOFF_S", (0,))
+
+    def run(query, throttle):
+        raise ValueError("bad request")
+
+    output = tmp_path / "results.jsonl"
+    BatchRunner(run, output, requests_per_minute=0, retries=1).run_all([{"id": "q1", "query": "x"}])
+    record = json.loads(output.read_text())
+    assert (record["status"], record["attempts"], record["error"]) == ("error", 2, "ValueError: bad request")
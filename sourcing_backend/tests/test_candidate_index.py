@@ -0,0 +1,74 @@
+import pytest
+
+from candidate_index import CandidateIndex, canonical_url, extract_candidates, query_candidate
+
+
+def test_profile_urls_canonicalize():
+    assert canonical_url("https://www.twitter.com/JDoe/?s=20") == "x.com/jdoe"
+    assert canonical_url("github.com/jdoe/") == "github.com/jdoe"
+    assert canonical_url("https://example.com/Team/") == "example.com/Team"
+
+
+def test_same_handle_under_another_spelling_is_one_candidate(tmp_path):
+    index = CandidateIndex(tmp_path / "candidates.jsonl")
+    cid, is_new = index.add({"name": "José García", "handles": ["@jgarcia_dev"], "employer": "Acme Inc"}, source="q1")
+    assert is_new
+    same, is_new = index.add({"name": "Jose Garcia", "urls": ["https://twitter.com/jgarcia_dev"]}, source="q2")
+    assert (same, is_new) == (cid, False)
+    record = index.candidates[cid]
+    assert record["sources"] == ["q1", "q2"]
+    assert record["urls"] == ["https://twitter.com/jgarcia_dev"]
+
+
+def test_near_duplicate_names_match_without_shared_handles():
+    index = CandidateIndex()
+    cid, _ = index.add({"name": "Garcia, Jose", "employer": "Acme Labs"})
+    assert index.find({"name": "jose garcia", "employer": "ACME"}) == cid
+    assert index.find({"name": "José García"}) == cid
+
+
+def test_same_name_at_another_employer_is_someone_else():
+    index = CandidateIndex()
+    index.add({"name": "Jose Garcia", "employer": "Acme"})
+    assert index.find({"name": "Jose Garcia", "employer": "Globex"}) is None
+    assert index.find({"name": "Priya Raman"}) is None
+
+
+def test_short_handles_and_bare_employers_do_not_identify():
+    index = CandidateIndex()
+    index.add({"name": "Ann Lee", "handles": ["al"]})
+    assert index.find({"name": "Alan Smith", "handles": ["al"]}) is None
+    assert index.find({"employer": "Acme"}) is None
+    with pytest.raises(ValueError):
+        index.add({"employer": "Acme"})
+
+
+def test_index_reloads_last_record_per_id(tmp_path):
+    path = tmp_path / "candidates.jsonl"
+    index = CandidateIndex(path)
+    cid, _ = index.add({"name": "Jose Garcia", "handles": ["jgarcia_dev"]})
+    index.add({"name": "Jose Garcia", "handles": ["jgarcia_dev", "josegarcia"]})
+    index.add({"name": "Jose Garcia", "handles": ["jgarcia_dev"]})  # nothing new, nothing written
+
+    assert len(path.read_text().splitlines()) == 2
+    reopened = CandidateIndex(path)
+    assert len(reopened) == 1
+    assert reopened.candidates[cid]["handles"] == ["jgarcia_dev", "josegarcia"]
+    assert reopened.find({"handles": ["@JoseGarcia"]}) == cid
+
+
+def test_candidates_from_results_and_queries():
+    fenced = {"content": 'Found:\n```json\n{"candidates": [{"name": "Ann Lee"}, {"employer": "Acme"}]}\n```'}
+    assert extract_candidates(fenced) == [{"name": "Ann Lee"}]
+
+    cited = {
+        "content": "See https://github.com/annlee and https://github.com/annlee/repo",
+        "citations": ["https://x.com/annlee/", "https://example.com/about"],
+    }
+    assert extract_candidates(cited) == [{"urls": ["https://x.com/annlee/"]}, {"urls": ["https://github.com/annlee"]}]
+
+    entry = {"query": "What has @annlee shipped? https://github.com/annlee", "meta": {"employer": "Acme"}}
+    assert query_candidate(entry) == {
+        "name": None, "employer": "Acme", "handles": ["annlee"], "urls": ["https://github.com/annlee"],
+    }
+    assert query_candidate({"query": "best rust engineers in Berlin"}) is None
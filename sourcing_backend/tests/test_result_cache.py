@@ -0,0 +1,49 @@
+import time
+
+from result_cache import SourcingCache, TOOL_CLASS_NONE
+
+
+def _answer(content: str):
+    calls = []
+
+    def run():
+        calls.append(content)
+        return {"content": content, "tool_calls": []}
+
+    return run, calls
+
+
+def test_miss_then_hit(tmp_path):
+    cache = SourcingCache(tmp_path)
+    run, calls = _answer("v1")
+    assert cache.get_or_run("Find  Engineers", "m", ["web"], run)["cache"] == "miss"
+    assert cache.get_or_run("find engineers", "m", ["web"], run)["cache"] == "hit"
+    assert calls == ["v1"]
+
+
+def test_stale_entry_refreshes_with_revalidate(tmp_path):
+    cache = SourcingCache(tmp_path, ttls_s={TOOL_CLASS_NONE: 0.01})
+    cache.get_or_run("q", "m", [], _answer("v1")[0])
+    time.sleep(0.02)
+
+    run, run_calls = _answer("streamed")
+    revalidate, revalidate_calls = _answer("v2")
+    result = cache.get_or_run("q", "m", [], run, stale_while_revalidate=True, revalidate=revalidate)
+    cache.close()
+
+    assert result["cache"] == "stale"
+    assert result["content"] == "v1"
+    assert run_calls == []
+    assert revalidate_calls == ["v2"]
+    assert cache.stats()["refreshes"] == 1
+
+
+def test_stale_entry_without_revalidate_reruns(tmp_path):
+    cache = SourcingCache(tmp_path, ttls_s={TOOL_CLASS_NONE: 0.01})
+    cache.get_or_run("q", "m", [], _answer("v1")[0])
+    time.sleep(0.02)
+
+    run, calls = _answer("v2")
+    assert cache.get_or_run("q", "m", [], run, stale_while_revalidate=True)["cache"] == "stale"
+    cache.close()
+    assert calls == ["v2"]
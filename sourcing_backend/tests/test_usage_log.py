@@ -0,0 +1,28 @@
+import json
+
+import pytest
+
+from usage_log import PURPOSE_SOURCING, estimate_cost, record_usage
+
+
+def test_records_are_appended_only_to_the_given_log(tmp_path):
+    log = tmp_path / "usage.jsonl"
+    record = record_usage("grok-4-1-fast", prompt_tokens=1_000_000, completion_tokens=0, latency_s=1.23456)
+    assert record["purpose"] == PURPOSE_SOURCING
+    assert record["cost_usd"] == 0.2
+    assert record["latency_s"] == 1.2346
+    assert not log.exists()
+
+    record_usage("grok-4-1-fast", prompt_tokens=10, log_path=log, prompt="sourcing.query")
+    record_usage("grok-4-1-fast", error="timeout", log_path=log)
+    lines = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [line["prompt"] for line in lines] == ["sourcing.query", None]
+    assert lines[1]["error"] == "timeout"
+
+
+def test_cached_tokens_and_price_overrides(monkeypatch):
+    # 1M prompt tokens of which half cached, 1M completion tokens
+    assert estimate_cost("grok-4-1-fast", 1_000_000, 1_000_000, 500_000) == pytest.approx(0.1 + 0.025 + 0.5)
+    assert estimate_cost("unknown-model", 1_000_000, 0) == 0.0
+    monkeypatch.setenv("LLM_PRICING_JSON", '{"unknown-model": [1, 1, 1]}')
+    assert estimate_cost("unknown-model", 1_000_000, 0) == 1.0
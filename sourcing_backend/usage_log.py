@@ -0,0 +1,84 @@
+"""
+Sourcing Usage Log
+Token usage and estimated cost of each sourcing call, appended as one JSON line per call.
+
+Sourcing runs in its own process with the xai_sdk client, so its calls never reach the server's
+LLM gateway (phone_screen_agent/app/llm_gateway.py). Records carry the same fields as the
+gateway's LLM_USAGE_LOG lines, so both logs can be read together.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+PURPOSE_SOURCING = "sourcing"
+
+DEFAULT_USAGE_LOG = Path(__file__).resolve().parent / "llm_usage.jsonl"
+
+# Estimated USD per 1M tokens: (prompt, cached prompt, completion), as in the gateway's table.
+# LLM_PRICING_JSON='{"model": [prompt, cached, completion]}' overrides or extends it.
+MODEL_PRICING = {
+    "grok-4-1-fast": (0.20, 0.05, 0.50),
+    "grok-4-1-fast-reasoning": (0.20, 0.05, 0.50),
+    "grok-4-1-fast-non-reasoning": (0.20, 0.05, 0.50),
+    "grok-4": (3.00, 0.75, 15.00),
+}
+
+_lock = threading.Lock()
+
+
+def usage_log_path() -> Path:
+    """Where the sourcing scripts log usage: SOURCING_USAGE_LOG, else llm_usage.jsonl here."""
+    return Path(os.getenv("SOURCING_USAGE_LOG", DEFAULT_USAGE_LOG))
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """Estimated USD cost of a call; 0.0 for models without a known price."""
+    pricing = {**MODEL_PRICING, **{k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICING_JSON", "{}")).items()}}
+    if model not in pricing:
+        return 0.0
+    prompt_price, cached_price, completion_price = pricing[model]
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (uncached * prompt_price + cached_tokens * cached_price + completion_tokens * completion_price) / 1_000_000
+
+
+def record_usage(
+    model: str,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    cached_tokens: int = 0,
+    reasoning_tokens: int = 0,
+    latency_s: float = 0.0,
+    ttft_s: Optional[float] = None,
+    error: Optional[str] = None,
+    prompt: Optional[str] = None,
+    log_path: Optional[Path] = None,
+) -> Dict[str, Any]:
+    """Build the record of one sourcing call and append it to `log_path` (None: not written)."""
+    record = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "purpose": PURPOSE_SOURCING,
+        "provider": "xai_sdk",
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "reasoning_tokens": reasoning_tokens,
+        "ttft_s": round(ttft_s, 4) if ttft_s is not None else None,
+        "latency_s": round(latency_s, 4),
+        "queue_s": 0.0,
+        "cost_usd": round(estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens), 6),
+        "prompt": prompt,
+        "endpoint": None,
+        "error": error,
+    }
+    if log_path:
+        try:
+            with _lock, open(log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except Exception as e:
+            print(f"Error writing sourcing usage log: {e}")
+    return record